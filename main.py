@@ -1,33 +1,165 @@
-import sys
-from utils import order, close_orders, close_positions
+import os
+import argparse
+from utils import http_client, timing, profiler
+from utils import (order, close_orders, close_positions, bootstrap, flatten, benchmark, ev_aggregator, ev_stats,
+                   daemon, sweep)
+from utils import (account_creation, account_get_all, account_get_all_names, ach_relationship_create,
+                   ach_relation_get, account_get_balance, account_request_transfer, state_store)
 
-def main():
+def run_trade(args):
+    print("Running orders.py for trading...")
+    if args.sub_accounts:
+        order.run_trading_accounts(args.symbols or "NDAQ")
+    elif args.symbols:
+        order.run_trading_universe(args.symbols)
+    else:
+        order.run_trading()
+
+def run_cancel_orders(args):
+    print("Running close_orders.py to cancel all orders...")
+    close_orders.delete_orders()
+
+def run_close_positions(args):
+    print("Running close_positions.py to close all positions...")
+    close_positions.delete_positions()
+
+def run_bootstrap(args):
+    print("Running bootstrap.py to provision broker accounts...")
+    bootstrap.run_bootstrap()
+
+# Subcommands as (name, numeric alias, handler, help). The numeric aliases keep
+# the original `python main.py <mode>` invocations working.
+COMMANDS = [
+    ("trade", "0", run_trade, "Place one bracket order per profit ratio."),
+    ("cancel-orders", "1", run_cancel_orders, "Cancel all open orders."),
+    ("close-positions", "2", run_close_positions, "Close all positions."),
+    ("bootstrap", "3", run_bootstrap, "Provision and fund one broker account per ratio."),
+    ("flatten", None, lambda args: flatten.main(not args.no_paper, args.timeout),
+     "Cancel all orders and close all positions in every account, and confirm they are flat."),
+    ("benchmark", None, lambda args: benchmark.main(args.sizes, args.latency, not args.no_memory, args.output),
+     "Benchmark the trading, close and bootstrap paths against the in-process fake server."),
+    ("daemon", None,
+     lambda args: daemon.main(args.symbols, args.ratios, args.offset, not args.no_listen, not args.no_feed,
+                                      args.status_port),
+     "Stay running and trade one session per market day at the open plus --offset minutes."),
+    ("sweep", None,
+     lambda args: sweep.main(order.load_symbols(args.symbols), args.start, args.end, args.ratios, args.workers),
+     "Simulate the EV of every ratio over stored minute bars of many symbols on all cores."),
+    ("ev-stats", None,
+     lambda args: ev_stats.main(args.symbol, args.start, args.end, args.ratios, args.resamples, args.limit),
+     "Bootstrap confidence intervals and p-values of the simulated EV of every ratio."),
+    ("ev", None, lambda args: ev_aggregator.main(args.source, args.state, args.limit),
+     "Merge newly closed brackets into the realized EV per ratio and print it."),
+    ("create-accounts", None, lambda args: account_creation.main(), "Create one broker account per ratio."),
+    ("list-accounts", None, lambda args: account_get_all.main(args.created_after),
+     "Save every broker account to the state store."),
+    ("account-names", None, lambda args: account_get_all_names.main(),
+     "Look up the email of every stored account that has none."),
+    ("ach-create", None, lambda args: ach_relationship_create.main(),
+     "Create an ACH relationship for every broker account."),
+    ("ach-get", None, lambda args: ach_relation_get.main(),
+     "Store the ACH relationships of every account that has none."),
+    ("balances", None, lambda args: account_get_balance.main(args.target),
+     "Check balances and record the transfers needed."),
+    ("transfers", None, lambda args: account_request_transfer.main(),
+     "Initiate the recorded transfer requests."),
+    ("import-json", None, lambda args: state_store.main(),
+     "Import the former utils/JSON account files into the state store."),
+]
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Blind stock market EV trading and account tools.")
+    parser.add_argument("--profile", choices=("sample", "cprofile"),
+                        help="Profile the command: 'sample' writes collapsed stacks for a flamegraph, "
+                             "'cprofile' writes a pstats file.")
+    parser.add_argument("--profile-output", default="profile", help="Profile output path, without extension.")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Record timing spans of every HTTP call and phase, write them to FILE in Chrome "
+                             "trace format and a per-endpoint summary next to it.")
+    subparsers = parser.add_subparsers(dest="command", metavar="<command>")
+    for name, alias, handler, help_text in COMMANDS:
+        subparser = subparsers.add_parser(name, aliases=[alias] if alias else [], help=help_text)
+        subparser.set_defaults(handler=handler)
+        if name == "trade":
+            subparser.add_argument("--symbols", help="Comma-separated symbols, or a file of symbols, to trade at once.")
+            subparser.add_argument("--sub-accounts", action="store_true",
+                                   help="Trade every ratio in its own broker sub-account (see bootstrap).")
+        if name == "flatten":
+            subparser.add_argument("--timeout", type=float, default=flatten.FLATTEN_TIMEOUT,
+                                   help="Seconds before an account that is not flat is given up on.")
+            subparser.add_argument("--no-paper", action="store_true", help="Only flatten broker sub-accounts.")
+        if name == "benchmark":
+            subparser.add_argument("--sizes", type=int, nargs="+", default=benchmark.GRID_SIZES,
+                                   help="max_ratio values to benchmark (6, 20, 63 give 21, 210, 2016 ratios).")
+            subparser.add_argument("--latency", type=float, default=benchmark.DEFAULT_LATENCY,
+                                   help="Seconds of simulated latency per request.")
+            subparser.add_argument("--no-memory", action="store_true",
+                                   help="Skip tracemalloc, which slows the cases down.")
+            subparser.add_argument("--output", default=benchmark.results_file, help="JSON file the results go to.")
+        if name == "daemon":
+            subparser.add_argument("--symbols", help="Comma-separated symbols, or a file of symbols, to trade each session.")
+            subparser.add_argument("--ratios", type=int, default=20, help="max_ratio of the profit ratios traded.")
+            subparser.add_argument("--offset", type=float, default=daemon.OPEN_OFFSET_MINUTES,
+                                   help="Minutes after the market open each session is placed.")
+            subparser.add_argument("--status-port", type=int, default=daemon.STATUS_PORT,
+                                   help="Port of the local JSON status endpoint (127.0.0.1).")
+            subparser.add_argument("--no-listen", action="store_true",
+                                   help="Do not keep a trade_updates listener recording bracket outcomes.")
+            subparser.add_argument("--no-feed", action="store_true",
+                                   help="Fetch entry prices over REST instead of the market data stream.")
+        if name == "sweep":
+            subparser.add_argument("--symbols", required=True, help="Comma-separated symbols, or a file of symbols.")
+            subparser.add_argument("--start", required=True, help="First day, YYYY-MM-DD.")
+            subparser.add_argument("--end", required=True, help="Last day, YYYY-MM-DD.")
+            subparser.add_argument("--ratios", type=int, default=20, help="max_ratio of the profit ratios simulated.")
+            subparser.add_argument("--workers", type=int, default=sweep.MAX_WORKERS, help="Worker processes.")
+        if name == "ev-stats":
+            subparser.add_argument("--symbol", default="NDAQ", help="Symbol whose stored minute bars are simulated.")
+            subparser.add_argument("--start", required=True, help="First day, YYYY-MM-DD.")
+            subparser.add_argument("--end", required=True, help="Last day, YYYY-MM-DD.")
+            subparser.add_argument("--ratios", type=int, default=20, help="max_ratio of the profit ratios simulated.")
+            subparser.add_argument("--resamples", type=int, default=ev_stats.N_RESAMPLES,
+                                   help="Bootstrap resamples of the days.")
+            subparser.add_argument("--limit", type=int, default=20, help="Ratios printed.")
+        if name == "ev":
+            subparser.add_argument("--source", choices=("outcomes", "activities"), default="outcomes",
+                                   help="Read the local bracket outcomes file or the account's fill activities.")
+            subparser.add_argument("--state", default=ev_aggregator.state_file,
+                                   help="File the running totals and read cursors are kept in.")
+            subparser.add_argument("--limit", type=int, default=20, help="Ratios printed.")
+        if name == "balances":
+            subparser.add_argument("--target", type=float, default=account_get_balance.TARGET_BALANCE,
+                                   help="Balance every account is topped up to.")
+        if name == "list-accounts":
+            subparser.add_argument("--created-after", help="Only accounts created after this date/time.")
+    return parser
+
+def main(argv=None):
     """
     Main function to execute specific modules based on command-line arguments.
     """
-    if len(sys.argv) != 2:
-        print("Usage: python main.py <mode>")
-        print("Modes:")
-        print("  0 - Run orders.py for trading.")
-        print("  1 - Run close_orders.py to cancel all orders.")
-        print("  2 - Run close_positions.py to close all positions.")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
         return
 
+    if args.trace:
+        timing.RECORDER.reset()
+        timing.enable()
     try:
-        mode = int(sys.argv[1])
-        if mode == 0:
-            print("Running orders.py for trading...")
-            order.run_trading()
-        elif mode == 1:
-            print("Running close_orders.py to cancel all orders...")
-            close_orders.delete_orders()
-        elif mode == 2:
-            print("Running close_positions.py to close all positions...")
-            close_positions.delete_positions()
+        if args.profile:
+            profiler.run_profiled(args.profile, args.profile_output, args.handler, args)
         else:
-            print("Invalid mode. Please choose 0, 1, or 2.")
-    except ValueError:
-        print("Invalid input. Please provide a numerical argument (0, 1, or 2).")
+            args.handler(args)
+    finally:
+        if args.trace:
+            timing.disable()
+            summary_file = os.path.splitext(args.trace)[0] + ".summary.json"
+            timing.RECORDER.print_summary(endpoint_template=http_client.endpoint)
+            timing.RECORDER.export_chrome_trace(args.trace)
+            timing.RECORDER.save_summary(summary_file, endpoint_template=http_client.endpoint)
+            print(f"Trace saved to {args.trace}, summary to {summary_file}")
 
 if __name__ == "__main__":
     main()
@@ -1,61 +1,117 @@
 import requests
-import os
-import json
-from dotenv import load_dotenv
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from utils import http_client, state_store
 
-# Load Broker Auth credentials from .env file
-load_dotenv()
-BROKER_AUTH = os.getenv("alpaca_broker_auth")
+# Broker API endpoint for accounts
+BASE_PATH = "/v1/accounts"
 
-# Base URL for Broker API
-BASE_URL = "https://broker-api.sandbox.alpaca.markets/v1/accounts"
+# Largest page size the Broker API accepts
+MAX_PER_PAGE = 100
 
-# Headers for authentication
-HEADERS = {
-    "accept": "application/json",
-    "authorization": BROKER_AUTH
-}
+def fetch_page(page, per_page=MAX_PER_PAGE, **filters):
+    """
+    Fetch one page of accounts from Alpaca Broker API.
+
+    Args:
+        page (int): Page number for paginated results.
+        per_page (int): Number of accounts per page (max 100).
+        **filters: Extra query parameters, e.g. created_after='2025-01-01'.
+
+    Returns:
+        list: List of accounts.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    params = {"page": page, "per_page": per_page}
+    params.update({key: value for key, value in filters.items() if value is not None})
+
+    response = http_client.get("broker", BASE_PATH, params=params)
+    response.raise_for_status()  # Raise exception for HTTP errors
+    return response.json()
 
 def get_all_accounts(page=1, per_page=100):
     """
-    Fetches all accounts from Alpaca Broker API.
-    
+    Fetches one page of accounts from Alpaca Broker API.
+
     Args:
         page (int): Page number for paginated results.
         per_page (int): Number of accounts per page (max 100).
-    
+
     Returns:
         list: List of accounts.
     """
     try:
-        # Endpoint with pagination
-        url = f"{BASE_URL}?page={page}&per_page={per_page}"
-        
-        # API request
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()  # Raise exception for HTTP errors
-
-        # Parse JSON response
-        accounts = response.json()
-        return accounts
+        return fetch_page(page, per_page)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching accounts: {e}")
         return []
 
-# Fetch accounts
-accounts = get_all_accounts(page=1, per_page=50)
+def iter_accounts(per_page=MAX_PER_PAGE, created_after=None, created_before=None, status=None):
+    """
+    Lazily yield every account, page by page.
+
+    The next page is requested in the background while the current one is
+    being consumed, and only one page is held in memory at a time besides it.
 
-# Extract account IDs
-account_ids = [account['id'] for account in accounts]
+    Args:
+        per_page (int): Number of accounts per page (max 100).
+        created_after (str): Only accounts created after this date/time.
+        created_before (str): Only accounts created before this date/time.
+        status (str): Only accounts with this status, e.g. 'ACTIVE'.
+
+    Yields:
+        dict: One account.
+
+    Raises:
+        requests.exceptions.RequestException: If a page cannot be fetched.
+    """
+    filters = {"created_after": created_after, "created_before": created_before, "status": status}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = 1
+        pending = executor.submit(fetch_page, page, per_page, **filters)
+        while pending is not None:
+            accounts = pending.result()
+            # A short page is the last one
+            if len(accounts) == per_page:
+                page += 1
+                pending = executor.submit(fetch_page, page, per_page, **filters)
+            else:
+                pending = None
+            yield from accounts
+
+def save_account_ids(created_after=None, store=None):
+    """
+    Stream every account into the state store without holding all accounts in memory.
 
-# Ensure the "JSON" subdirectory exists, relative to the script location
-script_dir = os.path.dirname(os.path.abspath(__file__))
-output_dir = os.path.join(script_dir, "JSON")
-os.makedirs(output_dir, exist_ok=True)
+    Args:
+        created_after (str): Only save accounts created after this date/time.
+        store (state_store.StateStore): Store to write to. The default store when None.
 
-# Save account IDs to the "JSON" directory
-output_file = os.path.join(output_dir, "account_raw_ids.json")
-with open(output_file, "w") as file:
-    json.dump(account_ids, file, indent=4)
+    Returns:
+        int: Number of accounts saved.
+    """
+    store = store or state_store.get_store()
+
+    count = 0
+    batch = []
+    for account in iter_accounts(created_after=created_after):
+        batch.append({"account_id": account['id'], "status": account.get('status'),
+                      "created_at": account.get('created_at')})
+        if len(batch) >= state_store.BATCH_SIZE:
+            count += store.upsert_accounts(batch)
+            batch = []
+    if batch:
+        count += store.upsert_accounts(batch)
+    return count
+
+def main(created_after=None):
+    try:
+        count = save_account_ids(created_after=created_after)
+        print(f"{count} accounts saved to {state_store.DB_PATH}")
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching accounts: {e}")
 
-print(f"Account IDs saved to {output_file}")
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
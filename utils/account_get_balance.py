@@ -1,107 +1,131 @@
+import threading
+import time
 import requests
-import os
-import json
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from utils import http_client, state_store
 
-# Load Broker Auth credentials from .env file
-load_dotenv()
-BROKER_AUTH = os.getenv("alpaca_broker_auth")
+# Broker API endpoint for trading accounts
+base_path = "/v1/trading/accounts"
 
-# Base URL for Alpaca API
-base_url = "https://broker-api.sandbox.alpaca.markets/v1/trading/accounts"
+# Balance each account is topped up to
+TARGET_BALANCE = 45000
 
-# Headers with proper authorization
-headers = {
-    "accept": "application/json",
-    "authorization": BROKER_AUTH
-}
+# Accounts checked concurrently, matched to the HTTP connection pool
+MAX_WORKERS = http_client.POOL_SIZE
 
-# Path to the account_email_updated.json file in the JSON subdirectory
-script_dir = os.path.dirname(os.path.abspath(__file__))
-json_file_path = os.path.join(script_dir, "JSON", "account_email_updated.json")
+# How long (in seconds) a fetched account snapshot may be reused
+SNAPSHOT_TTL = 30.0
 
-# Path to the account_transfer_request.json file in the JSON subdirectory
-transfer_request_file = os.path.join(script_dir, "JSON", "account_transfer_request.json")
+# Cache of trading account snapshots: {account_id: (snapshot, fetched_at)}
+_snapshot_cache = {}
+_snapshot_lock = threading.Lock()
 
-# Ensure the JSON file exists
-if not os.path.exists(json_file_path):
-    print(f"Error: {json_file_path} not found!")
-    exit(1)
+def get_account_snapshot(account_id, max_age=SNAPSHOT_TTL):
+    """
+    Get the trading account of a broker account, reusing a cached snapshot while it is fresh.
+
+    Args:
+        account_id (str): Broker account id.
+        max_age (float): Maximum age in seconds of a cached snapshot. Use 0 to always fetch.
+
+    Returns:
+        dict: The trading account (balance, cash, equity, buying_power, ...).
 
-# Function to request transfer for accounts below $50,000
-def request_transfer(account_id, amount_needed, account_email, ach_id):
+    Raises:
+        requests.exceptions.RequestException: If the account cannot be fetched.
     """
-    Create a transfer request record.
+    with _snapshot_lock:
+        cached = _snapshot_cache.get(account_id)
+        if cached and time.monotonic() - cached[1] < max_age:
+            return cached[0]
+
+    # Fetched outside the lock so a sweep runs its requests in parallel
+    response = http_client.get("broker", f"{base_path}/{account_id}/account")
+    response.raise_for_status()
+    snapshot = response.json()
+
+    with _snapshot_lock:
+        _snapshot_cache[account_id] = (snapshot, time.monotonic())
+    return snapshot
+
+def get_balance(account_id, max_age=SNAPSHOT_TTL):
+    return float(get_account_snapshot(account_id, max_age).get("balance", 0))
+
+def invalidate(account_id=None):
+    """
+    Drop the cached snapshot of an account (after a transfer or trade), or of every account.
+    """
+    with _snapshot_lock:
+        if account_id is None:
+            _snapshot_cache.clear()
+        else:
+            _snapshot_cache.pop(account_id, None)
+
+def sweep_balances(account_ids, max_workers=MAX_WORKERS, max_age=SNAPSHOT_TTL):
+    """
+    Fetch the balance of many accounts concurrently.
 
     Args:
-        account_id (str): The ID of the account.
-        amount_needed (float): The amount needed to reach $50,000.
-        account_email (str): The email associated with the account.
-    
+        account_ids (iterable): Broker account ids.
+        max_workers (int): Maximum number of requests in flight at once.
+        max_age (float): Maximum age in seconds of a reusable cached snapshot.
+
     Returns:
-        dict: The transfer request data.
+        dict: {account_id: balance}, or {account_id: exception} for accounts that failed.
     """
-    transfer_request = {
-        f"{account_email}": {
-            "account_id": account_id,
-            "email": account_email,
-            "ach_id": ach_id,
-            "amount": f"{amount_needed:.2f}"
-        }
-    }
-    return transfer_request
+    def fetch(account_id):
+        try:
+            return account_id, get_balance(account_id, max_age)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return account_id, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(fetch, list(account_ids)))
 
 # Function to process accounts and request transfers if necessary
-def process_accounts(file_path):
+def process_accounts(store=None, target_balance=TARGET_BALANCE, max_workers=MAX_WORKERS, max_age=SNAPSHOT_TTL):
     """
-    Reads the JSON file, checks account balances, and requests transfers for accounts below $50,000.
+    Checks the balance of every stored account concurrently and records a
+    transfer request for each account below the target balance.
 
     Args:
-        file_path (str): Path to the JSON file containing account details.
+        store (state_store.StateStore): Store to read and update. The default store when None.
+        target_balance (float): Balance every account should hold.
+        max_workers (int): Maximum number of balance requests in flight at once.
+        max_age (float): Maximum age in seconds of a reusable cached snapshot.
+
+    Returns:
+        int: Number of transfers requested.
     """
-    try:
-        # Load the JSON data
-        with open(file_path, "r") as file:
-            accounts_data = json.load(file)
-
-        # Dictionary to store all transfer requests
-        all_transfer_requests = {}
-
-        for email, account_info in accounts_data.items():
-            account_id = account_info.get("account_id")
-            account_name = account_info.get("email", "Unknown Account")
-            ach_id = account_info.get("ach_id")
-            
-            # Fetch account details from the API
-            url = f"{base_url}/{account_id}/account"
-            response = requests.get(url, headers=headers)
-
-            if response.status_code == 200:
-                account_details = response.json()
-                balance = float(account_details.get("balance", 0))
-                if balance < 45000:
-                    amount_needed = 45000 - balance
-                    print(f"Account '{account_name}' ({account_id}) has ${balance:.2f}. Requesting ${amount_needed:.2f}.")
-                    transfer_request = request_transfer(account_id, amount_needed, email, ach_id)
-                    all_transfer_requests.update(transfer_request)
-                else:
-                    print(f"Account '{account_name}' ({account_id}) has sufficient funds: ${balance:.2f}.")
-            else:
-                print(f"Failed to fetch details for account {account_id}: {response.status_code}")
-                print(response.text)
-
-        # Write the transfer requests to a JSON file
-        with open(transfer_request_file, "w") as file:
-            json.dump(all_transfer_requests, file, indent=4)
-
-        print(f"All transfer requests saved to {transfer_request_file}")
-
-    except FileNotFoundError:
-        print(f"Error: File not found at {file_path}")
-    except json.JSONDecodeError:
-        print("Error: Failed to decode JSON. Please check the file format.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    store = store or state_store.get_store()
+    accounts = store.accounts_by_email()
+    balances = sweep_balances((info["account_id"] for info in accounts.values()), max_workers, max_age)
+    requested = 0
+
+    for email, account_info in accounts.items():
+        account_id = account_info.get("account_id")
+        account_name = account_info.get("email", "Unknown Account")
+        ach_id = account_info.get("ach_id")
+        balance = balances[account_id]
+
+        if isinstance(balance, Exception):
+            print(f"Failed to fetch details for account {account_id}: {balance}")
+            continue
+
+        store.set_balance(account_id, balance)
+        if balance < target_balance:
+            amount_needed = target_balance - balance
+            print(f"Account '{account_name}' ({account_id}) has ${balance:.2f}. Requesting ${amount_needed:.2f}.")
+            store.request_transfer(account_id, ach_id, f"{amount_needed:.2f}")
+            requested += 1
+        else:
+            print(f"Account '{account_name}' ({account_id}) has sufficient funds: ${balance:.2f}.")
+
+    print(f"{requested} transfer requests saved to {store.path}")
+    return requested
+
+def main(target_balance=TARGET_BALANCE):
+    process_accounts(target_balance=target_balance)
 
 if __name__ == "__main__":
-    process_accounts(json_file_path)
+    main()
@@ -1,34 +1,17 @@
 import requests
-import json
-import os
-from dotenv import load_dotenv
-
-# Load Broker Auth credentials from .env file
-load_dotenv()
-BROKER_AUTH = os.getenv("alpaca_broker_auth")
-
-
-# Load transfer request data from the JSON file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-transfer_request_file = os.path.join(script_dir, "JSON", "account_transfer_request.json")
-
-# Ensure the JSON file exists
-if not os.path.exists(transfer_request_file):
-    print(f"Error: {transfer_request_file} not found!")
-    exit(1)
+from utils import http_client, state_store, account_get_balance
 
 # API endpoint
-url = "https://broker-api.sandbox.alpaca.markets/v1/accounts/{account_id}/transfers"
-
-# Headers with proper authorization
-headers = {
-    "accept": "application/json",
-    "content-type": "application/json",
-    "authorization": BROKER_AUTH
-}
+path = "/v1/accounts/{account_id}/transfers"
 
 # Function to initiate a transfer request
 def initiate_transfer(account_id, amount, ach_id, account_email):
+    """
+    Send one incoming ACH transfer.
+
+    Returns:
+        str: The transfer id, or None if the transfer failed.
+    """
     payload = {
         "transfer_type": "ach",
         "direction": "INCOMING",
@@ -37,30 +20,50 @@ def initiate_transfer(account_id, amount, ach_id, account_email):
         "relationship_id": ach_id
     }
     
-    # Construct the URL with the account_id
-    transfer_url = url.format(account_id=account_id)
+    # Construct the path with the account_id
+    transfer_path = path.format(account_id=account_id)
 
     # Send the POST request
-    response = requests.post(transfer_url, json=payload, headers=headers)
+    response = http_client.post("broker", transfer_path, json=payload)
 
     if response.status_code == 200:
+        # The cached balance no longer reflects the account
+        account_get_balance.invalidate(account_id)
         print(f"Transfer successful for account {account_email}: ${amount}")
+        return response.json().get("id")
     else:
         print(f"Failed to initiate transfer for account {account_email}: {response.status_code}")
         print(response.text)
         print("----------------------")
+        return None
 
-# Load transfer requests from the JSON file
-with open(transfer_request_file, "r") as file:
-    transfer_requests = json.load(file)
+def request_transfers(store=None):
+    """
+    Send every transfer recorded as requested by account_get_balance.
 
-# Iterate through the transfer requests and initiate the transfer for each
-for email, transfer_details in transfer_requests.items():
-    account_id = transfer_details.get("account_id")
-    amount = transfer_details.get("amount")
-    ach_id = transfer_details.get("ach_id")
-    
-    if account_id and amount and ach_id:
-        initiate_transfer(account_id, amount, ach_id, email)
-    else:
-        print(f"Missing data for {email}. Skipping transfer.")
+    Args:
+        store (state_store.StateStore): Store to read and update. The default store when None.
+    """
+    store = store or state_store.get_store()
+
+    for transfer in store.pending_transfers():
+        email = transfer["email"] or transfer["account_id"]
+        if not transfer["ach_id"]:
+            print(f"Missing data for {email}. Skipping transfer.")
+            continue
+
+        try:
+            transfer_id = initiate_transfer(transfer["account_id"], transfer["amount"], transfer["ach_id"], email)
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to initiate transfer for account {email}: {e}")
+            transfer_id = None
+
+        store.record_transfer(transfer["account_id"], transfer["amount"], transfer["ach_id"], transfer_id,
+                              state_store.TRANSFER_SUBMITTED if transfer_id else state_store.TRANSFER_FAILED,
+                              request_id=transfer["id"])
+
+def main():
+    request_transfers()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,8 @@
 import requests
-import os
-import json
-from dotenv import load_dotenv
+from utils import http_client, state_store
 
-# Load Broker Auth credentials from .env file
-load_dotenv()
-BROKER_AUTH = os.getenv("alpaca_broker_auth")
-
-# Base URL for Broker API
-BASE_URL = "https://broker-api.sandbox.alpaca.markets/v1/accounts"
-
-# Headers for authentication
-HEADERS = {
-    "accept": "application/json",
-    "authorization": BROKER_AUTH
-}
+# Broker API endpoint for accounts
+BASE_PATH = "/v1/accounts"
 
 def get_ach_relationships(account_id):
     """
@@ -28,10 +16,10 @@ def get_ach_relationships(account_id):
     """
     try:
         # Endpoint for ACH relationships
-        url = f"{BASE_URL}/{account_id}/ach_relationships"
-        
+        path = f"{BASE_PATH}/{account_id}/ach_relationships"
+
         # API request
-        response = requests.get(url, headers=HEADERS)
+        response = http_client.get("broker", path)
         response.raise_for_status()
 
         # Parse JSON response and extract ACH IDs
@@ -41,30 +29,31 @@ def get_ach_relationships(account_id):
         print(f"Error fetching ACH relationships for account {account_id}: {e}")
         return []
 
-# Load the existing account_email.json file
-script_dir = os.path.dirname(os.path.abspath(__file__))
-input_file = os.path.join(script_dir, "JSON", "account_email.json")
+def save_ach_ids(store=None):
+    """
+    Store the ACH relationships of every account that has none recorded yet.
 
-try:
-    with open(input_file, "r") as file:
-        account_email_data = json.load(file)
-except FileNotFoundError:
-    print(f"{input_file} not found. Please ensure the file exists.")
-    exit()
+    Args:
+        store (state_store.StateStore): Store to read and update. The default store when None.
 
-# Loop through the entries in the account_email.json file
-for email, account_data in account_email_data.items():
-    account_id = account_data['account_id']
-    
-    # Fetch ACH relationships for the account
-    ach_ids = get_ach_relationships(account_id)
-    
-    # Update the account data with the first ACH ID (if exists)
-    account_data['ach_id'] = ach_ids[0] if ach_ids else None
+    Returns:
+        int: Number of accounts with at least one ACH relationship found.
+    """
+    store = store or state_store.get_store()
+    found = 0
+
+    for account_id in store.account_ids_without_ach():
+        # Fetch ACH relationships for the account
+        ach_ids = get_ach_relationships(account_id)
+        for ach_id in ach_ids:
+            store.upsert_ach(account_id, ach_id)
+        found += bool(ach_ids)
+
+    print(f"ACH relationships saved for {found} accounts to {store.path}")
+    return found
 
-# Save the updated account_email.json file with ACH IDs
-output_file = os.path.join(script_dir, "JSON", "account_email_updated.json")
-with open(output_file, "w") as file:
-    json.dump(account_email_data, file, indent=4)
+def main():
+    save_ach_ids()
 
-print(f"Updated account_email.json with ACH IDs. Saved to {output_file}")
+if __name__ == "__main__":
+    main()
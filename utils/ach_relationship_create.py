@@ -1,21 +1,12 @@
-import os
-from dotenv import load_dotenv
 import requests
-import account_get_all
+from utils import http_client
+from utils import account_get_all
 
-# Load Broker API credentials from .env file
-load_dotenv()
-
-BROKER_AUTH = os.getenv("alpaca_broker_auth")
-
-# Base URL for ACH relationships
-BASE_URL = "https://broker-api.sandbox.alpaca.markets/v1/accounts"
-
-# List of account IDs to process
-account_ids = account_get_all.account_ids
+# Broker API endpoint for ACH relationships
+BASE_PATH = "/v1/accounts"
 
 # ACH relationship payload
-payload = {
+ACH_PAYLOAD = {
     "bank_account_type": "CHECKING",
     "account_owner_name": "Kind Archimedes",
     "bank_account_number": "32131231abc",
@@ -23,13 +14,6 @@ payload = {
     "nickname": "Bank of America Checking"
 }
 
-# Headers for the request
-headers = {
-    "accept": "application/json",
-    "content-type": "application/json",
-    "authorization": BROKER_AUTH
-}
-
 def create_ach_relationship(account_id):
     """
     Creates an ACH relationship for a given account ID.
@@ -40,16 +24,36 @@ def create_ach_relationship(account_id):
     Returns:
         str: Response text from the API.
     """
-    url = f"{BASE_URL}/{account_id}/ach_relationships"
+    path = f"{BASE_PATH}/{account_id}/ach_relationships"
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = http_client.post("broker", path, json=ACH_PAYLOAD)
         response.raise_for_status()  # Raise exception for HTTP errors
         return response.text
     except requests.exceptions.RequestException as e:
         return f"Error creating ACH relationship for account {account_id}: {e}"
 
-# Process each account ID
-for account_id in account_ids:
-    print(f"Processing account ID: {account_id}")
-    result = create_ach_relationship(account_id)
-    print(result)
+def create_all(account_ids=None):
+    """
+    Create an ACH relationship for every account.
+
+    Args:
+        account_ids (iterable): Account IDs to process. Every account in the
+            Broker API when None.
+    """
+    if account_ids is None:
+        account_ids = (account['id'] for account in account_get_all.iter_accounts())
+
+    # Process each account ID
+    for account_id in account_ids:
+        print(f"Processing account ID: {account_id}")
+        result = create_ach_relationship(account_id)
+        print(result)
+
+def main():
+    try:
+        create_all()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching accounts: {e}")
+
+if __name__ == "__main__":
+    main()
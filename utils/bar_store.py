@@ -0,0 +1,246 @@
+import os
+import shutil
+import requests
+import numpy as np
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from utils import http_client
+
+# Market data endpoint for historical bars
+BARS_PATH = "/v2/stocks/{symbol}/bars"
+
+# Bars per page (the API maximum)
+PAGE_LIMIT = 10000
+
+# Where partitions are stored, overridable from .env
+STORE_DIR = os.getenv("bar_store_dir", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bars"))
+
+# Columns of a partition and their dtypes. 't' is the bar start in UTC nanoseconds.
+COLUMNS = {
+    "t": np.int64,
+    "o": np.float64,
+    "h": np.float64,
+    "l": np.float64,
+    "c": np.float64,
+    "v": np.float64,
+    "n": np.int64,
+    "vw": np.float64,
+}
+
+# Regular session, in exchange time
+MARKET_TZ = ZoneInfo("America/New_York")
+SESSION_OPEN = time(9, 30)
+SESSION_MINUTES = 390
+
+def partition_dir(symbol, day, root=STORE_DIR):
+    """
+    Directory holding one symbol-day partition.
+
+    Args:
+        symbol (str): Stock symbol.
+        day (datetime.date): Trading day (exchange time).
+        root (str): Store root.
+
+    Returns:
+        str: Path such as <root>/NDAQ/2024-01-02.
+    """
+    return os.path.join(root, symbol.upper(), day.isoformat())
+
+def has_day(symbol, day, root=STORE_DIR):
+    return os.path.isdir(partition_dir(symbol, day, root))
+
+def load_day(symbol, day, root=STORE_DIR):
+    """
+    Open one partition as memory-mapped, read-only column arrays.
+
+    Args:
+        symbol (str): Stock symbol.
+        day (datetime.date): Trading day.
+        root (str): Store root.
+
+    Returns:
+        dict: {column: numpy.memmap} (zero-length arrays on market holidays),
+            or None if the day has not been downloaded.
+    """
+    path = partition_dir(symbol, day, root)
+    if not os.path.isdir(path):
+        return None
+    return {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") for column in COLUMNS}
+
+def _write_day(symbol, day, bars, root):
+    """
+    Write one partition atomically, so a crash never leaves half a day behind.
+    """
+    final = partition_dir(symbol, day, root)
+    temporary = final + ".tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for column, dtype in COLUMNS.items():
+        if column == "t":
+            values = np.array([bar["t"].rstrip("Z") for bar in bars], dtype="datetime64[ns]").astype(np.int64)
+        else:
+            values = np.array([bar.get(column, 0) for bar in bars], dtype=dtype)
+        np.save(os.path.join(temporary, f"{column}.npy"), values)
+    os.replace(temporary, final)
+
+def _missing_ranges(symbol, start, end, root):
+    """
+    Group the days in [start, end] that are not stored into contiguous ranges.
+    """
+    ranges = []
+    day = start
+    while day <= end:
+        if not has_day(symbol, day, root):
+            if ranges and ranges[-1][1] == day - timedelta(days=1):
+                ranges[-1][1] = day
+            else:
+                ranges.append([day, day])
+        day += timedelta(days=1)
+    return ranges
+
+def _market_day(timestamp):
+    utc = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return utc.astimezone(MARKET_TZ).date()
+
+def _rfc3339(day, end_of_day=False):
+    moment = datetime.combine(day, time(23, 59, 59) if end_of_day else time(0), MARKET_TZ)
+    return moment.isoformat()
+
+def download(symbol, start, end, feed="iex", root=STORE_DIR):
+    """
+    Download the minute bars of every stored-missing day in [start, end].
+
+    Only completed days are stored: the range is clipped to yesterday in
+    exchange time. Days without bars (weekends, holidays) are stored empty so
+    they are not requested again.
+
+    Args:
+        symbol (str): Stock symbol.
+        start (datetime.date): First day.
+        end (datetime.date): Last day.
+        feed (str): Data feed, 'iex' or 'sip'.
+        root (str): Store root.
+
+    Returns:
+        int: Number of days written.
+    """
+    end = min(end, datetime.now(MARKET_TZ).date() - timedelta(days=1))
+    written = 0
+    for range_start, range_end in _missing_ranges(symbol, start, end, root):
+        params = {
+            "timeframe": "1Min",
+            "start": _rfc3339(range_start),
+            "end": _rfc3339(range_end, end_of_day=True),
+            "limit": PAGE_LIMIT,
+            "adjustment": "raw",
+            "feed": feed,
+        }
+        path = BARS_PATH.format(symbol=symbol.upper())
+
+        # Bars arrive in time order, so each day is flushed as soon as the next one starts
+        day, bars = range_start, []
+        while True:
+            response = http_client.get("data", path, params=params)
+            response.raise_for_status()
+            page = response.json()
+            for bar in page.get("bars") or []:
+                bar_day = _market_day(bar["t"])
+                while bar_day > day:
+                    _write_day(symbol, day, bars, root)
+                    written += 1
+                    day, bars = day + timedelta(days=1), []
+                bars.append(bar)
+            if not page.get("next_page_token"):
+                break
+            params["page_token"] = page["next_page_token"]
+
+        while day <= range_end:
+            _write_day(symbol, day, bars, root)
+            written += 1
+            day, bars = day + timedelta(days=1), []
+    return written
+
+def iter_days(symbol, start, end, root=STORE_DIR):
+    """
+    Yield the stored trading days in [start, end] as zero-copy column views.
+
+    Args:
+        symbol (str): Stock symbol.
+        start (datetime.date): First day.
+        end (datetime.date): Last day.
+        root (str): Store root.
+
+    Yields:
+        tuple: (day, {column: numpy.memmap}) for every stored day with bars.
+    """
+    day = start
+    while day <= end:
+        columns = load_day(symbol, day, root)
+        if columns is not None and len(columns["t"]):
+            yield day, columns
+        day += timedelta(days=1)
+
+def session_matrix(symbol, start, end, column="c", root=STORE_DIR):
+    """
+    Build a (days, 390) array of one column over the regular session.
+
+    Minutes without a bar take the previous minute's value (or the first
+    available one at the open); days without regular-session bars are skipped.
+    Unlike iter_days this copies, into the layout utils.simulate expects.
+
+    Args:
+        symbol (str): Stock symbol.
+        start (datetime.date): First day.
+        end (datetime.date): Last day.
+        column (str): Column to extract, close prices by default.
+        root (str): Store root.
+
+    Returns:
+        tuple: (days, matrix) with days a list of datetime.date.
+    """
+    days, rows = [], []
+    for day, columns in iter_days(symbol, start, end, root):
+        open_utc = datetime.combine(day, SESSION_OPEN, MARKET_TZ)
+        open_ns = int(open_utc.timestamp()) * 1_000_000_000
+        minute = (columns["t"] - open_ns) // 60_000_000_000
+        inside = (minute >= 0) & (minute < SESSION_MINUTES)
+        if not inside.any():
+            continue
+
+        row = np.full(SESSION_MINUTES, np.nan)
+        row[minute[inside]] = columns[column][inside]
+        # Forward-fill gaps, then back-fill the open
+        filled = np.where(np.isnan(row), 0, np.arange(SESSION_MINUTES))
+        np.maximum.accumulate(filled, out=filled)
+        row = row[filled]
+        first = np.flatnonzero(~np.isnan(row))[0]
+        row[:first] = row[first]
+
+        days.append(day)
+        rows.append(row)
+
+    matrix = np.vstack(rows) if rows else np.empty((0, SESSION_MINUTES))
+    return days, matrix
+
+def load_session_matrix(symbol, start, end, column="c", feed="iex", root=STORE_DIR):
+    """
+    Download whatever is missing, then build the session matrix.
+
+    Args:
+        symbol (str): Stock symbol.
+        start (datetime.date): First day.
+        end (datetime.date): Last day.
+        column (str): Column to extract.
+        feed (str): Data feed, 'iex' or 'sip'.
+        root (str): Store root.
+
+    Returns:
+        tuple: (days, matrix), see session_matrix().
+    """
+    try:
+        written = download(symbol, start, end, feed, root)
+        if written:
+            print(f"Downloaded {written} days of {symbol} bars.")
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading {symbol} bars: {e}")
+    return session_matrix(symbol, start, end, column, root)
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from utils import (http_client, rate_limit, fake_alpaca, order, close_orders, close_positions, bootstrap,
+                   account_get_balance, flatten, state_store, journal)
+from utils.generate_ratios import generate_profit_ratios
+
+# max_ratio values benchmarked by default: 21, 210 and 2,016 ratios
+GRID_SIZES = (6, 20, 63)
+
+# Seconds of simulated latency per request
+DEFAULT_LATENCY = 0.05
+
+# Symbol traded by the benchmark
+BENCH_SYMBOL = "BENCH"
+
+# Seconds between samples of the live thread count
+THREAD_SAMPLE_INTERVAL = 0.002
+
+# Results are written here unless another path is given
+script_dir = os.path.dirname(os.path.abspath(__file__))
+results_file = os.path.join(script_dir, "JSON", "benchmark_results.json")
+
+class _ThreadSampler:
+    """
+    Track the peak number of live threads while a case runs.
+    """
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(THREAD_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def measure(case, fake, function, *args, memory=True, **kwargs):
+    """
+    Run one benchmark case and measure it.
+
+    Output printed by the case is discarded. The fake server runs in the same
+    process, so its handler threads and allocations are included.
+
+    Args:
+        case (str): Case name.
+        fake (fake_alpaca.FakeAlpaca): Server the case talks to; its request counter is read.
+        function (callable): The code under test, called with *args and **kwargs.
+        memory (bool): Track peak Python memory with tracemalloc (slows the case down).
+
+    Returns:
+        dict: {"case", "wall_s", "requests", "rps", "peak_threads", "peak_memory_mb"}
+    """
+    requests_before = fake.request_count
+    if memory:
+        tracemalloc.start()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull), _ThreadSampler() as sampler:
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        wall = time.perf_counter() - start
+    peak_memory = None
+    if memory:
+        peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    requests_made = fake.request_count - requests_before
+    return {
+        "case": case,
+        "wall_s": round(wall, 4),
+        "requests": requests_made,
+        "rps": round(requests_made / wall, 1) if wall else None,
+        "peak_threads": sampler.peak,
+        "peak_memory_mb": round(peak_memory, 2) if peak_memory is not None else None,
+    }
+
+def run_grid(max_ratio, latency=DEFAULT_LATENCY, jitter=0.0, max_workers=order.MAX_WORKERS, memory=True):
+    """
+    Benchmark every path for one grid size against a fresh fake server.
+
+    Cases run in order, each on the state the previous ones left behind:
+    trade, cancel_orders, close_positions, bootstrap, balances,
+    trade_sub_accounts and flatten.
+
+    Args:
+        max_ratio (int): Passed to generate_profit_ratios.
+        latency (float): Seconds of simulated latency per request.
+        jitter (float): Maximum extra random seconds per request.
+        max_workers (int): Worker pool size of the trading and bootstrap paths.
+        memory (bool): Track peak Python memory.
+
+    Returns:
+        list: measure() results, each with 'ratios' added.
+    """
+    server, base_url = fake_alpaca.serve(latency=latency, jitter=jitter)
+    http_client.configure(paper_url=base_url, data_url=base_url, broker_url=base_url)
+    fake = server.fake
+    ratios = len(generate_profit_ratios(max_ratio))
+    results = []
+    journal_path = journal.JOURNAL_PATH
+    with tempfile.TemporaryDirectory() as directory:
+        store = state_store.StateStore(os.path.join(directory, "state.db"))
+        # Keep fake orders out of the real order journal
+        journal.JOURNAL_PATH = os.path.join(directory, "orders.v1.bin")
+        # price_ttl=0: every trading case fetches its own entry price, rather than
+        # reusing one cached by an earlier case or grid
+        cases = [
+            ("trade", order.run_trading, (BENCH_SYMBOL, max_ratio, max_workers), {"price_ttl": 0, "store": store}),
+            ("cancel_orders", close_orders.delete_orders, (), {}),
+            ("close_positions", close_positions.delete_positions, (), {}),
+            ("bootstrap", bootstrap.run_bootstrap, (max_ratio, max_workers), {"store": store}),
+            ("balances", account_get_balance.process_accounts, (store,), {"max_age": 0}),
+            ("trade_sub_accounts", order.run_trading_accounts, (BENCH_SYMBOL, max_ratio, max_workers),
+             {"price_ttl": 0, "store": store}),
+            ("flatten", lambda: flatten.flatten_all(flatten.managed_accounts(store=store), poll=0.05), (), {}),
+        ]
+        try:
+            for case, function, args, kwargs in cases:
+                result = measure(case, fake, function, *args, memory=memory, **kwargs)
+                result["ratios"] = ratios
+                results.append(result)
+        finally:
+            journal.close_all()
+            journal.JOURNAL_PATH = journal_path
+            store.close()
+            server.shutdown()
+            server.server_close()
+            fake.stop()
+    return results
+
+def run_benchmarks(grid_sizes=GRID_SIZES, latency=DEFAULT_LATENCY, jitter=0.0, max_workers=order.MAX_WORKERS,
+                   memory=True, file_path=results_file):
+    """
+    Run the benchmark suite for every grid size and save the results as JSON.
+
+    The shared rate limiters are lifted for the run, since the fake server
+    does not limit requests unless asked to.
+
+    Args:
+        grid_sizes (tuple): max_ratio values to benchmark.
+        latency (float): Seconds of simulated latency per request.
+        jitter (float): Maximum extra random seconds per request.
+        max_workers (int): Worker pool size of the trading and bootstrap paths.
+        memory (bool): Track peak Python memory.
+        file_path (str): Where the results are written.
+
+    Returns:
+        dict: The saved report.
+    """
+    saved_urls = {api: config["base_url"] for api, config in http_client.APIS.items()}
+    for api in rate_limit.REQUESTS_PER_MINUTE:
+        rate_limit.set_limit(api, 10 ** 9)
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {"latency": latency, "jitter": jitter, "max_workers": max_workers, "memory": memory},
+        "results": [],
+    }
+    try:
+        for max_ratio in grid_sizes:
+            for result in run_grid(max_ratio, latency, jitter, max_workers, memory):
+                report["results"].append(result)
+                print_result(result)
+    finally:
+        http_client.configure(saved_urls["paper"], saved_urls["data"], saved_urls["broker"])
+        for api, per_minute in rate_limit.REQUESTS_PER_MINUTE.items():
+            rate_limit.set_limit(api, per_minute)
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"Benchmark results saved to {file_path}")
+    return report
+
+def print_result(result):
+    memory = f"{result['peak_memory_mb']:>9.1f}" if result["peak_memory_mb"] is not None else f"{'-':>9}"
+    print(f"{result['case']:<20} {result['ratios']:>6} {result['wall_s']:>9.3f} {result['requests']:>8} "
+          f"{result['rps']:>9} {result['peak_threads']:>8} {memory}")
+
+def main(grid_sizes=GRID_SIZES, latency=DEFAULT_LATENCY, memory=True, file_path=results_file):
+    print(f"{'case':<20} {'ratios':>6} {'wall_s':>9} {'requests':>8} {'rps':>9} {'threads':>8} {'mem_mb':>9}")
+    run_benchmarks(grid_sizes, latency, memory=memory, file_path=file_path)
+
+if __name__ == "__main__":
+    main()
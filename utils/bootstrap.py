@@ -0,0 +1,155 @@
+import json
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import http_client, state_store, account_get_balance
+from utils.account_creation import create_account, PAYLOAD_TEMPLATE
+from utils.ach_relationship_create import ACH_PAYLOAD
+from utils.generate_ratios import generate_profit_ratios
+
+# Broker API endpoint for accounts
+ACCOUNTS_PATH = "/v1/accounts"
+
+# Accounts provisioned concurrently
+MAX_WORKERS = 16
+
+# Balance each account is topped up to
+TARGET_BALANCE = account_get_balance.TARGET_BALANCE
+
+def ratio_email(ratio):
+    """
+    Build the account email used for a profit ratio.
+
+    Args:
+        ratio (list): [take_profit, stop_loss] pair.
+
+    Returns:
+        str: Email such as '0.02/0.01@email.com'.
+    """
+    return f"{ratio[0]}/{ratio[1]}@email.com"
+
+def load_accounts(store=None):
+    """
+    Load previously provisioned accounts, keyed by email prefix.
+
+    Args:
+        store (state_store.StateStore): Store to read. The default store when None.
+
+    Returns:
+        dict: {email_prefix: {"account_id", "email", "ach_id"}}, empty if nothing is stored.
+    """
+    return (store or state_store.get_store()).accounts_by_email()
+
+def _check(response):
+    response.raise_for_status()
+    return response.json()
+
+def provision_account(ratio, existing=None, target_balance=TARGET_BALANCE, store=None):
+    """
+    Run one account through create -> ACH link -> lookup -> balance check -> transfer.
+
+    Every step is saved to the state store as soon as it succeeds, and steps
+    already recorded in `existing` (account id, ACH id) are skipped, so a
+    partially provisioned account resumes where it stopped.
+
+    Args:
+        ratio (list): [take_profit, stop_loss] pair the account trades.
+        existing (dict): Previously saved record for this account, if any.
+        target_balance (float): Balance the account is topped up to.
+        store (state_store.StateStore): Store the steps are saved to. The default store when None.
+
+    Returns:
+        dict: {"key": email prefix, "record": saved account record, "error": failed step or None}.
+    """
+    store = store or state_store.get_store()
+    email = ratio_email(ratio)
+    email_prefix = email.split('@')[0]
+    record = dict(existing or {})
+    stage = "create"
+    try:
+        # Create
+        if not record.get("account_id"):
+            account = json.loads(create_account(email, PAYLOAD_TEMPLATE))
+            if "id" not in account:
+                raise ValueError(account.get("message", account))
+            record["account_id"] = account["id"]
+            store.upsert_account(account["id"], email=email_prefix, status=account.get("status"),
+                                 created_at=account.get("created_at"))
+        account_id = record["account_id"]
+
+        # ACH link
+        stage = "ach"
+        if not record.get("ach_id"):
+            path = f"{ACCOUNTS_PATH}/{account_id}/ach_relationships"
+            record["ach_id"] = _check(http_client.post("broker", path, json=ACH_PAYLOAD))["id"]
+            store.upsert_ach(account_id, record["ach_id"])
+
+        # Lookup
+        stage = "lookup"
+        details = _check(http_client.get("broker", f"{ACCOUNTS_PATH}/{account_id}"))
+        record["email"] = details.get("contact", {}).get("email_address", email).split('@')[0]
+        store.upsert_account(account_id, email=record["email"], status=details.get("status"))
+
+        # Balance check
+        stage = "balance"
+        balance = account_get_balance.get_balance(account_id)
+        store.set_balance(account_id, balance)
+
+        # Transfer
+        stage = "transfer"
+        amount_needed = target_balance - balance
+        if amount_needed > 0:
+            payload = {
+                "transfer_type": "ach",
+                "direction": "INCOMING",
+                "timing": "immediate",
+                "amount": f"{amount_needed:.2f}",
+                "relationship_id": record["ach_id"]
+            }
+            transfer = _check(http_client.post("broker", f"{ACCOUNTS_PATH}/{account_id}/transfers", json=payload))
+            store.record_transfer(account_id, payload["amount"], record["ach_id"], transfer.get("id"))
+            account_get_balance.invalidate(account_id)
+
+        print(f"Provisioned {email_prefix} ({account_id}): balance ${balance:.2f}, "
+              f"transferred ${max(amount_needed, 0):.2f}")
+        return {"key": email_prefix, "record": record, "error": None}
+
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"Failed at {stage} for {email_prefix}: {e}")
+        return {"key": email_prefix, "record": record, "error": f"{stage}: {e}"}
+
+def run_bootstrap(max_ratio=6, max_workers=MAX_WORKERS, target_balance=TARGET_BALANCE, store=None):
+    """
+    Provision one funded broker account per profit ratio, with bounded concurrency.
+
+    Each account moves to its next step as soon as its previous step finishes,
+    and each step is saved to the state store as it completes.
+
+    Args:
+        max_ratio (int): Passed to generate_profit_ratios.
+        max_workers (int): Maximum number of accounts provisioned at once.
+        target_balance (float): Balance every account is topped up to.
+        store (state_store.StateStore): Store provisioned accounts are read from and saved to.
+
+    Returns:
+        dict: {email_prefix: error} for accounts that did not finish.
+    """
+    store = store or state_store.get_store()
+    accounts = load_accounts(store)
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for ratio in generate_profit_ratios(max_ratio):
+            existing = accounts.get(ratio_email(ratio).split('@')[0])
+            futures.append(executor.submit(provision_account, ratio, existing, target_balance, store))
+
+        for future in as_completed(futures):
+            result = future.result()
+            if result["error"]:
+                failures[result["key"]] = result["error"]
+
+    print(f"{len(futures) - len(failures)} accounts provisioned in {store.path}, {len(failures)} failed.")
+    return failures
+
+if __name__ == "__main__":
+    run_bootstrap()
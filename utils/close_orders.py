@@ -1,27 +1,13 @@
 import requests
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Constants for API credentials
-API_KEY = os.getenv("alpaca_key")
-SECRET_KEY = os.getenv("alpaca_secret")
-
-# Common headers for Alpaca API
-HEADERS = {
-    "accept": "application/json",
-    "APCA-API-KEY-ID": API_KEY,
-    "APCA-API-SECRET-KEY": SECRET_KEY,
-}
+from utils import http_client
 
 def delete_orders():
     """
     Cancel all orders by sending a DELETE request to the orders endpoint.
     """
-    orders_url = "https://paper-api.alpaca.markets/v2/orders"
+    orders_path = "/v2/orders"
     try:
-        response = requests.delete(orders_url, headers=HEADERS)
+        response = http_client.delete("paper", orders_path)
         response.raise_for_status()
         print("Orders canceled successfully:")
         print(response.text)
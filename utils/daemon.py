@@ -0,0 +1,353 @@
+import os
+import re
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import http_client, order, state_store, trade_stream, price_feed
+from utils.bar_store import MARKET_TZ
+
+# Market clock and trading calendar of the trading API
+CLOCK_PATH = "/v2/clock"
+CALENDAR_PATH = "/v2/calendar"
+
+# Minutes after the open each session is placed
+OPEN_OFFSET_MINUTES = 5
+
+# Seconds before a session the connection pools are warmed and the clock is checked
+WARMUP_LEAD = 20.0
+
+# Days of calendar looked up when searching for the next session
+CALENDAR_DAYS = 14
+
+# Seconds between calendar lookups when no session is scheduled (or the lookup failed)
+IDLE_RECHECK = 900.0
+
+# Longest single sleep, so a suspended or adjusted system clock is noticed
+MAX_SLEEP = 60.0
+
+# Local status endpoint, overridable from .env
+STATUS_HOST = "127.0.0.1"
+STATUS_PORT = int(os.getenv("daemon_status_port", "8765"))
+
+# Alpaca timestamps can carry nanoseconds; datetime parses at most microseconds
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+def parse_time(value):
+    """
+    Parse an API timestamp such as '2024-01-02T09:30:00.123456789-05:00'.
+
+    Returns:
+        datetime: Timezone-aware datetime.
+    """
+    return datetime.fromisoformat(_FRACTION.sub(r"\1", value.replace("Z", "+00:00")))
+
+def session_times(day, offset_minutes=OPEN_OFFSET_MINUTES):
+    """
+    Scheduled time and close of one trading day's session.
+
+    Args:
+        day (dict): Calendar entry with 'date', 'open' and 'close' (New York time).
+        offset_minutes (float): Minutes after the open the session is placed.
+
+    Returns:
+        tuple: (scheduled, close) as UTC datetimes.
+    """
+    open_at = datetime.fromisoformat(f"{day['date']}T{day['open']}").replace(tzinfo=MARKET_TZ)
+    close_at = datetime.fromisoformat(f"{day['date']}T{day['close']}").replace(tzinfo=MARKET_TZ)
+    scheduled = open_at + timedelta(minutes=offset_minutes)
+    return scheduled.astimezone(timezone.utc), close_at.astimezone(timezone.utc)
+
+def next_session(offset_minutes=OPEN_OFFSET_MINUTES, now=None, calendar=None):
+    """
+    Find the next session time from the trading calendar.
+
+    Weekends, holidays and days whose session would fall after an early
+    close are skipped.
+
+    Args:
+        offset_minutes (float): Minutes after the open the session is placed.
+        now (datetime): Current time. The system clock when None.
+        calendar (list): Calendar entries to search. Fetched when None.
+
+    Returns:
+        datetime: UTC time of the next session, or None if none is found.
+    """
+    now = now or datetime.now(timezone.utc)
+    if calendar is None:
+        today = now.astimezone(MARKET_TZ).date()
+        response = http_client.get("paper", CALENDAR_PATH, params={
+            "start": today.isoformat(), "end": (today + timedelta(days=CALENDAR_DAYS)).isoformat()})
+        response.raise_for_status()
+        calendar = response.json()
+    for day in calendar:
+        scheduled, close_at = session_times(day, offset_minutes)
+        if now < scheduled < close_at:
+            return scheduled
+    return None
+
+class Daemon:
+    """
+    Long-running process that places one trading session per market day.
+
+    Sessions run at the open plus `offset_minutes`, on days the trading
+    calendar lists. Shortly before each session the HTTP pools are warmed and
+    the market clock confirms the session falls within trading hours, so the
+    orders go out over open connections right at the scheduled time. The
+    trade_updates listener and the streaming price feed live as long as the
+    process, so entry prices are read from memory rather than fetched.
+
+    Args:
+        symbols (str): Symbols traded each session, as for order.run_trading_universe.
+            None trades order.run_trading's default symbol.
+        profit_ratios_count (int): Passed to generate_profit_ratios.
+        offset_minutes (float): Minutes after the open each session is placed.
+        listen (bool): Keep a trade_updates listener recording bracket outcomes.
+        feed (bool): Keep a market data stream subscription for entry prices.
+        status_port (int): Port of the local status endpoint. None disables it.
+    """
+
+    def __init__(self, symbols=None, profit_ratios_count=20, offset_minutes=OPEN_OFFSET_MINUTES, listen=True,
+                 feed=True, status_port=STATUS_PORT):
+        self.symbols = symbols
+        self.profit_ratios_count = profit_ratios_count
+        self.offset_minutes = offset_minutes
+        self.listen = listen
+        self.feed = feed
+        self.status_port = status_port
+        self.order_book = None
+        self.listener = None
+        self.status_server = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._status = {
+            "state": "starting",
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "symbols": symbols,
+            "offset_minutes": offset_minutes,
+            "next_session": None,
+            "sessions": 0,
+            "last_session": None,
+            "clock_skew_ms": None,
+            "error": None,
+        }
+
+    def status(self):
+        with self._lock:
+            status = dict(self._status)
+        if self.order_book is not None:
+            status["open_brackets"] = self.order_book.open_orders()
+            status["stream_connected"] = self.listener.connected.is_set()
+        feed = price_feed.get_feed() if self.feed else None
+        if feed is not None:
+            status["price_feed_connected"] = feed.connected.is_set()
+        return status
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def start(self):
+        """
+        Start the status endpoint and, if enabled, the trade_updates listener and price feed.
+        """
+        if self.status_port is not None:
+            self.status_server = serve_status(self, STATUS_HOST, self.status_port)
+            print(f"Status at http://{STATUS_HOST}:{self.status_server.server_address[1]}/status")
+        if self.listen:
+            self.order_book = trade_stream.OrderBook(store=state_store.get_store())
+            self.listener = trade_stream.TradeUpdatesListener(self.order_book)
+            if not self.listener.start():
+                print("trade_updates stream not connected yet; it keeps retrying in the background")
+        if self.feed:
+            price_feed.start_feed(order.load_symbols(self.symbols or "NDAQ"))
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self):
+        """
+        Stop the listener, price feed and status endpoint and close the HTTP pools.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.order_book.close()
+        if self.feed:
+            price_feed.stop_feed()
+        if self.status_server is not None:
+            self.status_server.shutdown()
+            self.status_server.server_close()
+        http_client.close()
+
+    def _sleep_until(self, moment):
+        """
+        Sleep until a UTC datetime.
+
+        Returns:
+            bool: True if the daemon was stopped first.
+        """
+        while True:
+            remaining = (moment - datetime.now(timezone.utc)).total_seconds()
+            if remaining <= 0:
+                return self._stop.is_set()
+            if self._stop.wait(min(remaining, MAX_SLEEP)):
+                return True
+
+    def warm(self, scheduled):
+        """
+        Warm the connection pools and check the session against the market clock.
+
+        Args:
+            scheduled (datetime): UTC time of the upcoming session.
+
+        Returns:
+            bool: True if the clock confirms the market is open at that time.
+        """
+        self._update(state="warming")
+        http_client.warm("paper", CLOCK_PATH, order.MAX_WORKERS)
+        symbols = order.load_symbols(self.symbols or "NDAQ")[:order.SYMBOLS_PER_REQUEST]
+        http_client.warm("data", order.LATEST_TRADES_PATH, 2, params={"symbols": ",".join(symbols)})
+
+        sent = datetime.now(timezone.utc)
+        response = http_client.get("paper", CLOCK_PATH)
+        received = datetime.now(timezone.utc)
+        response.raise_for_status()
+        clock = response.json()
+        # Server time minus local time, taking the server's reading as halfway through the request
+        skew = parse_time(clock["timestamp"]) - (sent + (received - sent) / 2)
+        self._update(clock_skew_ms=round(skew.total_seconds() * 1000, 1))
+        next_close = parse_time(clock["next_close"])
+        if clock["is_open"]:
+            return scheduled < next_close
+        return parse_time(clock["next_open"]) <= scheduled < next_close
+
+    def run_session(self, scheduled):
+        """
+        Place one session's orders and record how it went.
+
+        Errors are reported rather than raised, so one bad session does not
+        stop the daemon.
+
+        Args:
+            scheduled (datetime): UTC time the session was scheduled for.
+        """
+        started = datetime.now(timezone.utc)
+        self._update(state="trading")
+        error = None
+        start = time.perf_counter()
+        try:
+            if self.symbols:
+                order.run_trading_universe(self.symbols, self.profit_ratios_count, order_book=self.order_book)
+            else:
+                order.run_trading(profit_ratios_count=self.profit_ratios_count, order_book=self.order_book)
+        except Exception as e:
+            error = str(e)
+            print(f"Session scheduled for {scheduled.isoformat()} failed: {e}")
+        with self._lock:
+            self._status["sessions"] += 1
+            self._status["last_session"] = {
+                "scheduled": scheduled.isoformat(),
+                "started": started.isoformat(),
+                "lateness_ms": round((started - scheduled).total_seconds() * 1000, 1),
+                "seconds": round(time.perf_counter() - start, 3),
+                "error": error,
+            }
+
+    def run(self, max_sessions=None):
+        """
+        Schedule and run sessions until stopped.
+
+        Args:
+            max_sessions (int): Return after this many sessions. Runs until stopped when None.
+        """
+        self.start()
+        sessions = 0
+        try:
+            while not self._stop.is_set() and (max_sessions is None or sessions < max_sessions):
+                self._update(state="scheduling")
+                try:
+                    scheduled = next_session(self.offset_minutes)
+                except Exception as e:
+                    print(f"Error reading the trading calendar: {e}")
+                    self._update(state="idle", error=str(e))
+                    self._stop.wait(IDLE_RECHECK)
+                    continue
+                if scheduled is None:
+                    self._update(state="idle", next_session=None)
+                    self._stop.wait(IDLE_RECHECK)
+                    continue
+
+                self._update(state="waiting", next_session=scheduled.isoformat(), error=None)
+                print(f"Next session at {scheduled.astimezone(MARKET_TZ).isoformat()}")
+                if self._sleep_until(scheduled - timedelta(seconds=WARMUP_LEAD)):
+                    break
+                try:
+                    market_open = self.warm(scheduled)
+                except Exception as e:
+                    print(f"Error warming up: {e}")
+                    self._update(error=str(e))
+                    market_open = True  # the calendar already listed the session
+                if not market_open:
+                    print(f"The market clock does not have {scheduled.isoformat()} in trading hours; skipping")
+                    self._update(state="waiting", error="market closed at the scheduled time")
+                    self._sleep_until(scheduled + timedelta(seconds=1))
+                    continue
+                self._update(state="waiting")
+                if self._sleep_until(scheduled):
+                    break
+                self.run_session(scheduled)
+                sessions += 1
+        finally:
+            self._update(state="stopped")
+            self.shutdown()
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """
+    Serves the owning daemon's status() as JSON at / and /status.
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/status"):
+            code, payload = 404, {"message": "not found"}
+        else:
+            code, payload = 200, self.server.daemon_process.status()
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_status(daemon, host=STATUS_HOST, port=STATUS_PORT):
+    """
+    Start the local status endpoint on a background thread.
+
+    Args:
+        daemon (Daemon): Daemon whose status is served.
+        host (str): Interface to bind; keep it local.
+        port (int): Port to bind. 0 picks a free port.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    server.daemon_threads = True
+    server.daemon_process = daemon
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(symbols=None, profit_ratios_count=20, offset_minutes=OPEN_OFFSET_MINUTES, listen=True, feed=True,
+         status_port=STATUS_PORT):
+    daemon = Daemon(symbols, profit_ratios_count, offset_minutes, listen, feed, status_port)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("Daemon stopped")
+
+if __name__ == "__main__":
+    main()
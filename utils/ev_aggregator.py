@@ -0,0 +1,329 @@
+import os
+import json
+import numpy as np
+from utils import http_client, state_store
+from utils.generate_ratios import generate_profit_ratios
+from utils.trade_stream import outcomes_file
+
+# Aggregate state and read cursors, so each run only processes new outcomes
+script_dir = os.path.dirname(os.path.abspath(__file__))
+state_file = os.path.join(script_dir, "JSON", "ev_state.json")
+
+# Fill activities of the paper account, oldest first when direction=asc
+ACTIVITIES_PATH = "/v2/account/activities/FILL"
+
+# Most activities the API returns per page
+ACTIVITIES_PAGE_SIZE = 100
+
+# Ratio grid the table is seeded with; outcomes of other ratios add rows as they appear
+DEFAULT_MAX_RATIO = 20
+
+# Sides in column order
+SIDES = ("buy", "sell")
+
+# Decimal places ratios are matched on
+RATIO_DECIMALS = 6
+
+def _ratio_key(take_profit, stop_loss):
+    return round(float(take_profit), RATIO_DECIMALS), round(float(stop_loss), RATIO_DECIMALS)
+
+def realized_return(side, fill_price, exit_price):
+    """
+    Return of one closed bracket, as a fraction of its fill price.
+
+    Args:
+        side (str): 'buy' or 'sell' (the entry side).
+        fill_price (float): Entry fill price.
+        exit_price (float): Take-profit or stop-loss fill price.
+
+    Returns:
+        float: Positive when the bracket made money.
+    """
+    change = (exit_price - fill_price) / fill_price
+    return change if side == "buy" else -change
+
+class EVAggregator:
+    """
+    Running realized EV, variance and win rate per [take_profit, stop_loss] ratio and side.
+
+    Statistics are kept as count, mean and sum of squared deviations (M2) per
+    cell and updated one batch at a time: each batch is reduced with
+    np.bincount and merged into the totals with Chan's parallel update, so a
+    run costs only its new outcomes however long the history is.
+
+    Args:
+        profit_ratios (list): [take_profit, stop_loss] pairs the table starts with.
+    """
+
+    def __init__(self, profit_ratios=None):
+        self.ratios = []
+        self.rows = {}          # {(take_profit, stop_loss): row}
+        self.count = np.zeros((0, len(SIDES)), dtype=np.int64)
+        self.mean = np.zeros((0, len(SIDES)))
+        self.m2 = np.zeros((0, len(SIDES)))
+        self.wins = np.zeros((0, len(SIDES)), dtype=np.int64)
+        self.cursors = {}       # {source: position already read}
+        for take_profit, stop_loss in profit_ratios or []:
+            self.row(take_profit, stop_loss)
+
+    def row(self, take_profit, stop_loss):
+        """
+        Row of a ratio, added to the table if it is new.
+        """
+        key = _ratio_key(take_profit, stop_loss)
+        row = self.rows.get(key)
+        if row is None:
+            row = self.rows[key] = len(self.ratios)
+            self.ratios.append(list(key))
+            if row >= len(self.count):
+                grow = max(len(self.count), 64)
+                self.count = np.vstack([self.count, np.zeros((grow, len(SIDES)), dtype=np.int64)])
+                self.mean = np.vstack([self.mean, np.zeros((grow, len(SIDES)))])
+                self.m2 = np.vstack([self.m2, np.zeros((grow, len(SIDES)))])
+                self.wins = np.vstack([self.wins, np.zeros((grow, len(SIDES)), dtype=np.int64)])
+        return row
+
+    def add_batch(self, rows, sides, returns):
+        """
+        Merge a batch of realized returns into the totals.
+
+        Args:
+            rows (array): Ratio row of each outcome (see row()).
+            sides (array): Side column of each outcome (0 buy, 1 sell).
+            returns (array): Realized return of each outcome.
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        if not len(returns):
+            return
+        cells = np.asarray(rows, dtype=np.int64) * len(SIDES) + np.asarray(sides, dtype=np.int64)
+        size = self.count.size
+
+        batch_count = np.bincount(cells, minlength=size)
+        touched = batch_count > 0
+        batch_mean = np.zeros(size)
+        batch_mean[touched] = np.bincount(cells, weights=returns, minlength=size)[touched] / batch_count[touched]
+        batch_m2 = np.bincount(cells, weights=(returns - batch_mean[cells]) ** 2, minlength=size)
+        batch_wins = np.bincount(cells, weights=returns > 0, minlength=size).astype(np.int64)
+
+        count, mean, m2 = self.count.reshape(-1), self.mean.reshape(-1), self.m2.reshape(-1)
+        total = count + batch_count
+        delta = batch_mean - mean
+        mean[touched] += delta[touched] * batch_count[touched] / total[touched]
+        m2[touched] += batch_m2[touched] + delta[touched] ** 2 * count[touched] * batch_count[touched] / total[touched]
+        count += batch_count
+        self.wins.reshape(-1)[:] += batch_wins
+
+    def add_outcomes(self, outcomes):
+        """
+        Merge closed bracket records (as written by trade_stream.OrderBook).
+
+        Brackets that never filled, have no exit price or no ratio are skipped.
+
+        Args:
+            outcomes (iterable): Dicts with 'ratio', 'side', 'fill_price' and 'exit_price'.
+
+        Returns:
+            int: Number of outcomes merged.
+        """
+        rows, sides, returns = [], [], []
+        for outcome in outcomes:
+            if not outcome.get("ratio") or outcome.get("fill_price") is None or outcome.get("exit_price") is None:
+                continue
+            rows.append(self.row(*outcome["ratio"]))
+            sides.append(SIDES.index(outcome["side"]))
+            returns.append(realized_return(outcome["side"], outcome["fill_price"], outcome["exit_price"]))
+        self.add_batch(rows, sides, returns)
+        return len(returns)
+
+    def update_from_outcomes(self, path=outcomes_file):
+        """
+        Merge the outcomes appended to a bracket outcomes file since the last read.
+
+        Args:
+            path (str): JSON-lines file written by trade_stream.OrderBook.
+
+        Returns:
+            int: Number of outcomes merged.
+        """
+        if not os.path.exists(path):
+            return 0
+        offset = self.cursors.get("outcomes", 0)
+        if os.path.getsize(path) < offset:
+            print(f"{path} is shorter than when last read; reading it from the start")
+            offset = 0
+        with open(path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+        # A line still being written is left for the next run
+        end = data.rfind(b"\n") + 1
+        merged = self.add_outcomes(json.loads(line) for line in data[:end].splitlines() if line.strip())
+        self.cursors["outcomes"] = offset + end
+        return merged
+
+    def update_from_activities(self, store=None, page_size=ACTIVITIES_PAGE_SIZE):
+        """
+        Merge the bracket exits among the account's fill activities since the last read.
+
+        Fills are attributed through the orders table of the state store: an
+        entry fill records its price on the parent order, and a take-profit or
+        stop-loss fill is joined to its parent for the ratio, side and entry
+        price. Partial fills are skipped; the final fill's price is used.
+
+        Args:
+            store (state_store.StateStore): Store the orders were registered in. The default store when None.
+            page_size (int): Activities per request.
+
+        Returns:
+            int: Number of outcomes merged.
+        """
+        store = store or state_store.get_store()
+        merged = 0
+        while True:
+            params = {"direction": "asc", "page_size": page_size}
+            if self.cursors.get("activities"):
+                params["page_token"] = self.cursors["activities"]
+            response = http_client.get("paper", ACTIVITIES_PATH, params=params)
+            response.raise_for_status()
+            activities = response.json()
+            if not activities:
+                break
+            merged += self._merge_fills(store, [activity for activity in activities if activity.get("type") == "fill"])
+            self.cursors["activities"] = activities[-1]["id"]
+            if len(activities) < page_size:
+                break
+        return merged
+
+    def _merge_fills(self, store, fills):
+        orders = store.orders_by_id(fill["order_id"] for fill in fills)
+        parent_ids = {row["parent_id"] for row in orders.values() if row["parent_id"]}
+        orders.update(store.orders_by_id(parent_ids - orders.keys()))
+
+        entries = {}            # {parent_id: fill price} of entries filled in this page
+        updates, outcomes = [], []
+        for fill in fills:
+            row = orders.get(fill["order_id"])
+            if row is None:
+                continue        # not placed by this project
+            price = float(fill["price"])
+            if row["parent_id"] is None:
+                entries[row["order_id"]] = price
+                updates.append({"order_id": row["order_id"], "fill_price": price})
+                continue
+            parent = orders.get(row["parent_id"])
+            fill_price = entries.get(row["parent_id"], parent["fill_price"] if parent else None)
+            if parent is None or fill_price is None or parent["take_profit"] is None:
+                continue
+            outcome = "take_profit" if row["type"] == "limit" else "stop_loss"
+            updates.append({"order_id": parent["order_id"], "exit_price": price, "outcome": outcome})
+            outcomes.append({"ratio": [parent["take_profit"], parent["stop_loss"]], "side": parent["side"],
+                             "fill_price": fill_price, "exit_price": price})
+        store.upsert_orders(updates)
+        return self.add_outcomes(outcomes)
+
+    def summary(self):
+        """
+        Per-cell statistics of every ratio and side with at least one outcome.
+
+        Returns:
+            list: Dicts with 'take_profit', 'stop_loss', 'side', 'count', 'ev'
+                (mean return), 'std' (sample standard deviation) and 'win_rate'.
+        """
+        rows = []
+        for row, (take_profit, stop_loss) in enumerate(self.ratios):
+            for column, side in enumerate(SIDES):
+                count = int(self.count[row, column])
+                if not count:
+                    continue
+                rows.append({
+                    "take_profit": take_profit,
+                    "stop_loss": stop_loss,
+                    "side": side,
+                    "count": count,
+                    "ev": float(self.mean[row, column]),
+                    "std": float(np.sqrt(self.m2[row, column] / (count - 1))) if count > 1 else None,
+                    "win_rate": float(self.wins[row, column] / count),
+                })
+        return rows
+
+    def save(self, path=state_file):
+        """
+        Write the totals and cursors, replacing the file in one step.
+        """
+        size = len(self.ratios)
+        state = {
+            "ratios": self.ratios,
+            "count": self.count[:size].tolist(),
+            "mean": self.mean[:size].tolist(),
+            "m2": self.m2[:size].tolist(),
+            "wins": self.wins[:size].tolist(),
+            "cursors": self.cursors,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path=state_file, profit_ratios=None):
+        """
+        Restore an aggregator saved by save(), or start a new one.
+
+        Args:
+            path (str): State file.
+            profit_ratios (list): Ratios a new aggregator starts with.
+
+        Returns:
+            EVAggregator: The restored (or new) aggregator.
+        """
+        if not os.path.exists(path):
+            return cls(profit_ratios)
+        with open(path) as file:
+            state = json.load(file)
+        aggregator = cls(state["ratios"])
+        size = len(state["ratios"])
+        if size:
+            aggregator.count[:size] = state["count"]
+            aggregator.mean[:size] = state["mean"]
+            aggregator.m2[:size] = state["m2"]
+            aggregator.wins[:size] = state["wins"]
+        aggregator.cursors = state["cursors"]
+        for take_profit, stop_loss in profit_ratios or []:
+            aggregator.row(take_profit, stop_loss)
+        return aggregator
+
+def print_summary(rows, limit=20):
+    """
+    Print the cells with the highest EV.
+    """
+    print(f"-------------------------\nRealized EV of {sum(row['count'] for row in rows)} brackets"
+          f"\n-------------------------")
+    print(f"{'take_profit':>11} {'stop_loss':>9} {'side':>4} {'count':>7} {'ev':>9} {'std':>9} {'win_rate':>8}")
+    for row in sorted(rows, key=lambda row: row["ev"], reverse=True)[:limit]:
+        std = f"{row['std']:>9.5f}" if row["std"] is not None else f"{'-':>9}"
+        print(f"{row['take_profit']:>11.2f} {row['stop_loss']:>9.2f} {row['side']:>4} {row['count']:>7} "
+              f"{row['ev']:>9.5f} {std} {row['win_rate']:>8.3f}")
+
+def main(source="outcomes", path=state_file, limit=20):
+    """
+    Merge the outcomes closed since the last run and print the EV table.
+
+    Args:
+        source (str): 'outcomes' reads the local bracket outcomes file;
+            'activities' reads the account's fill activities. Use one source
+            per state file, or outcomes are counted twice.
+        path (str): State file.
+        limit (int): Rows printed.
+    """
+    aggregator = EVAggregator.load(path, generate_profit_ratios(DEFAULT_MAX_RATIO))
+    if source == "activities":
+        merged = aggregator.update_from_activities()
+    else:
+        merged = aggregator.update_from_outcomes()
+    aggregator.save(path)
+    print(f"Merged {merged} new outcomes from {source}")
+    print_summary(aggregator.summary(), limit)
+    return aggregator
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import numpy as np
+from datetime import date
+from utils import bar_store, simulate
+from utils.generate_ratios import generate_profit_ratios
+
+# Bootstrap resamples drawn by default
+N_RESAMPLES = 10000
+
+# Two-sided confidence level of the intervals
+CONFIDENCE = 0.95
+
+# Upper bound on resample weights held at once (resamples x blocks)
+CHUNK_ELEMENTS = 2 ** 22
+
+def block_sums(returns, block_size=1):
+    """
+    Reduce an outcome matrix to sums over consecutive blocks of entries.
+
+    Args:
+        returns (numpy.ndarray): Returns of shape (..., entries), e.g. the
+            (n_ratios, 2, entries) 'returns' of simulate.simulate_outcomes().
+        block_size (int): Entries per block, resampled together. Use the
+            entries per day (bars - 1) to resample whole days.
+
+    Returns:
+        tuple: (sums, counts) of shapes (..., blocks) and (blocks,). A shorter
+            last block is kept.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    entries = returns.shape[-1]
+    starts = np.arange(0, entries, block_size)
+    sums = np.add.reduceat(returns, starts, axis=-1) if entries else returns
+    counts = np.diff(np.append(starts, entries)).astype(np.float64)
+    return sums, counts
+
+def bootstrap_means(sums, counts, n_resamples=N_RESAMPLES, seed=None):
+    """
+    Draw bootstrap resamples of the mean return of every row at once.
+
+    Each resample draws the blocks with replacement, expressed as a vector
+    of multinomial weights (how often each block was drawn). All rows share
+    the same resamples, so differences between rows are paired. The weighted
+    sums of a batch of resamples are one matrix product, and resamples are
+    processed in chunks of at most CHUNK_ELEMENTS weights.
+
+    Args:
+        sums (numpy.ndarray): Block sums of shape (..., blocks), see block_sums().
+        counts (numpy.ndarray): Entries per block, shape (blocks,).
+        n_resamples (int): Number of resamples.
+        seed (int): Seed of the random generator, for reproducible draws.
+
+    Returns:
+        numpy.ndarray: Resampled means of shape (..., n_resamples).
+    """
+    rng = np.random.default_rng(seed)
+    shape = sums.shape[:-1]
+    blocks = sums.shape[-1]
+    flat = sums.reshape(-1, blocks)
+    draws = np.empty((len(flat), n_resamples))
+    chunk = max(1, CHUNK_ELEMENTS // max(blocks, 1))
+
+    for first in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - first)
+        # Weight of each block in each resample: a multinomial(blocks, uniform) draw per row
+        picks = rng.integers(0, blocks, size=(size, blocks)) + (np.arange(size) * blocks)[:, None]
+        weights = np.bincount(picks.ravel(), minlength=size * blocks).reshape(size, blocks).astype(np.float64)
+        draws[:, first:first + size] = (flat @ weights.T) / (weights @ counts)
+    return draws.reshape(shape + (n_resamples,))
+
+def _p_values(draws, null=0.0):
+    """
+    Two-sided bootstrap p-values of each row's mean against a null value.
+    """
+    n_resamples = draws.shape[-1]
+    below = (draws <= null).sum(axis=-1)
+    above = (draws >= null).sum(axis=-1)
+    return np.minimum(1.0, 2 * (np.minimum(below, above) + 1) / (n_resamples + 1))
+
+def benjamini_hochberg(p_values):
+    """
+    Adjust p-values for the false discovery rate of testing many ratios at once.
+
+    Args:
+        p_values (array-like): p-values of any shape.
+
+    Returns:
+        numpy.ndarray: q-values of the same shape.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    flat = p_values.ravel()
+    order = np.argsort(flat)
+    ranked = flat[order] * len(flat) / np.arange(1, len(flat) + 1)
+    q_values = np.empty_like(flat)
+    q_values[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return q_values.reshape(p_values.shape)
+
+def confidence_intervals(sums, counts, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=None):
+    """
+    Bootstrap confidence intervals and zero-EV tests for every row at once.
+
+    Args:
+        sums (numpy.ndarray): Block sums of shape (..., blocks), see block_sums().
+        counts (numpy.ndarray): Entries per block, shape (blocks,).
+        n_resamples (int): Number of resamples.
+        confidence (float): Two-sided confidence level.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: 'ev', 'ci_low', 'ci_high', 'std_error', 'p_value' (against an EV
+            of zero) and 'q_value' (p_value adjusted across every row), each of
+            shape sums.shape[:-1], and 'draws' (..., n_resamples) for
+            paired_comparison().
+    """
+    draws = bootstrap_means(sums, counts, n_resamples, seed)
+    alpha = 1.0 - confidence
+    ci_low, ci_high = np.quantile(draws, [alpha / 2, 1 - alpha / 2], axis=-1)
+    p_value = _p_values(draws)
+    return {
+        "ev": sums.sum(axis=-1) / counts.sum(),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "std_error": draws.std(axis=-1, ddof=1),
+        "p_value": p_value,
+        "q_value": benjamini_hochberg(p_value),
+        "draws": draws,
+    }
+
+def paired_comparison(stats, reference=None, confidence=CONFIDENCE):
+    """
+    Compare every row's EV with one reference row on the same resamples.
+
+    Args:
+        stats (dict): Output of confidence_intervals().
+        reference (tuple): Index of the reference row, e.g. (ratio, side).
+            The row with the highest EV when None.
+        confidence (float): Two-sided confidence level.
+
+    Returns:
+        dict: 'reference' (its index), and 'difference' (row EV minus reference
+            EV), 'ci_low', 'ci_high' and 'p_value' (against no difference), each
+            of the shape of stats['ev'].
+    """
+    if reference is None:
+        reference = np.unravel_index(np.nanargmax(stats["ev"]), stats["ev"].shape)
+    reference = tuple(int(index) for index in reference)
+    differences = stats["draws"] - stats["draws"][reference]
+    alpha = 1.0 - confidence
+    ci_low, ci_high = np.quantile(differences, [alpha / 2, 1 - alpha / 2], axis=-1)
+    p_value = _p_values(differences)
+    p_value[reference] = 1.0
+    return {
+        "reference": reference,
+        "difference": stats["ev"] - stats["ev"][reference],
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "p_value": p_value,
+    }
+
+def ratio_stats(prices, profit_ratios, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=None):
+    """
+    Bootstrap the simulated EV of every ratio and side, resampling whole days.
+
+    Args:
+        prices (array-like): Price paths of shape (days, bars).
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        n_resamples (int): Number of resamples.
+        confidence (float): Two-sided confidence level.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: confidence_intervals() output with shapes (n_ratios, 2), plus 'ratios'.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    sums = simulate.daily_sums(prices, profit_ratios)
+    counts = np.full(sums.shape[-1], prices.shape[-1] - 1, dtype=np.float64)
+    stats = confidence_intervals(sums, counts, n_resamples, confidence, seed)
+    stats["ratios"] = simulate.as_ratio_array(profit_ratios)
+    return stats
+
+def print_stats(stats, comparison=None, limit=20):
+    """
+    Print the ratios and sides with the highest EV, with their intervals and p-values.
+
+    Args:
+        stats (dict): Output of ratio_stats().
+        comparison (dict): Output of paired_comparison(), adds the p-value against its reference.
+        limit (int): Rows printed.
+    """
+    header = f"{'TP':>6} {'SL':>6} {'Side':>5} {'EV':>10} {'CI low':>10} {'CI high':>10} {'p':>7} {'q':>7}"
+    print(header + (f" {'p vs best':>9}" if comparison else ""))
+    order = np.argsort(stats["ev"], axis=None)[::-1][:limit]
+    for r, s in zip(*np.unravel_index(order, stats["ev"].shape)):
+        take_profit, stop_loss = stats["ratios"][r]
+        line = (f"{take_profit:>6.4f} {stop_loss:>6.4f} {simulate.SIDES[s]:>5} {stats['ev'][r, s]:>10.6f} "
+                f"{stats['ci_low'][r, s]:>10.6f} {stats['ci_high'][r, s]:>10.6f} "
+                f"{stats['p_value'][r, s]:>7.4f} {stats['q_value'][r, s]:>7.4f}")
+        if comparison:
+            line += f" {comparison['p_value'][r, s]:>9.4f}"
+        print(line)
+
+def main(symbol, start, end, max_ratio=20, n_resamples=N_RESAMPLES, limit=20):
+    """
+    Bootstrap the simulated EV of every ratio over stored minute bars and print the best ones.
+
+    Args:
+        symbol (str): Stock symbol.
+        start (str): First day, YYYY-MM-DD.
+        end (str): Last day, YYYY-MM-DD.
+        max_ratio (int): Passed to generate_profit_ratios.
+        n_resamples (int): Number of resamples.
+        limit (int): Rows printed.
+    """
+    days, prices = bar_store.load_session_matrix(symbol, date.fromisoformat(start), date.fromisoformat(end))
+    if len(days) < 2:
+        print(f"Not enough stored days of {symbol} to bootstrap ({len(days)})")
+        return None
+    stats = ratio_stats(prices, generate_profit_ratios(max_ratio), n_resamples)
+    comparison = paired_comparison(stats)
+    print(f"-------------------------\n{symbol}: {len(days)} days, {n_resamples} day resamples"
+          f"\n-------------------------")
+    print_stats(stats, comparison, limit)
+    return stats
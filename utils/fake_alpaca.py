@@ -0,0 +1,774 @@
+import argparse
+import json
+import math
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from websockets.sync.server import serve as serve_websocket
+from websockets.exceptions import ConnectionClosed
+
+# Order statuses that can still be canceled or filled
+OPEN_STATUSES = ("new", "accepted", "held", "partially_filled")
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+class FakeAlpaca:
+    """
+    In-memory stand-in for the Alpaca trading, market data and Broker APIs.
+
+    Args:
+        latency (float): Seconds added to every response.
+        jitter (float): Maximum extra random seconds added to every response.
+        error_rate (float): Probability of answering a request with a 429.
+        rate_limit (float): Requests per second accepted before answering 429. None disables it.
+        volatility (float): Standard deviation of the per-tick log price change.
+        tick (float): Seconds between price updates and bracket leg fill checks.
+        start_price (float): Initial price of every symbol.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None,
+                 volatility=0.001, tick=0.1, start_price=100.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.volatility = volatility
+        self.tick = tick
+        self.start_price = start_price
+
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.orders = {}            # {order_id: order}, parents and legs
+        self.positions = {}         # {(account, symbol): {"qty": float, "avg_entry_price": float}}
+        self.cash = {}              # {account: float}
+        self.accounts = {}          # {account_id: broker account}
+        self.ach_relationships = {} # {account_id: [relationship]}
+        self.transfers = {}         # {account_id: [transfer]}
+        self.activities = []        # FILL activities, oldest first
+        self.market_hours = ("09:30", "16:00")  # every weekday, New York time
+        self.holidays = set()       # 'YYYY-MM-DD' dates the market is closed
+        self.listeners = []         # callables receiving (event, order)
+        self.price_listeners = []   # callables receiving {symbol: price} after every tick
+        self.request_count = 0
+
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._stop = threading.Event()
+        self._ticker = None
+
+    # ------------------------------------------------------------------
+    # Market simulation
+    # ------------------------------------------------------------------
+
+    def price(self, symbol):
+        return self.prices.setdefault(symbol, self.start_price)
+
+    def start(self):
+        """
+        Start the background thread that moves prices and fills bracket legs.
+        """
+        self._ticker = threading.Thread(target=self._run_ticker, daemon=True)
+        self._ticker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_ticker(self):
+        while not self._stop.wait(self.tick):
+            with self.lock:
+                for symbol, price in self.prices.items():
+                    self.prices[symbol] = round(price * math.exp(random.gauss(0, self.volatility)), 4)
+                self._check_legs()
+                for listener in list(self.price_listeners):
+                    listener(dict(self.prices))
+
+    def _check_legs(self):
+        for order in list(self.orders.values()):
+            if order["status"] != "new" or "parent_id" not in order:
+                continue
+            price = self.prices[order["symbol"]]
+            if order["type"] == "limit":
+                hit = price >= float(order["limit_price"]) if order["side"] == "sell" else price <= float(order["limit_price"])
+            else:
+                hit = price <= float(order["stop_price"]) if order["side"] == "sell" else price >= float(order["stop_price"])
+            if hit:
+                self._fill(order, price)
+                for sibling_id in self.orders[order["parent_id"]]["leg_ids"]:
+                    sibling = self.orders[sibling_id]
+                    if sibling_id != order["id"] and sibling["status"] in OPEN_STATUSES:
+                        self._cancel(sibling)
+
+    def _emit(self, event, order):
+        for listener in list(self.listeners):
+            listener(event, order)
+
+    def _fill(self, order, price):
+        qty = float(order["qty"])
+        order.update(status="filled", filled_qty=order["qty"], filled_avg_price=str(price),
+                     filled_at=now_iso(), updated_at=now_iso())
+
+        key = (order["account"], order["symbol"])
+        signed = qty if order["side"] == "buy" else -qty
+        position = self.positions.setdefault(key, {"qty": 0.0, "avg_entry_price": price})
+        if position["qty"] == 0 or (position["qty"] > 0) == (signed > 0):
+            total = position["qty"] + signed
+            position["avg_entry_price"] = (position["avg_entry_price"] * abs(position["qty"]) + price * qty) / abs(total)
+            position["qty"] = total
+        else:
+            position["qty"] += signed
+        if position["qty"] == 0:
+            del self.positions[key]
+
+        self.cash[order["account"]] = self.cash.get(order["account"], 0.0) - signed * price
+        # Ids sort in time order, like Alpaca's '<timestamp>::<uuid>' activity ids
+        self.activities.append({
+            "id": f"{time.time_ns():020d}::{uuid.uuid4()}",
+            "account": order["account"],
+            "activity_type": "FILL",
+            "transaction_time": order["filled_at"],
+            "type": "fill",
+            "price": str(price),
+            "qty": order["qty"],
+            "side": order["side"],
+            "symbol": order["symbol"],
+            "leaves_qty": "0",
+            "order_id": order["id"],
+            "cum_qty": order["qty"],
+        })
+        for leg_id in order.get("leg_ids", []):
+            self.orders[leg_id]["status"] = "new"
+        self._emit("fill", order)
+
+    def _cancel(self, order):
+        order.update(status="canceled", canceled_at=now_iso(), updated_at=now_iso())
+        self._emit("canceled", order)
+
+    # ------------------------------------------------------------------
+    # Orders and positions, shared by the trading API and Broker trading API
+    # ------------------------------------------------------------------
+
+    def _new_order(self, account, symbol, qty, side, order_type, order_class, **fields):
+        order = {
+            "id": str(uuid.uuid4()),
+            "client_order_id": str(uuid.uuid4()),
+            "created_at": now_iso(),
+            "updated_at": now_iso(),
+            "submitted_at": now_iso(),
+            "filled_at": None,
+            "canceled_at": None,
+            "symbol": symbol,
+            "qty": str(qty),
+            "filled_qty": "0",
+            "filled_avg_price": None,
+            "order_class": order_class,
+            "type": order_type,
+            "side": side,
+            "time_in_force": "day",
+            "limit_price": None,
+            "stop_price": None,
+            "status": "accepted",
+            "account": account,
+        }
+        order.update(fields)
+        self.orders[order["id"]] = order
+        return order
+
+    def submit_order(self, account, body):
+        symbol = body["symbol"]
+        side = body["side"]
+        qty = float(body["qty"])
+        price = self.price(symbol)
+
+        order_class = "bracket" if body.get("take_profit") or body.get("stop_loss") else "simple"
+        parent = self._new_order(account, symbol, body["qty"], side, body.get("type", "market"), order_class,
+                                 time_in_force=body.get("time_in_force", "day"),
+                                 limit_price=body.get("limit_price"), leg_ids=[])
+
+        if order_class == "bracket":
+            exit_side = "sell" if side == "buy" else "buy"
+            take_profit = self._new_order(account, symbol, body["qty"], exit_side, "limit", "bracket",
+                                          limit_price=body["take_profit"]["limit_price"],
+                                          parent_id=parent["id"], status="held")
+            stop_loss = body["stop_loss"]
+            stop_type = "stop_limit" if stop_loss.get("limit_price") else "stop"
+            stop = self._new_order(account, symbol, body["qty"], exit_side, stop_type, "bracket",
+                                   stop_price=stop_loss["stop_price"], limit_price=stop_loss.get("limit_price"),
+                                   parent_id=parent["id"], status="held")
+            parent["leg_ids"] = [take_profit["id"], stop["id"]]
+
+        self._emit("new", parent)
+        if parent["type"] == "market" and qty > 0:
+            self._fill(parent, price)
+        return self.render_order(parent, nested=True)
+
+    def render_order(self, order, nested=False):
+        rendered = {k: v for k, v in order.items() if k not in ("account", "leg_ids", "parent_id")}
+        if nested:
+            rendered["legs"] = [self.render_order(self.orders[leg_id]) for leg_id in order.get("leg_ids", [])] or None
+        return rendered
+
+    def list_orders(self, account, status="open", nested=False):
+        result = []
+        for order in self.orders.values():
+            if order["account"] != account or (nested and "parent_id" in order):
+                continue
+            is_open = order["status"] in OPEN_STATUSES
+            if status == "all" or (status == "open") == is_open:
+                result.append(self.render_order(order, nested))
+        return result
+
+    def cancel_orders(self, account):
+        result = []
+        for order in self.orders.values():
+            if order["account"] == account and order["status"] in OPEN_STATUSES:
+                self._cancel(order)
+                result.append({"id": order["id"], "status": 200, "body": self.render_order(order)})
+        return result
+
+    def render_position(self, account, symbol, position):
+        price = self.price(symbol)
+        qty = position["qty"]
+        return {
+            "asset_id": str(uuid.uuid5(uuid.NAMESPACE_DNS, symbol)),
+            "symbol": symbol,
+            "qty": str(abs(qty)),
+            "side": "long" if qty > 0 else "short",
+            "avg_entry_price": str(round(position["avg_entry_price"], 4)),
+            "current_price": str(price),
+            "market_value": str(round(qty * price, 2)),
+            "unrealized_pl": str(round(qty * (price - position["avg_entry_price"]), 2)),
+        }
+
+    def list_positions(self, account):
+        return [self.render_position(account, symbol, position)
+                for (owner, symbol), position in self.positions.items() if owner == account]
+
+    def close_positions(self, account, cancel_orders=False):
+        if cancel_orders:
+            self.cancel_orders(account)
+        result = []
+        for (owner, symbol), position in list(self.positions.items()):
+            if owner != account:
+                continue
+            side = "sell" if position["qty"] > 0 else "buy"
+            order = self._new_order(account, symbol, abs(position["qty"]), side, "market", "simple")
+            self._fill(order, self.price(symbol))
+            result.append({"symbol": symbol, "status": 200, "body": self.render_order(order)})
+        return result
+
+    def trading_account(self, account):
+        cash = self.cash.get(account, 0.0)
+        equity = cash + sum(position["qty"] * self.price(symbol)
+                            for (owner, symbol), position in self.positions.items() if owner == account)
+        return {
+            "id": account,
+            "status": "ACTIVE",
+            "currency": "USD",
+            "cash": str(round(cash, 2)),
+            "balance": str(round(cash, 2)),
+            "equity": str(round(equity, 2)),
+            "buying_power": str(round(max(cash, 0.0) * 2, 2)),
+        }
+
+    # ------------------------------------------------------------------
+    # Request routing
+    # ------------------------------------------------------------------
+
+    def throttled(self):
+        """
+        Decide whether the current request is rejected with a 429.
+        """
+        if self.error_rate and random.random() < self.error_rate:
+            return True
+        if self.rate_limit:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+        return False
+
+    def handle(self, method, path, query, body):
+        """
+        Route one request.
+
+        Returns:
+            tuple: (status_code, json_body)
+        """
+        for route_method, pattern, handler in ROUTES:
+            if route_method != method:
+                continue
+            match = re.fullmatch(pattern, path)
+            if match:
+                with self.lock:
+                    return handler(self, query, body, *match.groups())
+        return 404, {"code": 40410000, "message": "endpoint not found"}
+
+    # Market data
+
+    def _latest_trade(self, query, body, symbol):
+        return 200, {"symbol": symbol, "trade": {"t": now_iso(), "p": self.price(symbol), "s": 100, "x": "V"}}
+
+    def _latest_trades(self, query, body):
+        symbols = [symbol for symbol in query.get("symbols", "").split(",") if symbol]
+        return 200, {"trades": {symbol: {"t": now_iso(), "p": self.price(symbol), "s": 100, "x": "V"}
+                                for symbol in symbols}}
+
+    def _bars(self, query, body, symbol):
+        """
+        Random-walk regular-session minute bars for every weekday in [start, end].
+        """
+        start = datetime.fromisoformat(query["start"].replace("Z", "+00:00"))
+        end = datetime.fromisoformat(query["end"].replace("Z", "+00:00"))
+        limit = int(query.get("limit", 1000))
+        offset = int(query.get("page_token", 0))
+        market_tz = ZoneInfo("America/New_York")
+
+        bars = []
+        day = start.astimezone(market_tz).date()
+        while day <= end.astimezone(market_tz).date() and len(bars) < offset + limit + 1:
+            if day.weekday() < 5:
+                # Seeded per symbol and day, so repeated downloads agree
+                rng = random.Random(f"{symbol}{day}")
+                price = self.start_price
+                session_open = datetime(day.year, day.month, day.day, 9, 30, tzinfo=market_tz)
+                for minute in range(390):
+                    moment = session_open + timedelta(minutes=minute)
+                    if not start <= moment <= end:
+                        continue
+                    close = round(price * math.exp(rng.gauss(0, self.volatility)), 4)
+                    bars.append({
+                        "t": moment.astimezone(timezone.utc).isoformat().replace("+00:00", "Z"),
+                        "o": price, "h": max(price, close), "l": min(price, close), "c": close,
+                        "v": rng.randint(100, 10000), "n": rng.randint(1, 100), "vw": (price + close) / 2,
+                    })
+                    price = close
+            day += timedelta(days=1)
+
+        page = bars[offset:offset + limit]
+        next_token = str(offset + limit) if len(bars) > offset + limit else None
+        return 200, {"symbol": symbol, "bars": page, "next_page_token": next_token}
+
+    # Trading API (paper account), also serving the Broker API trading
+    # endpoints with the sub-account id as `account`
+
+    def _post_order(self, query, body, account="paper"):
+        return 200, self.submit_order(account, body)
+
+    def _get_orders(self, query, body, account="paper"):
+        status = query.get("status", "open")
+        nested = query.get("nested", "false") == "true"
+        return 200, self.list_orders(account, status, nested)
+
+    def _delete_orders(self, query, body, account="paper"):
+        return 207, self.cancel_orders(account)
+
+    def _get_positions(self, query, body, account="paper"):
+        return 200, self.list_positions(account)
+
+    def _delete_positions(self, query, body, account="paper"):
+        return 207, self.close_positions(account, query.get("cancel_orders") == "true")
+
+    def _get_fill_activities(self, query, body, account="paper"):
+        """
+        FILL activities, paginated by activity id like the real endpoint.
+        """
+        activities = [activity for activity in self.activities if activity["account"] == account]
+        if query.get("direction", "desc") == "desc":
+            activities.reverse()
+            if "page_token" in query:
+                activities = [activity for activity in activities if activity["id"] < query["page_token"]]
+        elif "page_token" in query:
+            activities = [activity for activity in activities if activity["id"] > query["page_token"]]
+        if "after" in query:
+            activities = [activity for activity in activities if activity["transaction_time"] > query["after"]]
+        page_size = int(query.get("page_size", 100))
+        return 200, [{k: v for k, v in activity.items() if k != "account"} for activity in activities[:page_size]]
+
+    def _get_account(self, query, body, account="paper"):
+        return 200, self.trading_account(account)
+
+    # Market clock
+
+    def sessions(self, start, end):
+        """
+        Trading days from start to end (dates), inclusive, as calendar entries.
+        """
+        days = []
+        day = start
+        while day <= end:
+            if day.weekday() < 5 and day.isoformat() not in self.holidays:
+                days.append({"date": day.isoformat(), "open": self.market_hours[0], "close": self.market_hours[1]})
+            day += timedelta(days=1)
+        return days
+
+    def _get_calendar(self, query, body):
+        market_tz = ZoneInfo("America/New_York")
+        today = datetime.now(market_tz).date()
+        start = datetime.fromisoformat(query["start"]).date() if "start" in query else today
+        end = datetime.fromisoformat(query["end"]).date() if "end" in query else start + timedelta(days=30)
+        return 200, self.sessions(start, end)
+
+    def _get_clock(self, query, body):
+        market_tz = ZoneInfo("America/New_York")
+        now = datetime.now(market_tz)
+        next_open = next_close = None
+        for session in self.sessions(now.date(), now.date() + timedelta(days=14)):
+            open_at = datetime.fromisoformat(f"{session['date']}T{session['open']}").replace(tzinfo=market_tz)
+            close_at = datetime.fromisoformat(f"{session['date']}T{session['close']}").replace(tzinfo=market_tz)
+            if close_at <= now:
+                continue
+            next_close = next_close or close_at
+            if open_at > now:
+                next_open = open_at
+                break
+        is_open = next_close is not None and (next_open is None or next_close < next_open)
+        return 200, {
+            "timestamp": now.isoformat(),
+            "is_open": is_open,
+            "next_open": next_open.isoformat() if next_open else None,
+            "next_close": next_close.isoformat() if next_close else None,
+        }
+
+    # Broker API
+
+    def _create_account(self, query, body):
+        account_id = str(uuid.uuid4())
+        account = {
+            "id": account_id,
+            "account_number": str(random.randint(10 ** 9, 10 ** 10 - 1)),
+            "status": "ACTIVE",
+            "currency": "USD",
+            "created_at": now_iso(),
+            "contact": body.get("contact", {}),
+            "identity": body.get("identity", {}),
+        }
+        self.accounts[account_id] = account
+        self.cash[account_id] = 0.0
+        return 200, account
+
+    def _list_accounts(self, query, body):
+        accounts = sorted(self.accounts.values(), key=lambda account: account["created_at"])
+        if "created_after" in query:
+            accounts = [account for account in accounts if account["created_at"] > query["created_after"]]
+        if "page" in query or "per_page" in query:
+            per_page = int(query.get("per_page", 100))
+            page = int(query.get("page", 1))
+            accounts = accounts[(page - 1) * per_page:page * per_page]
+        return 200, accounts
+
+    def _get_broker_account(self, query, body, account_id):
+        if account_id not in self.accounts:
+            return 404, {"code": 40410000, "message": "account not found"}
+        return 200, self.accounts[account_id]
+
+    def _create_ach(self, query, body, account_id):
+        if account_id not in self.accounts:
+            return 404, {"code": 40410000, "message": "account not found"}
+        relationship = dict(body, id=str(uuid.uuid4()), account_id=account_id,
+                            status="APPROVED", created_at=now_iso())
+        self.ach_relationships.setdefault(account_id, []).append(relationship)
+        return 200, relationship
+
+    def _get_ach(self, query, body, account_id):
+        return 200, self.ach_relationships.get(account_id, [])
+
+    def _create_transfer(self, query, body, account_id):
+        if account_id not in self.accounts:
+            return 404, {"code": 40410000, "message": "account not found"}
+        amount = float(body["amount"])
+        transfer = dict(body, id=str(uuid.uuid4()), account_id=account_id, status="QUEUED", created_at=now_iso())
+        self.transfers.setdefault(account_id, []).append(transfer)
+        sign = 1 if body.get("direction", "INCOMING") == "INCOMING" else -1
+        self.cash[account_id] = self.cash.get(account_id, 0.0) + sign * amount
+        return 200, transfer
+
+    def _get_trading_account(self, query, body, account_id):
+        if account_id not in self.accounts:
+            return 404, {"code": 40410000, "message": "account not found"}
+        return 200, self.trading_account(account_id)
+
+ROUTES = [
+    ("GET", r"/v2/stocks/trades/latest", FakeAlpaca._latest_trades),
+    ("GET", r"/v2/stocks/([^/]+)/trades/latest", FakeAlpaca._latest_trade),
+    ("GET", r"/v2/stocks/([^/]+)/bars", FakeAlpaca._bars),
+    ("POST", r"/v2/orders", FakeAlpaca._post_order),
+    ("GET", r"/v2/orders", FakeAlpaca._get_orders),
+    ("DELETE", r"/v2/orders", FakeAlpaca._delete_orders),
+    ("GET", r"/v2/positions", FakeAlpaca._get_positions),
+    ("DELETE", r"/v2/positions", FakeAlpaca._delete_positions),
+    ("GET", r"/v2/account", FakeAlpaca._get_account),
+    ("GET", r"/v2/account/activities/FILL", FakeAlpaca._get_fill_activities),
+    ("GET", r"/v2/clock", FakeAlpaca._get_clock),
+    ("GET", r"/v2/calendar", FakeAlpaca._get_calendar),
+    ("POST", r"/v1/accounts", FakeAlpaca._create_account),
+    ("GET", r"/v1/accounts", FakeAlpaca._list_accounts),
+    ("GET", r"/v1/accounts/([^/]+)", FakeAlpaca._get_broker_account),
+    ("POST", r"/v1/accounts/([^/]+)/ach_relationships", FakeAlpaca._create_ach),
+    ("GET", r"/v1/accounts/([^/]+)/ach_relationships", FakeAlpaca._get_ach),
+    ("POST", r"/v1/accounts/([^/]+)/transfers", FakeAlpaca._create_transfer),
+    ("GET", r"/v1/trading/accounts/([^/]+)/account", FakeAlpaca._get_trading_account),
+    ("POST", r"/v1/trading/accounts/([^/]+)/orders", FakeAlpaca._post_order),
+    ("GET", r"/v1/trading/accounts/([^/]+)/orders", FakeAlpaca._get_orders),
+    ("DELETE", r"/v1/trading/accounts/([^/]+)/orders", FakeAlpaca._delete_orders),
+    ("GET", r"/v1/trading/accounts/([^/]+)/positions", FakeAlpaca._get_positions),
+    ("DELETE", r"/v1/trading/accounts/([^/]+)/positions", FakeAlpaca._delete_positions),
+]
+
+class FakeAlpacaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def _respond(self, method):
+        fake = self.server.fake
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+
+        delay = fake.latency + random.uniform(0, fake.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with fake.lock:
+            fake.request_count += 1
+            throttled = fake.throttled()
+
+        headers = {}
+        if fake.rate_limit:
+            headers["X-RateLimit-Limit"] = str(int(fake.rate_limit * 60))
+        if throttled:
+            status, payload = 429, {"code": 42910000, "message": "rate limit exceeded"}
+            headers["Retry-After"] = "1"
+        else:
+            status, payload = fake.handle(method, parts.path.rstrip("/"), query, body)
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def do_DELETE(self):
+        self._respond("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=0, **options):
+    """
+    Start a fake Alpaca server on a background thread.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind. 0 picks a free port.
+        **options: Passed to FakeAlpaca (latency, error_rate, ...).
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), FakeAlpacaHandler)
+    server.daemon_threads = True
+    server.fake = FakeAlpaca(**options)
+    server.fake.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    return server, base_url
+
+def serve_stream(fake, host="127.0.0.1", port=0):
+    """
+    Start a trade_updates websocket stand-in that streams a FakeAlpaca's order events.
+
+    Clients authenticate and subscribe with the same messages as Alpaca's
+    stream; any key and secret are accepted.
+
+    Args:
+        fake (FakeAlpaca): Server state whose order events are streamed.
+        host (str): Interface to bind.
+        port (int): Port to bind. 0 picks a free port.
+
+    Returns:
+        tuple: (server, stream_url). Call server.shutdown() to stop it.
+    """
+    subscribers = set()
+    subscribers_lock = threading.Lock()
+    events = queue.Queue()
+
+    def on_event(event, order):
+        # Called under the fake's lock, so only render and enqueue here
+        events.put({"stream": "trade_updates", "data": {
+            "event": event,
+            "order": fake.render_order(order),
+            "timestamp": now_iso(),
+            "price": order.get("filled_avg_price") if event == "fill" else None,
+            "qty": order.get("filled_qty") if event == "fill" else None,
+        }})
+
+    def broadcast():
+        while True:
+            message = json.dumps(events.get())
+            with subscribers_lock:
+                targets = list(subscribers)
+            for connection in targets:
+                try:
+                    connection.send(message)
+                except ConnectionClosed:
+                    with subscribers_lock:
+                        subscribers.discard(connection)
+
+    def handler(connection):
+        try:
+            request = json.loads(connection.recv())
+            if request.get("action") != "auth":
+                connection.send(json.dumps({"stream": "authorization", "data": {"status": "unauthorized"}}))
+                return
+            connection.send(json.dumps({"stream": "authorization",
+                                        "data": {"status": "authorized", "action": "authenticate"}}))
+            request = json.loads(connection.recv())
+            streams = request.get("data", {}).get("streams", [])
+            connection.send(json.dumps({"stream": "listening", "data": {"streams": streams}}))
+            if "trade_updates" in streams:
+                with subscribers_lock:
+                    subscribers.add(connection)
+            # Keep the connection open until the client leaves
+            for _ in connection:
+                pass
+        except ConnectionClosed:
+            pass
+        finally:
+            with subscribers_lock:
+                subscribers.discard(connection)
+
+    fake.listeners.append(on_event)
+    threading.Thread(target=broadcast, daemon=True).start()
+    server = serve_websocket(handler, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"ws://{host}:{server.socket.getsockname()[1]}/stream"
+
+def serve_market_stream(fake, host="127.0.0.1", port=0):
+    """
+    Start a market data websocket stand-in that streams a FakeAlpaca's prices.
+
+    Follows Alpaca's stock data stream: a 'connected' greeting, auth and
+    subscribe actions, and arrays of trade ('t') and quote ('q') messages, one
+    of each per subscribed symbol and tick. Any key and secret are accepted.
+
+    Args:
+        fake (FakeAlpaca): Server state whose prices are streamed.
+        host (str): Interface to bind.
+        port (int): Port to bind. 0 picks a free port.
+
+    Returns:
+        tuple: (server, stream_url). Call server.shutdown() to stop it.
+    """
+    subscriptions = {}          # {connection: set of symbols, '*' for all}
+    subscriptions_lock = threading.Lock()
+    ticks = queue.Queue()
+
+    def on_tick(prices):
+        # Called under the fake's lock, so only enqueue here
+        ticks.put((now_iso(), prices))
+
+    def broadcast():
+        while True:
+            timestamp, prices = ticks.get()
+            with subscriptions_lock:
+                targets = list(subscriptions.items())
+            for connection, symbols in targets:
+                events = []
+                for symbol, price in prices.items():
+                    if "*" in symbols or symbol in symbols:
+                        events.append({"T": "t", "S": symbol, "p": price, "s": 100, "t": timestamp, "x": "V"})
+                        events.append({"T": "q", "S": symbol, "bp": round(price - 0.01, 4), "bs": 1,
+                                       "ap": round(price + 0.01, 4), "as": 1, "t": timestamp})
+                if not events:
+                    continue
+                try:
+                    connection.send(json.dumps(events))
+                except ConnectionClosed:
+                    with subscriptions_lock:
+                        subscriptions.pop(connection, None)
+
+    def subscribe(connection, request):
+        symbols = set(request.get("trades", [])) | set(request.get("quotes", []))
+        with fake.lock:
+            for symbol in symbols - {"*"}:
+                fake.price(symbol)  # start the symbol's random walk
+        with subscriptions_lock:
+            subscribed = subscriptions[connection] = subscriptions.get(connection, set()) | symbols
+        connection.send(json.dumps([{"T": "subscription", "trades": sorted(subscribed),
+                                     "quotes": sorted(subscribed), "bars": []}]))
+
+    def handler(connection):
+        try:
+            connection.send(json.dumps([{"T": "success", "msg": "connected"}]))
+            request = json.loads(connection.recv())
+            if request.get("action") != "auth":
+                connection.send(json.dumps([{"T": "error", "code": 401, "msg": "not authenticated"}]))
+                return
+            connection.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+            for message in connection:
+                request = json.loads(message)
+                if request.get("action") == "subscribe":
+                    subscribe(connection, request)
+        except ConnectionClosed:
+            pass
+        finally:
+            with subscriptions_lock:
+                subscriptions.pop(connection, None)
+
+    fake.price_listeners.append(on_tick)
+    threading.Thread(target=broadcast, daemon=True).start()
+    server = serve_websocket(handler, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"ws://{host}:{server.socket.getsockname()[1]}/v2/iex"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Alpaca APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random extra seconds per response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 429 response.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second before 429s.")
+    parser.add_argument("--volatility", type=float, default=0.001, help="Per-tick log price volatility.")
+    parser.add_argument("--tick", type=float, default=0.1, help="Seconds between price updates.")
+    parser.add_argument("--stream-port", type=int, default=8081, help="Port of the trade_updates websocket.")
+    parser.add_argument("--market-stream-port", type=int, default=8082, help="Port of the market data websocket.")
+    args = parser.parse_args()
+
+    server, base_url = serve(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, rate_limit=args.rate_limit,
+                             volatility=args.volatility, tick=args.tick)
+    _, stream_url = serve_stream(server.fake, args.host, args.stream_port)
+    _, market_stream_url = serve_market_stream(server.fake, args.host, args.market_stream_port)
+    print(f"Fake Alpaca listening on {base_url}, trade_updates on {stream_url}, market data on {market_stream_url}")
+    print("Point the clients at it with these .env variables:")
+    print(f"alpaca_paper_url = {base_url}\nalpaca_data_url = {base_url}\nalpaca_broker_url = {base_url}")
+    print(f"alpaca_stream_url = {stream_url}\nalpaca_data_stream_url = {market_stream_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from utils import http_client, state_store, account_get_balance
+
+# Order and position endpoints of the paper account and of Broker API sub-accounts
+PAPER_ORDERS_PATH = "/v2/orders"
+PAPER_POSITIONS_PATH = "/v2/positions"
+BROKER_ORDERS_PATH = "/v1/trading/accounts/{account_id}/orders"
+BROKER_POSITIONS_PATH = "/v1/trading/accounts/{account_id}/positions"
+
+# Accounts flattened concurrently
+MAX_WORKERS = http_client.POOL_SIZE
+
+# Seconds to keep trying before an account is reported as not flat
+FLATTEN_TIMEOUT = 60.0
+
+# Seconds before the first check of the accounts' open orders and positions;
+# the wait between later checks doubles up to RETRY_INTERVAL
+POLL_INTERVAL = 0.5
+
+# Seconds without reaching flat before the cancel/close is sent again
+RETRY_INTERVAL = 5.0
+
+# Name used for the paper trading account in reports
+PAPER_ACCOUNT = "paper"
+
+def _endpoints(account_id):
+    """
+    API name and order/position paths for an account.
+
+    Args:
+        account_id (str): Broker sub-account id, or PAPER_ACCOUNT.
+
+    Returns:
+        tuple: (api, orders_path, positions_path)
+    """
+    if account_id == PAPER_ACCOUNT:
+        return "paper", PAPER_ORDERS_PATH, PAPER_POSITIONS_PATH
+    return ("broker", BROKER_ORDERS_PATH.format(account_id=account_id),
+            BROKER_POSITIONS_PATH.format(account_id=account_id))
+
+def _liquidate(api, positions_path):
+    """
+    Cancel every open order and close every position of one account in a single request.
+
+    Returns:
+        bool: True if the API accepted every cancel and close.
+    """
+    response = http_client.delete(api, positions_path, params={"cancel_orders": "true"})
+    response.raise_for_status()
+    # 207 Multi-Status: one entry per position, each with its own status
+    results = response.json() if response.content else []
+    return all(result.get("status", 200) < 300 for result in results if isinstance(result, dict))
+
+def _exposure(api, orders_path, positions_path):
+    """
+    Count what is still open in an account.
+
+    Returns:
+        tuple: (open_orders, open_positions)
+    """
+    orders = http_client.get(api, orders_path, params={"status": "open", "limit": 500})
+    orders.raise_for_status()
+    positions = http_client.get(api, positions_path)
+    positions.raise_for_status()
+    return len(orders.json()), len(positions.json())
+
+def _send(result, poll, retry):
+    """
+    Send one account's cancel/close and schedule when it may be resent.
+    """
+    api, _, positions_path = _endpoints(result["account_id"])
+    result["attempts"] += 1
+    try:
+        accepted = _liquidate(api, positions_path)
+        result["error"] = None
+    except requests.exceptions.RequestException as e:
+        result["error"] = str(e)
+        accepted = False
+    result["next_attempt"] = time.perf_counter() + (retry if accepted else poll)
+
+def _check(result, start, poll, retry):
+    """
+    Check whether one account is flat, resending its cancel/close if it is due.
+    """
+    api, orders_path, positions_path = _endpoints(result["account_id"])
+    if time.perf_counter() >= result["next_attempt"]:
+        _send(result, poll, retry)
+    try:
+        result["open_orders"], result["positions"] = _exposure(api, orders_path, positions_path)
+    except requests.exceptions.RequestException as e:
+        result["error"] = str(e)
+        return
+    result["error"] = None
+    if not result["open_orders"] and not result["positions"]:
+        result["flat"] = True
+        result["seconds"] = time.perf_counter() - start
+
+def flatten_account(account_id, timeout=FLATTEN_TIMEOUT, poll=POLL_INTERVAL, retry=RETRY_INTERVAL):
+    """
+    Cancel all orders and close all positions of one account, and wait until it is flat.
+
+    Args:
+        account_id (str): Broker sub-account id, or PAPER_ACCOUNT.
+        timeout (float): Seconds before giving up.
+        poll (float): Seconds before the first check; later checks back off up to `retry`.
+        retry (float): Seconds before the cancel/close is resent.
+
+    Returns:
+        dict: {"account_id", "flat", "seconds", "attempts", "open_orders", "positions", "error"}
+    """
+    return flatten_all([account_id], 1, timeout, poll, retry)["accounts"][0]
+
+def managed_accounts(include_paper=True, store=None):
+    """
+    List every account the kill switch covers.
+
+    Args:
+        include_paper (bool): Include the paper trading account.
+        store (state_store.StateStore): Store of broker sub-accounts. The default store when None.
+
+    Returns:
+        list: PAPER_ACCOUNT (if included) followed by every stored sub-account id.
+    """
+    accounts = [PAPER_ACCOUNT] if include_paper else []
+    return accounts + (store or state_store.get_store()).account_ids()
+
+def flatten_all(account_ids=None, max_workers=MAX_WORKERS, timeout=FLATTEN_TIMEOUT, poll=POLL_INTERVAL,
+                retry=RETRY_INTERVAL):
+    """
+    Flatten every managed account in parallel and report time-to-flat.
+
+    The cancel/close of every account is sent first, across the whole pool,
+    so the last account is not held back by earlier ones. Confirmation then
+    runs in rounds: each round checks every account not yet flat once
+    (resending its cancel/close if `retry` seconds passed without reaching
+    flat), and the wait between rounds doubles from `poll` up to `retry`.
+
+    Args:
+        account_ids (list): Accounts to flatten. Every managed account when None.
+        max_workers (int): Maximum number of requests in flight at once.
+        timeout (float): Seconds before the accounts not yet flat are given up on.
+        poll (float): Seconds before the first confirmation round.
+        retry (float): Seconds before an account's cancel/close is resent.
+
+    Returns:
+        dict: {"flat": bool, "seconds": time until the last account was confirmed
+            flat (None if some never were), "accounts": [flatten_account() results]}
+    """
+    if account_ids is None:
+        account_ids = managed_accounts()
+
+    start = time.perf_counter()
+    deadline = start + timeout
+    results = [{"account_id": account_id, "flat": False, "seconds": None, "attempts": 0,
+                "open_orders": None, "positions": None, "error": None} for account_id in account_ids]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda result: _send(result, poll, retry), results))
+
+        delay = poll
+        pending = results
+        while pending and time.perf_counter() < deadline:
+            time.sleep(max(0.0, min(delay, deadline - time.perf_counter())))
+            list(executor.map(lambda result: _check(result, start, poll, retry), pending))
+            pending = [result for result in pending if not result["flat"]]
+            delay = min(delay * 2, retry)
+
+    for result in results:
+        del result["next_attempt"]
+        account_get_balance.invalidate(None if result["account_id"] == PAPER_ACCOUNT else result["account_id"])
+    flat = all(result["flat"] for result in results)
+    return {"flat": flat, "seconds": time.perf_counter() - start if flat else None, "accounts": results}
+
+def print_report(report):
+    """
+    Print the outcome of flatten_all().
+    """
+    results = report["accounts"]
+    stragglers = [result for result in results if not result["flat"]]
+    print(f"-------------------------\nFlattened {len(results) - len(stragglers)}/{len(results)} accounts"
+          f"\n-------------------------")
+    if report["flat"]:
+        print(f"Time to flat: {report['seconds']:.2f}s")
+        slowest = max(results, key=lambda result: result["seconds"], default=None)
+        if slowest:
+            print(f"Slowest account: {slowest['account_id']} ({slowest['seconds']:.2f}s, "
+                  f"{slowest['attempts']} attempts)")
+    for result in stragglers:
+        print(f"NOT FLAT {result['account_id']}: {result['open_orders']} open orders, "
+              f"{result['positions']} positions after {result['attempts']} attempts"
+              + (f" ({result['error']})" if result["error"] else ""))
+
+def main(include_paper=True, timeout=FLATTEN_TIMEOUT):
+    report = flatten_all(managed_accounts(include_paper), timeout=timeout)
+    print_report(report)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,70 @@
+import numpy as np
+
+# One [take_profit, stop_loss] pair per record
+RATIO_DTYPE = np.dtype([("take_profit", np.float64), ("stop_loss", np.float64)])
+
+def _axis(spec, log=False):
+    """
+    Expand a (start, stop, step) range, inclusive of stop, into grid values.
+
+    Args:
+        spec (tuple): (start, stop, step), or (start, stop, num) when log is True.
+        log (bool): Space `num` values geometrically instead of stepping linearly.
+
+    Returns:
+        numpy.ndarray: The axis values.
+    """
+    start, stop, step = spec
+    if log:
+        return np.geomspace(start, stop, int(step))
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    # Rounding removes the drift of repeated float steps (0.07000000000000001)
+    return np.round(start + step * np.arange(count), 10)
+
+def ratio_grid(take_profit=(0.01, 0.20, 0.01), stop_loss=None, log=False, min_ratio=None):
+    """
+    Build a grid of profit ratios as a compact structured array.
+
+    Args:
+        take_profit (tuple): (start, stop, step) of take-profit ratios, stop inclusive.
+            With log=True the third value is the number of log-spaced values.
+        stop_loss (tuple): Same for stop-loss ratios. Defaults to the take-profit range.
+        log (bool): Space both axes geometrically.
+        min_ratio (float): Keep only pairs with take_profit >= min_ratio * stop_loss.
+            None keeps the full (asymmetric) grid.
+
+    Returns:
+        numpy.ndarray: Array of RATIO_DTYPE, ordered by stop-loss, then take-profit.
+    """
+    take_profit_values = _axis(take_profit, log)
+    stop_loss_values = _axis(stop_loss or take_profit, log)
+
+    stop_losses, take_profits = np.meshgrid(stop_loss_values, take_profit_values, indexing="ij")
+    keep = np.ones(take_profits.shape, dtype=bool)
+    if min_ratio is not None:
+        keep = take_profits >= min_ratio * stop_losses - 1e-12
+
+    grid = np.empty(int(keep.sum()), dtype=RATIO_DTYPE)
+    grid["take_profit"] = take_profits[keep]
+    grid["stop_loss"] = stop_losses[keep]
+    return grid
+
+def iter_ratio_grid(take_profit=(0.01, 0.20, 0.01), stop_loss=None, log=False, min_ratio=None):
+    """
+    Lazily yield the pairs of ratio_grid() without building the whole grid.
+
+    Args:
+        Same as ratio_grid().
+
+    Yields:
+        tuple: (take_profit, stop_loss)
+    """
+    take_profit_values = _axis(take_profit, log)
+    for stop_loss_value in _axis(stop_loss or take_profit, log):
+        for take_profit_value in take_profit_values:
+            if min_ratio is None or take_profit_value >= min_ratio * stop_loss_value - 1e-12:
+                yield float(take_profit_value), float(stop_loss_value)
+
 def generate_profit_ratios(max_ratio):
     """
     Generate profit ratios up to X:max_ratio, inclusive.
@@ -8,9 +75,5 @@ def generate_profit_ratios(max_ratio):
     Returns:
         list: A list of profit ratio pairs [buy_ratio, sell_ratio].
     """
-    profit_ratios = []
-    for denominator in range(1, max_ratio + 1):
-        for numerator in range(denominator, max_ratio + 1):  # Start at 'denominator' for inclusivity
-            ratio = [round(numerator / 100, 2), round(denominator / 100, 2)]
-            profit_ratios.append(ratio)
-    return profit_ratios
+    grid = ratio_grid((0.01, max_ratio / 100, 0.01), min_ratio=1.0)
+    return [[take_profit, stop_loss] for take_profit, stop_loss in grid.tolist()]
@@ -0,0 +1,202 @@
+import os
+import re
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from utils import rate_limit, timing
+
+load_dotenv()
+
+# Constants for API credentials
+API_KEY = os.getenv("alpaca_key")
+SECRET_KEY = os.getenv("alpaca_secret")
+BROKER_AUTH = os.getenv("alpaca_broker_auth")
+
+# Alpaca API hosts, overridable from .env (e.g. to point at utils/fake_alpaca.py)
+PAPER_URL = os.getenv("alpaca_paper_url", "https://paper-api.alpaca.markets")
+DATA_URL = os.getenv("alpaca_data_url", "https://data.alpaca.markets")
+BROKER_URL = os.getenv("alpaca_broker_url", "https://broker-api.sandbox.alpaca.markets")
+
+# Keep-alive connections per host, sized for the order fan-out
+POOL_SIZE = 32
+
+# (connect, read) timeouts in seconds for every request
+TIMEOUT = (3.05, 10)
+
+# Headers for the trading and market data APIs
+TRADING_HEADERS = {
+    "accept": "application/json",
+    "APCA-API-KEY-ID": API_KEY,
+    "APCA-API-SECRET-KEY": SECRET_KEY,
+}
+
+# Headers for the Broker API
+BROKER_HEADERS = {
+    "accept": "application/json",
+    "authorization": BROKER_AUTH,
+}
+
+# Base URL and headers for each API, keyed by the name callers use
+APIS = {
+    "paper": {"base_url": PAPER_URL, "headers": TRADING_HEADERS},
+    "data": {"base_url": DATA_URL, "headers": TRADING_HEADERS},
+    "broker": {"base_url": BROKER_URL, "headers": BROKER_HEADERS},
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_session(api):
+    """
+    Get the shared keep-alive session for an API, creating it on first use.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+
+    Returns:
+        requests.Session: Session with its own connection pool and default headers.
+    """
+    session = _sessions.get(api)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if api not in _sessions:
+            session = requests.Session()
+            session.headers.update(APIS[api]["headers"])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[api] = session
+        return _sessions[api]
+
+def configure(paper_url=None, data_url=None, broker_url=None):
+    """
+    Point one or more APIs at a different base URL, e.g. a local fake server.
+
+    Args:
+        paper_url (str): Base URL of the trading API.
+        data_url (str): Base URL of the market data API.
+        broker_url (str): Base URL of the Broker API.
+    """
+    for api, base_url in (("paper", paper_url), ("data", data_url), ("broker", broker_url)):
+        if base_url:
+            APIS[api]["base_url"] = base_url.rstrip("/")
+
+# Path segments that vary per request, replaced to group requests by endpoint
+_ID_SEGMENT = re.compile(r"/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+_SYMBOL_SEGMENT = re.compile(r"^/v2/stocks/(?!trades/|snapshots)[^/]+/")
+
+def endpoint(path):
+    """
+    Reduce a request path to its endpoint template.
+
+    Args:
+        path (str): Request path, e.g. '/v1/trading/accounts/<uuid>/orders'.
+
+    Returns:
+        str: Template such as '/v1/trading/accounts/{id}/orders' or '/v2/stocks/{symbol}/bars'.
+    """
+    path = _ID_SEGMENT.sub("/{id}", path)
+    return _SYMBOL_SEGMENT.sub("/v2/stocks/{symbol}/", path)
+
+def url_for(api, path):
+    """
+    Build the full URL for a path on an API.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+        path (str): Request path, e.g. '/v2/orders'.
+
+    Returns:
+        str: The full URL.
+    """
+    return APIS[api]["base_url"] + path
+
+def request(api, method, path, **kwargs):
+    """
+    Send a request through the pooled session of an API.
+
+    Every request first takes a token from the API's shared rate limiter. A 429
+    is retried after the server's Retry-After (or a jittered backoff), up to
+    rate_limit.MAX_RETRIES times, before it is returned to the caller.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+        method (str): HTTP method.
+        path (str): Request path, e.g. '/v2/orders'.
+        **kwargs: Passed through to requests (json, params, timeout, ...).
+
+    Returns:
+        requests.Response: The API response.
+    """
+    kwargs.setdefault("timeout", TIMEOUT)
+    session = get_session(api)
+    bucket = rate_limit.get_bucket(api)
+    url = url_for(api, path)
+
+    for attempt in range(rate_limit.MAX_RETRIES + 1):
+        with timing.span("rate_wait", host=api):
+            bucket.acquire()
+        with timing.span("http", host=api, method=method, path=path) as attrs:
+            response = session.request(method, url, **kwargs)
+            attrs["status"] = response.status_code
+        if response.status_code != 429:
+            bucket.observe(response.headers)
+            return response
+        if attempt < rate_limit.MAX_RETRIES:
+            time.sleep(bucket.throttled(response.headers, attempt))
+    return response
+
+def get(api, path, **kwargs):
+    return request(api, "GET", path, **kwargs)
+
+def post(api, path, **kwargs):
+    return request(api, "POST", path, **kwargs)
+
+def delete(api, path, **kwargs):
+    return request(api, "DELETE", path, **kwargs)
+
+def warm(api, path, connections=1, **kwargs):
+    """
+    Open keep-alive connections ahead of a burst of requests.
+
+    `connections` GETs are sent at the same moment, so each takes its own
+    connection from the pool and leaves it open for the requests that follow.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+        path (str): Cheap GET path on that API, e.g. '/v2/clock'.
+        connections (int): Connections to open, at most POOL_SIZE are kept.
+        **kwargs: Passed through to requests.
+
+    Returns:
+        int: Number of requests that succeeded.
+    """
+    connections = max(1, min(connections, POOL_SIZE))
+    barrier = threading.Barrier(connections)
+
+    def touch():
+        try:
+            barrier.wait(timeout=TIMEOUT[0])
+        except threading.BrokenBarrierError:
+            pass
+        try:
+            return get(api, path, **kwargs).ok
+        except requests.exceptions.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        return sum(executor.map(lambda _: touch(), range(connections)))
+
+def close():
+    """
+    Close every pooled session.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,265 @@
+import os
+import atexit
+import queue
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Journal file, overridable from .env. The format version is part of the name.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+JOURNAL_PATH = os.getenv("order_journal", os.path.join(script_dir, "JSON", "orders.v1.bin"))
+
+# One fixed-size record per submitted order. Times are UTC nanoseconds (0 when unknown).
+JOURNAL_DTYPE = np.dtype([
+    ("submitted_ns", np.int64),     # when the order POST was sent
+    ("response_ns", np.int64),      # when its response arrived
+    ("created_ns", np.int64),       # created_at reported by the API
+    ("filled_ns", np.int64),        # filled_at reported by the API
+    ("order_id", "S36"),
+    ("account_id", "S36"),          # empty for the paper account
+    ("symbol", "S12"),
+    ("side", np.int8),              # 1 buy, -1 sell
+    ("http_status", np.int16),
+    ("status", "S16"),
+    ("qty", np.float64),
+    ("take_profit", np.float64),    # ratio
+    ("stop_loss", np.float64),      # ratio
+    ("entry_price", np.float64),
+    ("take_profit_price", np.float64),
+    ("stop_loss_price", np.float64),
+    ("filled_price", np.float64),   # NaN until filled
+])
+
+# Seconds the writer waits for more records before writing what it has
+FLUSH_INTERVAL = 0.5
+
+# Most records written at once
+BATCH_SIZE = 4096
+
+_STOP = object()
+
+def _timestamp_ns(value):
+    """
+    Convert an API timestamp such as '2024-01-02T15:04:05.123456789Z' to UTC nanoseconds.
+    """
+    if not value:
+        return 0
+    value = value.rstrip("Z")
+    if value[-6] in "+-" and value[-3] == ":":
+        value = value[:-6]  # Alpaca timestamps are UTC; drop the +00:00 offset
+    try:
+        return int(np.datetime64(value, "ns").astype(np.int64))
+    except ValueError:
+        return 0
+
+class Journal:
+    """
+    Append-only binary journal of submitted orders, written by one background thread.
+
+    append() only enqueues, so worker threads never wait on the disk. The
+    writer converts queued entries to JOURNAL_DTYPE records and appends them
+    in batches; load() maps the file back as a structured array. An entry
+    that cannot be converted (unknown field, bad value, text too long for its
+    field) is reported, counted in `errors` and skipped; the rest of its batch
+    is still written. A failed write drops its batch the same way, and the
+    writer carries on with the next one.
+
+    Args:
+        path (str): Journal file. Created if missing, appended to otherwise.
+        flush_interval (float): Seconds the writer waits for more records before writing.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.errors = 0         # entries dropped because they could not be converted or written
+        self.last_error = None
+        self._queue = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = self._open()
+        self._thread = threading.Thread(target=self._run, name="order-journal", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        """
+        Open the journal for appending, first cutting off a record torn by a crash mid-write.
+        """
+        journal_file = open(self.path, "ab")
+        size = journal_file.seek(0, os.SEEK_END)
+        torn = size % JOURNAL_DTYPE.itemsize
+        if torn:
+            print(f"Dropping {torn} bytes of a partial record at the end of {self.path}")
+            journal_file.truncate(size - torn)
+        return journal_file
+
+    def append(self, entry):
+        """
+        Queue one order for the journal.
+
+        Args:
+            entry (dict): Fields of JOURNAL_DTYPE; timestamps may be given as API
+                strings under 'created_at' and 'filled_at'. Missing fields are zero.
+        """
+        self._queue.put(entry)
+
+    def close(self):
+        """
+        Write everything queued so far, then stop the writer.
+
+        Returns:
+            int: Number of records dropped by failed writes over the journal's life.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+        if self.errors:
+            print(f"Journal {self.path} dropped {self.errors} records; last error: {self.last_error}")
+        return self.errors
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                entry = self._queue.get(timeout=self.flush_interval)
+                while entry is not _STOP:
+                    batch.append(entry)
+                    if len(batch) >= BATCH_SIZE:
+                        break
+                    entry = self._queue.get_nowait()
+                stopping = entry is _STOP
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+
+    def _failed(self, count, error):
+        """
+        Count entries dropped because of an error.
+        """
+        self.errors += count
+        self.last_error = str(error)
+
+    def _reopen(self):
+        """
+        Reopen the file after a failed write.
+        """
+        # Drop anything still buffered and cut off a partially written record
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        try:
+            self._file = self._open()
+        except OSError as e:
+            print(f"Error reopening journal {self.path}: {e}")
+
+    def _write(self, batch):
+        records = np.zeros(len(batch), dtype=JOURNAL_DTYPE)
+        count = 0
+        for entry in batch:
+            try:
+                records[count] = _record(entry)
+            except Exception as e:
+                self._failed(1, e)
+                print(f"Skipping journal entry of order {entry.get('order_id')} ({entry.get('symbol')}): {e}")
+                continue
+            count += 1
+        if not count:
+            return
+        try:
+            self._file.write(records[:count].tobytes())
+            self._file.flush()
+        except Exception as e:
+            self._failed(count, e)
+            print(f"Error writing {count} records to journal {self.path}: {e}")
+            self._reopen()
+            return
+        self.written += count
+
+def _record(entry):
+    """
+    Convert one journal entry to a JOURNAL_DTYPE record.
+
+    Raises:
+        ValueError: If a field is unknown, a value does not convert, or text
+            does not fit its field (numpy would silently cut it short).
+    """
+    record = np.zeros((), dtype=JOURNAL_DTYPE)
+    record["filled_price"] = np.nan
+    for field, value in entry.items():
+        if field == "created_at":
+            record["created_ns"] = _timestamp_ns(value)
+        elif field == "filled_at":
+            record["filled_ns"] = _timestamp_ns(value)
+        elif field == "side":
+            record["side"] = 1 if value == "buy" else -1
+        elif value is None:
+            continue
+        elif field not in JOURNAL_DTYPE.names:
+            raise ValueError(f"unknown field {field!r}")
+        elif JOURNAL_DTYPE[field].kind == "S":
+            encoded = value.encode("ascii") if isinstance(value, str) else bytes(value)
+            if len(encoded) > JOURNAL_DTYPE[field].itemsize:
+                raise ValueError(f"{field} {value!r} is longer than {JOURNAL_DTYPE[field].itemsize} bytes")
+            record[field] = encoded
+        else:
+            record[field] = value
+    return record
+
+def load(path=JOURNAL_PATH):
+    """
+    Memory-map a journal for analysis.
+
+    A record cut short by a crash mid-write is ignored.
+
+    Args:
+        path (str): Journal file.
+
+    Returns:
+        numpy.memmap: Read-only array of JOURNAL_DTYPE (empty if the file is missing).
+    """
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=JOURNAL_DTYPE)
+    count = os.path.getsize(path) // JOURNAL_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=JOURNAL_DTYPE)
+    return np.memmap(path, dtype=JOURNAL_DTYPE, mode="r", shape=(count,))
+
+def now_ns():
+    return time.time_ns()
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+def get_journal(path=None):
+    """
+    Get the process-wide journal for a file, starting its writer on first use.
+
+    Args:
+        path (str): Journal file. JOURNAL_PATH when None.
+
+    Returns:
+        Journal: The shared journal. It is closed (flushed) at interpreter exit.
+    """
+    path = path or JOURNAL_PATH
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = Journal(path)
+        return journal
+
+def close_all():
+    with _journals_lock:
+        journals = list(_journals.values())
+        _journals.clear()
+    for journal in journals:
+        journal.close()
+
+atexit.register(close_all)
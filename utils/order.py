@@ -1,55 +1,199 @@
+import os
+import functools
 import requests
 import threading
 import random
-import os
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils import http_client, timing, state_store, journal, price_feed, trade_stream
 from utils.generate_ratios import generate_profit_ratios
 
-load_dotenv()
+# Alpaca API Endpoints
+BASE_TRADE_PATH = "/v2/stocks"
+BASE_ORDER_PATH = "/v2/orders"
+LATEST_TRADES_PATH = "/v2/stocks/trades/latest"
+BROKER_ORDER_PATH = "/v1/trading/accounts/{account_id}/orders"
 
-# Constants for API credentials
-API_KEY = os.getenv("alpaca_key")
-SECRET_KEY = os.getenv("alpaca_secret")
+# Symbols per multi-symbol latest trades request, keeping the query string short
+SYMBOLS_PER_REQUEST = 200
 
-# Alpaca API Endpoints
-BASE_TRADE_URL = "https://data.alpaca.markets/v2/stocks"
-BASE_ORDER_URL = "https://paper-api.alpaca.markets/v2/orders"
+# Maximum number of orders submitted concurrently
+MAX_WORKERS = 16
+
+# How long (in seconds) a fetched entry price may be reused
+PRICE_TTL = 5.0
+
+# Cache of the latest trade price per symbol: {symbol: (price, fetched_at)}
+_price_cache = {}
+_price_lock = threading.Lock()
+
+def get_entry_price(symbol, max_age=PRICE_TTL):
+    """
+    Get the latest trade price for a symbol, reusing a cached price while it is fresh.
+
+    A fresh price from the streaming price feed, if one is running, is used
+    without any request.
+
+    Args:
+        symbol (str): Stock symbol.
+        max_age (float): Maximum age in seconds of a cached price. Use 0 to always
+            fetch from the REST API, bypassing the feed too.
+
+    Returns:
+        float: The latest trade price.
+    """
+    if max_age > 0:
+        streamed = price_feed.latest_price(symbol)
+        if streamed is not None:
+            return streamed
+
+    with _price_lock:
+        cached = _price_cache.get(symbol)
+        if cached and time.monotonic() - cached[1] < max_age:
+            return cached[0]
+
+    # Fetched without the lock, so misses for other symbols are not held up
+    latest_trade_path = f"{BASE_TRADE_PATH}/{symbol}/trades/latest"
+    response = http_client.get("data", latest_trade_path)
+    response.raise_for_status()
+    entry_price = float(response.json()['trade']['p'])
+
+    with _price_lock:
+        _price_cache[symbol] = (entry_price, time.monotonic())
+    return entry_price
+
+def _fetch_latest_trades(symbols):
+    response = http_client.get("data", LATEST_TRADES_PATH, params={"symbols": ",".join(symbols)})
+    response.raise_for_status()
+    return {symbol: float(trade['p']) for symbol, trade in (response.json().get('trades') or {}).items()}
+
+def get_entry_prices(symbols, max_age=PRICE_TTL, max_workers=4):
+    """
+    Get the latest trade price of many symbols in a few batched requests.
+
+    Fresh prices are taken from the streaming price feed or the same cache as
+    get_entry_price; the rest are fetched SYMBOLS_PER_REQUEST at a time from
+    the multi-symbol endpoint.
+
+    Args:
+        symbols (list): Stock symbols.
+        max_age (float): Maximum age in seconds of a cached price. Use 0 to always
+            fetch from the REST API, bypassing the feed too.
+        max_workers (int): Maximum number of batches fetched at once.
+
+    Returns:
+        dict: {symbol: price}. Symbols without a latest trade are left out.
+
+    Raises:
+        requests.exceptions.RequestException: If a batch cannot be fetched.
+    """
+    prices = {}
+    missing = []
+    now = time.monotonic()
+    with _price_lock:
+        for symbol in dict.fromkeys(symbols):
+            streamed = price_feed.latest_price(symbol) if max_age > 0 else None
+            if streamed is not None:
+                prices[symbol] = streamed
+                continue
+            cached = _price_cache.get(symbol)
+            if cached and now - cached[1] < max_age:
+                prices[symbol] = cached[0]
+            else:
+                missing.append(symbol)
 
-# Headers for Alpaca API
-HEADERS = {
-    "accept": "application/json",
-    "APCA-API-KEY-ID": API_KEY,
-    "APCA-API-SECRET-KEY": SECRET_KEY,
-}
+    batches = [missing[i:i + SYMBOLS_PER_REQUEST] for i in range(0, len(missing), SYMBOLS_PER_REQUEST)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        for fetched in executor.map(_fetch_latest_trades, batches):
+            fetched_at = time.monotonic()
+            with _price_lock:
+                for symbol, price in fetched.items():
+                    _price_cache[symbol] = (price, fetched_at)
+            prices.update(fetched)
+    return prices
 
-def trade_thread(symbol, side, profit_ratios, qty=1):
+def load_symbols(source):
+    """
+    Read a symbol universe.
+
+    Args:
+        source: A list of symbols, a comma-separated string, or the path of a
+            file with one or more comma-separated symbols per line ('#' starts a comment).
+
+    Returns:
+        list: Upper-case symbols, duplicates removed, in their original order.
+    """
+    if isinstance(source, str):
+        if os.path.isfile(source):
+            with open(source, "r") as file:
+                source = ",".join(line.split("#")[0] for line in file)
+        source = source.split(",")
+    return list(dict.fromkeys(symbol.strip().upper() for symbol in source if symbol.strip()))
+
+def compute_bracket(entry_price, side, profit_ratios):
+    """
+    Calculate the take-profit and stop-loss prices for a bracket order.
+
+    Args:
+        entry_price (float): Entry price of the trade.
+        side (str): Trade side, either 'buy' or 'sell'.
+        profit_ratios (list): List containing [take_profit_ratio, stop_loss_ratio].
+
+    Returns:
+        tuple: (take_profit_price, stop_loss_price)
+    """
+    take_profit_distance = entry_price * profit_ratios[0]
+    stop_loss_distance = entry_price * profit_ratios[1]
+
+    if side == "buy":
+        take_profit_price = round(entry_price + take_profit_distance, 2)
+        stop_loss_price = round(entry_price - stop_loss_distance, 2)
+    else:  # == "sell"
+        take_profit_price = round(entry_price - take_profit_distance, 2)
+        stop_loss_price = round(entry_price + stop_loss_distance, 2)
+
+    return take_profit_price, stop_loss_price
+
+def _fill_latency(order):
+    """
+    Seconds between an order's creation and its fill, from the API's timestamps.
+
+    Returns:
+        float: The fill latency, or None if the order has not filled.
+    """
+    try:
+        created = datetime.fromisoformat(order["created_at"])
+        filled = datetime.fromisoformat(order["filled_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (filled - created).total_seconds()
+
+def trade_thread(symbol, side, profit_ratios, qty=1, entry_price=None, order_book=None, account_id=None):
     """
     Thread function to handle buy or sell trades.
-    
+
     Args:
         symbol (str): Stock symbol.
         side (str): Trade side, either 'buy' or 'sell'.
         profit_ratios (list): List containing [buy_ratio, sell_ratio].
         qty (int): Quantity of stocks to trade. Defaults to 1.
+        entry_price (float): Entry price shared by the run. Fetched (or taken from
+            the price cache) when not given.
+        order_book (trade_stream.OrderBook): Book the submitted order is registered
+            in, so its fills can be tracked from the trade_updates stream.
+        account_id (str): Broker sub-account to trade in through the Broker API.
+            The paper trading account is used when None.
     """
     try:
         # Get the latest trade price
-        latest_trade_url = f"{BASE_TRADE_URL}/{symbol}/trades/latest"
-        response = requests.get(latest_trade_url, headers=HEADERS)
-        response.raise_for_status()
-        latest_trade_data = response.json()
-        entry_price = float(latest_trade_data['trade']['p'])
+        if entry_price is None:
+            with timing.span("price_fetch", symbol=symbol):
+                entry_price = get_entry_price(symbol)
 
         # Calculate stop-loss and take-profit prices
-        take_profit_distance = entry_price * profit_ratios[0]
-        stop_loss_distance = entry_price * profit_ratios[1]
-
-        if side == "buy":
-            take_profit_price = round(entry_price + take_profit_distance, 2)
-            stop_loss_price = round(entry_price - stop_loss_distance, 2)
-        else:  # == "sell"
-            take_profit_price = round(entry_price - take_profit_distance, 2)
-            stop_loss_price = round(entry_price + stop_loss_distance, 2)
+        with timing.span("bracket"):
+            take_profit_price, stop_loss_price = compute_bracket(entry_price, side, profit_ratios)
 
         # Check if stop loss or take profit are zero
         if stop_loss_price == 0.0 or take_profit_price == 0.0:
@@ -75,9 +219,44 @@ def trade_thread(symbol, side, profit_ratios, qty=1):
         }
 
         # Submit the order
-        response = requests.post(BASE_ORDER_URL, json=payload, headers=HEADERS)
-        
-        
+        submitted_ns = journal.now_ns()
+        submit_start = time.perf_counter()
+        with timing.span("submit", symbol=symbol, side=side, ratio=str(profit_ratios)) as attrs:
+            if account_id is None:
+                response = http_client.post("paper", BASE_ORDER_PATH, json=payload)
+            else:
+                response = http_client.post("broker", BROKER_ORDER_PATH.format(account_id=account_id), json=payload)
+            attrs["status"] = response.status_code
+        entry = {
+            "submitted_ns": submitted_ns,
+            "response_ns": journal.now_ns(),
+            "account_id": account_id,
+            "symbol": symbol,
+            "side": side,
+            "http_status": response.status_code,
+            "status": "rejected",
+            "qty": qty,
+            "take_profit": profit_ratios[0],
+            "stop_loss": profit_ratios[1],
+            "entry_price": entry_price,
+            "take_profit_price": take_profit_price,
+            "stop_loss_price": stop_loss_price,
+        }
+        if not response.ok:
+            journal.get_journal().append(entry)
+            print(f"Order rejected for {symbol} ({side}, {profit_ratios}): {response.status_code} {response.text}")
+        else:
+            submitted = response.json()
+            entry.update(order_id=submitted.get("id"), status=submitted.get("status"),
+                         created_at=submitted.get("created_at"), filled_at=submitted.get("filled_at"),
+                         filled_price=float(submitted["filled_avg_price"]) if submitted.get("filled_avg_price") else None)
+            journal.get_journal().append(entry)
+            fill_latency = _fill_latency(submitted)
+            if fill_latency is not None:
+                timing.record("fill", submit_start, fill_latency, symbol=symbol)
+            if order_book is not None:
+                order_book.register(submitted, profit_ratios, entry_price, account_id)
+
         # print(f"\n -----------------------------------------------------------\n"
         #        f"Order Response for {symbol} ({side}): {response.text}")
 
@@ -86,27 +265,90 @@ def trade_thread(symbol, side, profit_ratios, qty=1):
     except Exception as e:
         print(f"Error in {side} thread for {symbol}: {e}")
 
-def create_threads(symbol, ratios, side):
+def dispatch_orders(symbol, ratios, side, entry_price, max_workers=MAX_WORKERS, order_book=None):
     """
-    Create and return threads for multiple profit ratios.
-    
+    Submit one bracket order per profit ratio through a bounded worker pool.
+
     Args:
         symbol (str): Stock symbol.
         ratios (list): List of profit ratios to use for trades.
         side (str): Trade side, either 'buy' or 'sell'.
-        
+        entry_price (float): Entry price every bracket is computed from.
+        max_workers (int): Maximum number of orders in flight at once.
+        order_book (trade_stream.OrderBook): Book every submitted order is registered in.
+    """
+    dispatch_many(((symbol, side, ratio, entry_price, None) for ratio in ratios), max_workers, order_book)
+
+def dispatch_many(orders, max_workers=MAX_WORKERS, order_book=None):
+    """
+    Submit bracket orders for any mix of symbols through one bounded worker pool.
+
+    Args:
+        orders (iterable): (symbol, side, profit_ratios, entry_price, account_id) tuples,
+            with account_id None for the paper trading account.
+        max_workers (int): Maximum number of orders in flight at once.
+        order_book (trade_stream.OrderBook): Book every submitted order is registered in.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for symbol, side, ratio, entry_price, account_id in orders:
+            executor.submit(trade_thread, symbol, side, ratio, entry_price=entry_price, order_book=order_book,
+                            account_id=account_id)
+
+def _recording_book(order_book, store=None):
+    """
+    Book a run registers its orders in: the caller's, or a new one that only records
+    every submitted parent and its legs in the state store, so fills can later be
+    attributed to their ratio (ev --source activities).
+
     Returns:
-        list: List of threading.Thread objects.
+        tuple: (order_book, owned), owned True if the run must close the book.
+    """
+    if order_book is not None:
+        return order_book, False
+    return trade_stream.OrderBook(outcomes_path=None, store=store or state_store.get_store()), True
+
+def _recorded(function):
+    """
+    Run a trading entry point with span recording on, and print its timing report.
+    Recording is put back to its previous state (off by default) afterwards.
+    When recording was already on (--trace, the daemon, a benchmark), the spans
+    are left to the outer recording, which also prints the report.
     """
-    return [threading.Thread(target=trade_thread, args=(symbol, side, ratio)) for ratio in ratios]
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        enabled = timing.RECORDER.enabled
+        if not enabled:
+            timing.RECORDER.reset()
+            timing.RECORDER.enable()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            timing.RECORDER.enabled = enabled
+        if not enabled:
+            timing.RECORDER.print_summary(endpoint_template=http_client.endpoint)
+        return result
+    return wrapper
 
-def run_trading(symbol="NDAQ", profit_ratios_count=20):
+@_recorded
+def run_trading(symbol="NDAQ", profit_ratios_count=20, max_workers=MAX_WORKERS, price_ttl=PRICE_TTL,
+                trace_file=None, order_book=None, store=None):
     """
-    Run the trading process by creating threads for buy or sell actions with random profit ratios.
+    Run the trading process by submitting buy or sell orders for every profit ratio.
+
+    The entry price is fetched once per run (or reused from a previous run within
+    `price_ttl` seconds), so every bracket in the experiment is computed from the
+    same price.
 
     Args:
         symbol (str): The stock symbol to trade.
         profit_ratios_count (int): The number of profit ratios to generate for trading.
+        max_workers (int): Maximum number of orders submitted concurrently.
+        price_ttl (float): Maximum age in seconds of a reusable entry price.
+        trace_file (str): If given, the run's spans are written there in Chrome trace format.
+        order_book (trade_stream.OrderBook): Book every submitted order is registered in.
+            When None, the orders and their legs are still recorded in `store`.
+        store (state_store.StateStore): Store the orders are recorded in when no
+            order_book is given. The default store when None.
     """
     # Generate random profit ratios
     profit_ratios = generate_profit_ratios(profit_ratios_count)
@@ -114,21 +356,162 @@ def run_trading(symbol="NDAQ", profit_ratios_count=20):
     # Randomly decide trade direction (buy or sell)
     is_buy = random.choice([True, False])
 
-    # Create threads based on the trade direction
     side = "buy" if is_buy else "sell"
     action = "Buy" if is_buy else "Sell"
-    print(f"-------------------------\nExecuting {action} Threads...\n-------------------------")
-    threads = create_threads(symbol, profit_ratios, side)
 
-    # Start all threads
-    for thread in threads:
-        thread.start()
+    # Fetch the entry price once for the whole run
+    try:
+        with timing.span("price_fetch", symbol=symbol):
+            entry_price = get_entry_price(symbol, max_age=price_ttl)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching entry price for {symbol}: {e}")
+        return
+
+    print(f"-------------------------\nExecuting {action} Orders at {entry_price}...\n-------------------------")
+    order_book, owned = _recording_book(order_book, store)
+    try:
+        with timing.span("dispatch", orders=len(profit_ratios)):
+            dispatch_orders(symbol, profit_ratios, side, entry_price, max_workers=max_workers,
+                            order_book=order_book)
+    finally:
+        if owned:
+            order_book.close()
+
+    _finish_run(trace_file)
+
+@_recorded
+def run_trading_universe(symbols, profit_ratios_count=20, max_workers=MAX_WORKERS, price_ttl=PRICE_TTL,
+                         trace_file=None, order_book=None, store=None):
+    """
+    Run the trading process across a universe of symbols.
+
+    Entry prices for every symbol are fetched up front in batched requests, a
+    side is drawn at random per symbol, and all symbol x ratio orders then go
+    through one worker pool.
+
+    Args:
+        symbols: Symbol universe, anything load_symbols() accepts.
+        profit_ratios_count (int): The number of profit ratios to generate for trading.
+        max_workers (int): Maximum number of orders submitted concurrently.
+        price_ttl (float): Maximum age in seconds of a reusable entry price.
+        trace_file (str): If given, the run's spans are written there in Chrome trace format.
+        order_book (trade_stream.OrderBook): Book every submitted order is registered in.
+            When None, the orders and their legs are still recorded in `store`.
+        store (state_store.StateStore): Store the orders are recorded in when no
+            order_book is given. The default store when None.
+    """
+    symbols = load_symbols(symbols)
+    profit_ratios = generate_profit_ratios(profit_ratios_count)
+
+    try:
+        with timing.span("price_fetch", symbols=len(symbols)):
+            entry_prices = get_entry_prices(symbols, max_age=price_ttl)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching entry prices: {e}")
+        return
+
+    skipped = [symbol for symbol in symbols if symbol not in entry_prices]
+    if skipped:
+        print(f"No latest trade for {len(skipped)} symbols, skipping: {', '.join(skipped)}")
+
+    sides = {symbol: random.choice(["buy", "sell"]) for symbol in entry_prices}
+    orders = [(symbol, sides[symbol], ratio, entry_price, None)
+              for symbol, entry_price in entry_prices.items()
+              for ratio in profit_ratios]
+
+    print(f"-------------------------\nExecuting {len(orders)} Orders across {len(entry_prices)} symbols..."
+          f"\n-------------------------")
+    order_book, owned = _recording_book(order_book, store)
+    try:
+        with timing.span("dispatch", orders=len(orders)):
+            dispatch_many(orders, max_workers=max_workers, order_book=order_book)
+    finally:
+        if owned:
+            order_book.close()
+
+    _finish_run(trace_file)
+
+def ratio_accounts(profit_ratios, store=None):
+    """
+    Map profit ratios to the broker sub-accounts provisioned for them.
+
+    Args:
+        profit_ratios (list): [take_profit, stop_loss] pairs.
+        store (state_store.StateStore): Store bootstrap saved the accounts to.
+            The default store when None.
+
+    Returns:
+        dict: {(take_profit, stop_loss): account_id} for the ratios that have an account.
+    """
+    store = store or state_store.get_store()
+    mapping = {}
+    for ratio in profit_ratios:
+        account_id = store.account_for_ratio(*ratio)
+        if account_id:
+            mapping[tuple(ratio)] = account_id
+    return mapping
+
+@_recorded
+def run_trading_accounts(symbols="NDAQ", profit_ratios_count=6, max_workers=MAX_WORKERS, price_ttl=PRICE_TTL,
+                         trace_file=None, order_book=None, store=None):
+    """
+    Run the trading process with every profit ratio in its own broker sub-account.
+
+    Each ratio trades in the account bootstrap provisioned for it, through the
+    Broker API trading endpoints, so bracket legs of different ratios never net
+    out against each other and each account's P&L belongs to one ratio.
+
+    Args:
+        symbols: Symbol universe, anything load_symbols() accepts.
+        profit_ratios_count (int): The number of profit ratios to generate for trading.
+            Must not exceed the max_ratio the accounts were provisioned with.
+        max_workers (int): Maximum number of orders submitted concurrently.
+        price_ttl (float): Maximum age in seconds of a reusable entry price.
+        trace_file (str): If given, the run's spans are written there in Chrome trace format.
+        order_book (trade_stream.OrderBook): Book every submitted order is registered in.
+            When None, the orders and their legs are still recorded in `store`.
+        store (state_store.StateStore): Store bootstrap saved the accounts to, and
+            the orders are recorded in. The default store when None.
+    """
+    symbols = load_symbols(symbols)
+    profit_ratios = generate_profit_ratios(profit_ratios_count)
+
+    accounts = ratio_accounts(profit_ratios, store)
+    unmapped = [ratio for ratio in profit_ratios if tuple(ratio) not in accounts]
+    if unmapped:
+        print(f"No sub-account for {len(unmapped)} ratios (run `python main.py bootstrap`), skipping: {unmapped}")
+    if not accounts:
+        return
+
+    try:
+        with timing.span("price_fetch", symbols=len(symbols)):
+            entry_prices = get_entry_prices(symbols, max_age=price_ttl)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching entry prices: {e}")
+        return
+
+    sides = {symbol: random.choice(["buy", "sell"]) for symbol in entry_prices}
+    orders = [(symbol, sides[symbol], list(ratio), entry_price, account_id)
+              for symbol, entry_price in entry_prices.items()
+              for ratio, account_id in accounts.items()]
+
+    print(f"-------------------------\nExecuting {len(orders)} Orders across {len(accounts)} sub-accounts..."
+          f"\n-------------------------")
+    order_book, owned = _recording_book(order_book, store)
+    try:
+        with timing.span("dispatch", orders=len(orders)):
+            dispatch_many(orders, max_workers=max_workers, order_book=order_book)
+    finally:
+        if owned:
+            order_book.close()
 
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    _finish_run(trace_file)
 
+def _finish_run(trace_file):
     print("-------------------------\nTrading completed.")
+    if trace_file:
+        timing.RECORDER.export_chrome_trace(trace_file)
+        print(f"Trace saved to {trace_file}")
 
 if __name__ == "__main__":
     run_trading()
@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+import time
+from websockets.sync.client import connect
+from websockets.exceptions import WebSocketException
+from utils import http_client
+from utils.trade_stream import RECONNECT_DELAY, RECONNECT_CAP
+
+# Alpaca market data stream (IEX feed), overridable from .env (e.g. to point at utils/fake_alpaca.py)
+STREAM_URL = os.getenv("alpaca_data_stream_url", "wss://stream.data.alpaca.markets/v2/iex")
+
+# Seconds a streamed price is used for before the REST endpoint is asked instead
+MAX_AGE = 2.0
+
+# Seconds start() waits for the subscription to be confirmed
+CONNECT_WAIT = 5.0
+
+class PriceFeed:
+    """
+    Latest trade and quote per symbol, kept current by the market data stream.
+
+    One background thread reads the stream and is the only writer. Each
+    symbol's entry is an immutable tuple replaced in a single dict
+    assignment, so readers never take a lock and never see a half-updated
+    entry.
+
+    Args:
+        symbols (list): Symbols subscribed to (trades and quotes).
+        url (str): Stream URL.
+    """
+
+    def __init__(self, symbols=(), url=STREAM_URL):
+        self.url = url
+        self.symbols = list(dict.fromkeys(symbols))
+        self.trades = {}        # {symbol: (price, size, timestamp, received)}, received on time.monotonic()
+        self.quotes = {}        # {symbol: (bid, ask, timestamp, received)}
+        self.messages = 0
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+
+    def start(self, wait=CONNECT_WAIT):
+        """
+        Start reading the stream on a daemon thread.
+
+        Args:
+            wait (float): Seconds to wait for the subscription to be confirmed.
+
+        Returns:
+            bool: True if the stream is subscribed.
+        """
+        self._thread = threading.Thread(target=self._run, name="price-feed", daemon=True)
+        self._thread.start()
+        return self.connected.wait(wait)
+
+    def stop(self):
+        self._stop.set()
+        if self._socket is not None:
+            self._socket.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def subscribe(self, symbols):
+        """
+        Add symbols to the subscription, now if connected and on every reconnect.
+        """
+        added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.symbols]
+        if not added:
+            return
+        self.symbols = self.symbols + added
+        socket = self._socket
+        if socket is not None and self.connected.is_set():
+            try:
+                socket.send(json.dumps({"action": "subscribe", "trades": added, "quotes": added}))
+            except (OSError, WebSocketException) as e:
+                print(f"Error subscribing to {', '.join(added)}: {e}")
+
+    def price(self, symbol, max_age=MAX_AGE):
+        """
+        Latest streamed trade price of a symbol, if it is fresh.
+
+        Args:
+            symbol (str): Stock symbol.
+            max_age (float): Maximum seconds since the trade was received.
+
+        Returns:
+            float: The price, or None if there is none within max_age.
+        """
+        trade = self.trades.get(symbol)
+        if trade is None or time.monotonic() - trade[3] > max_age:
+            return None
+        return trade[0]
+
+    def quote(self, symbol, max_age=MAX_AGE):
+        """
+        Latest streamed (bid, ask) of a symbol, if it is fresh, else None.
+        """
+        quote = self.quotes.get(symbol)
+        if quote is None or time.monotonic() - quote[3] > max_age:
+            return None
+        return quote[0], quote[1]
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                with connect(self.url) as socket:
+                    self._socket = socket
+                    self._subscribe(socket)
+                    delay = RECONNECT_DELAY
+                    for message in socket:
+                        self._handle(message)
+            except (OSError, WebSocketException, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"Market data stream error: {e}. Reconnecting in {delay:.0f}s.")
+            finally:
+                self._socket = None
+                self.connected.clear()
+            if self._stop.wait(delay):
+                break
+            delay = min(RECONNECT_CAP, delay * 2)
+
+    def _subscribe(self, socket):
+        _expect(socket, "success", "connected")
+        socket.send(json.dumps({"action": "auth", "key": http_client.API_KEY, "secret": http_client.SECRET_KEY}))
+        _expect(socket, "success", "authenticated")
+        socket.send(json.dumps({"action": "subscribe", "trades": self.symbols, "quotes": self.symbols}))
+        _expect(socket, "subscription")
+        self.connected.set()
+
+    def _handle(self, message):
+        """
+        Apply one stream message. A malformed message or event is reported and
+        skipped, so it never ends the connection.
+        """
+        received = time.monotonic()
+        self.messages += 1
+        try:
+            events = json.loads(message)
+        except ValueError as e:
+            print(f"Skipping undecodable market data message: {e}")
+            return
+        for event in events if isinstance(events, list) else [events]:
+            try:
+                kind = event.get("T")
+                if kind == "t":
+                    self.trades[event["S"]] = (float(event["p"]), event.get("s"), event.get("t"), received)
+                elif kind == "q":
+                    self.quotes[event["S"]] = (float(event["bp"]), float(event["ap"]), event.get("t"), received)
+                elif kind == "error":
+                    print(f"Market data stream error {event.get('code')}: {event.get('msg')}")
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                print(f"Skipping malformed market data event {event!r}: {e!r}")
+
+def _expect(socket, kind, msg=None):
+    """
+    Read one control message and check it is the expected reply.
+
+    Raises:
+        ValueError: If the stream replied with anything else (e.g. an auth error).
+    """
+    events = json.loads(socket.recv())
+    for event in events:
+        if event.get("T") == kind and (msg is None or event.get("msg") == msg):
+            return event
+    raise ValueError(f"expected {kind} {msg or ''}, got {events}")
+
+_feed = None
+_feed_lock = threading.Lock()
+
+def start_feed(symbols, url=STREAM_URL, wait=CONNECT_WAIT):
+    """
+    Start the process-wide price feed, or add symbols to the running one.
+
+    While it runs, order.get_entry_price and order.get_entry_prices read fresh
+    prices from it instead of calling the REST API.
+
+    Args:
+        symbols (list): Symbols to subscribe to.
+        url (str): Stream URL.
+        wait (float): Seconds to wait for the subscription to be confirmed.
+
+    Returns:
+        PriceFeed: The running feed.
+    """
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = PriceFeed(symbols, url)
+            if not _feed.start(wait):
+                print("Market data stream not connected yet; prices come from REST until it is")
+        else:
+            _feed.subscribe(symbols)
+        return _feed
+
+def stop_feed():
+    global _feed
+    with _feed_lock:
+        feed, _feed = _feed, None
+    if feed is not None:
+        feed.stop()
+
+def get_feed():
+    """
+    The process-wide price feed, or None if it is not running.
+    """
+    return _feed
+
+def latest_price(symbol, max_age=MAX_AGE):
+    """
+    Fresh streamed price of a symbol from the process-wide feed.
+
+    Returns:
+        float: The price, or None if no feed is running or its price is stale.
+    """
+    feed = _feed
+    if feed is None:
+        return None
+    return feed.price(symbol, max_age)
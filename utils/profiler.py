@@ -0,0 +1,164 @@
+import os
+import sys
+import cProfile
+import pstats
+import threading
+from collections import Counter
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+class SamplingProfiler:
+    """
+    Low-overhead profiler that periodically samples the stack of every thread.
+
+    Samples are kept as collapsed stacks ('thread;outer;...;inner' -> count),
+    the input format of flamegraph.pl, speedscope and similar viewers.
+
+    Args:
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, file_path):
+        """
+        Write the samples in collapsed-stack format, one 'stack count' line each.
+        """
+        with open(file_path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+class ThreadProfiler:
+    """
+    cProfile of every thread: the calling thread and every thread started while
+    it runs (the order and HTTP worker pools) each get their own
+    cProfile.Profile, merged into one pstats.Stats at the end.
+
+    Threads that were already running when it started are not profiled. On
+    Python versions where only one cProfile can be active at a time (3.12+),
+    only the calling thread is.
+    """
+
+    def __init__(self):
+        self.profiles = []
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, frame, event, arg):
+        # Installed by threading.setprofile(); runs once per new thread and replaces itself
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            sys.setprofile(None)
+            with self._lock:
+                self.skipped += 1
+            return
+        with self._lock:
+            self.profiles.append(profile)
+
+    def start(self):
+        threading.setprofile(self._profile_thread)
+        self._profile_thread(None, "call", None)
+
+    def stop(self):
+        threading.setprofile(None)
+        sys.setprofile(None)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """
+        Merge the profiles of every thread.
+
+        Returns:
+            pstats.Stats: The merged statistics, or None if nothing was profiled.
+        """
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+def run_profiled(mode, output_prefix, function, *args, **kwargs):
+    """
+    Call a function under a profiler and save the profile.
+
+    Args:
+        mode (str): 'sample' writes <output_prefix>.folded (collapsed stacks for a
+            flamegraph); 'cprofile' writes <output_prefix>.prof (pstats of every
+            thread, see ThreadProfiler) and prints the top functions by cumulative time.
+        output_prefix (str): Output path without extension.
+        function (callable): Called with *args and **kwargs.
+
+    Returns:
+        The function's return value.
+    """
+    if mode == "cprofile":
+        profiler = ThreadProfiler()
+        try:
+            with profiler:
+                return function(*args, **kwargs)
+        finally:
+            stats = profiler.stats()
+            if profiler.skipped:
+                print(f"{profiler.skipped} threads not profiled: this Python allows one active cProfile")
+            if stats is not None:
+                stats.dump_stats(f"{output_prefix}.prof")
+                print(f"-------------------------\nProfile of {len(profiler.profiles)} threads saved to "
+                      f"{output_prefix}.prof\n-------------------------")
+                stats.sort_stats("cumulative").print_stats(20)
+
+    sampler = SamplingProfiler()
+    try:
+        with sampler:
+            return function(*args, **kwargs)
+    finally:
+        sampler.write_collapsed(f"{output_prefix}.folded")
+        print(f"{sampler.samples} stack samples saved to {output_prefix}.folded")
@@ -0,0 +1,173 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Requests per minute allowed by each Alpaca API before it answers 429
+REQUESTS_PER_MINUTE = {
+    "paper": 200,
+    "data": 200,
+    "broker": 1000,
+}
+
+# Retries after a 429 before the response is handed back to the caller
+MAX_RETRIES = 5
+
+# Exponential backoff (seconds) used when a 429 carries no Retry-After
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that adapts its rate to the server's responses.
+
+    The bucket starts at `per_minute` requests per minute with a burst of the
+    same size. A 429 halves the refill rate and pauses every caller until the
+    server's retry time; each successful response raises the rate again by a
+    small step, up to the limit advertised by the server.
+
+    Args:
+        per_minute (float): Requests per minute allowed by the API.
+    """
+
+    def __init__(self, per_minute):
+        self.lock = threading.Lock()
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def observe(self, headers):
+        """
+        Align the bucket with the rate-limit headers of a successful response.
+
+        Args:
+            headers (Mapping): Response headers.
+        """
+        with self.lock:
+            limit = _number(headers.get("X-RateLimit-Limit"))
+            if limit:
+                self.capacity = limit
+                self.max_rate = self.capacity / 60.0
+
+            # Additive increase back toward the advertised limit
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+            remaining = _number(headers.get("X-RateLimit-Remaining"))
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                reset = _seconds_until(headers.get("X-RateLimit-Reset"))
+                if remaining <= 0 and reset is not None:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+
+    def throttled(self, headers, attempt):
+        """
+        Slow down after a 429 and return how long the caller should wait.
+
+        Args:
+            headers (Mapping): Headers of the 429 response.
+            attempt (int): Zero-based retry attempt, for the exponential backoff.
+
+        Returns:
+            float: Seconds to wait before retrying.
+        """
+        # Unparseable headers fall through to the exponential backoff
+        delay = _retry_after(headers.get("Retry-After"))
+        if delay is None:
+            delay = _seconds_until(headers.get("X-RateLimit-Reset"))
+        if delay is None:
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+        # Jitter spreads the retries of every waiting thread over the window
+        delay += random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+        with self.lock:
+            # Multiplicative decrease, once per pause rather than once per rejected thread
+            if time.monotonic() >= self.paused_until:
+                self.rate = max(self.max_rate / 20, self.rate / 2)
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+def _number(value):
+    """
+    Parse a numeric header, or None if it is missing or not a number.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _seconds_until(reset):
+    """
+    Convert an X-RateLimit-Reset value (Unix time in seconds) to a delay, or None if it is unusable.
+    """
+    reset = _number(reset)
+    if reset is None:
+        return None
+    return max(0.0, reset - time.time())
+
+def _retry_after(value):
+    """
+    Convert a Retry-After value, in seconds or as an HTTP-date, to a delay, or None if it is unusable.
+    """
+    seconds = _number(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(api):
+    """
+    Get the process-wide token bucket of an API.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+
+    Returns:
+        TokenBucket: The shared bucket.
+    """
+    bucket = _buckets.get(api)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(api, TokenBucket(REQUESTS_PER_MINUTE[api]))
+    return bucket
+
+def set_limit(api, per_minute):
+    """
+    Replace the shared bucket of an API, e.g. to lift the limit against a local fake server.
+
+    Args:
+        api (str): API name, one of 'paper', 'data' or 'broker'.
+        per_minute (float): Requests per minute the new bucket allows.
+    """
+    with _buckets_lock:
+        _buckets[api] = TokenBucket(per_minute)
@@ -0,0 +1,293 @@
+import numpy as np
+
+# Trade sides, in the order used by the side axis of every result array
+SIDES = ("buy", "sell")
+
+# Exit codes for simulated positions
+EXIT_STOP_LOSS = -1
+EXIT_EXPIRED = 0
+EXIT_TAKE_PROFIT = 1
+
+# Upper bound on elements held per intermediate array
+CHUNK_ELEMENTS = 2 ** 23
+
+def as_ratio_array(profit_ratios):
+    """
+    Convert profit ratios to a float array of shape (n_ratios, 2).
+
+    Args:
+        profit_ratios: List of [take_profit, stop_loss] pairs (as returned by
+            generate_profit_ratios), or a structured array with
+            'take_profit' and 'stop_loss' fields.
+
+    Returns:
+        numpy.ndarray: Array with take-profit in column 0 and stop-loss in column 1.
+    """
+    ratios = np.asarray(profit_ratios)
+    if ratios.dtype.names:
+        ratios = np.column_stack([ratios["take_profit"], ratios["stop_loss"]])
+    return ratios.astype(np.float64).reshape(-1, 2)
+
+def _first_crossings(up, down, levels):
+    """
+    Find, for every entry and level, the first bar where the running max
+    reaches +level and the first bar where the running min reaches -level.
+
+    Args:
+        up (numpy.ndarray): Running max of returns, shape (entries, horizon).
+        down (numpy.ndarray): Running min of returns, same shape.
+        levels (numpy.ndarray): Sorted positive return levels, shape (n_levels,).
+
+    Returns:
+        tuple: (up_hits, down_hits), each of shape (entries, n_levels). A value
+            equal to the horizon means the level was never reached.
+    """
+    up_hits = np.empty((len(up), len(levels)), dtype=np.int32)
+    down_hits = np.empty((len(up), len(levels)), dtype=np.int32)
+    # The running extremes are monotonic, so a binary search for a level gives
+    # the number of bars still short of it, which is the index of the first
+    # bar that reaches it. One search per entry covers every level at once.
+    falling = np.negative(down)
+    for row in range(len(up)):
+        up_hits[row] = np.searchsorted(up[row], levels)
+        down_hits[row] = np.searchsorted(falling[row], levels)
+    return up_hits, down_hits
+
+def _iter_outcomes(prices, ratios, chunk_days=None):
+    """
+    Simulate every ratio, side and entry bar, in blocks of days and ratios.
+
+    Args:
+        prices (numpy.ndarray): Price paths of shape (days, bars).
+        ratios (numpy.ndarray): Ratio array of shape (n_ratios, 2).
+        chunk_days (int): Days simulated per chunk. Derived from CHUNK_ELEMENTS when None.
+
+    Yields:
+        tuple: (ratio_slice, entry_slice, returns, holding, exits), the last three
+            of shape (block_ratios, 2, block_entries).
+    """
+    days, bars = prices.shape
+    horizon = bars - 1
+    if horizon < 1:
+        return
+
+    # Map each take-profit/stop-loss value to its index in a shared level table
+    levels, level_index = np.unique(ratios, return_inverse=True)
+    level_index = level_index.reshape(ratios.shape)
+    if chunk_days is None:
+        chunk_days = max(1, CHUNK_ELEMENTS // (horizon * max(horizon, len(levels))))
+
+    # Bars remaining until the close for each entry bar
+    remaining = np.arange(horizon, 0, -1)
+
+    for start in range(0, days, chunk_days):
+        chunk = prices[start:start + chunk_days]
+        n = len(chunk)
+        entries = n * horizon
+
+        # Returns of every later bar relative to each entry bar: (n, entry, offset)
+        padded = np.concatenate([chunk, np.full((n, horizon), np.nan)], axis=1)
+        future = np.lib.stride_tricks.sliding_window_view(padded[:, 1:], horizon, axis=1)[:, :horizon]
+        entry = chunk[:, :horizon, None]
+        rel = future / entry - 1.0
+        final = (chunk[:, -1:] / chunk[:, :horizon] - 1.0).ravel()
+        hold_to_close = np.tile(remaining, n)
+
+        up = np.fmax.accumulate(np.where(np.isnan(rel), -np.inf, rel), axis=-1).reshape(entries, horizon)
+        down = np.fmin.accumulate(np.where(np.isnan(rel), np.inf, rel), axis=-1).reshape(entries, horizon)
+        del rel
+        up_hits, down_hits = _first_crossings(up, down, levels)
+        del up, down
+
+        block = max(1, CHUNK_ELEMENTS // entries)
+        for first in range(0, len(ratios), block):
+            ratio_slice = slice(first, first + block)
+            tp_index = level_index[ratio_slice, 0]
+            sl_index = level_index[ratio_slice, 1]
+            take_profit = ratios[ratio_slice, 0][:, None]
+            stop_loss = ratios[ratio_slice, 1][:, None]
+
+            returns = np.empty((len(tp_index), 2, entries))
+            holding = np.empty((len(tp_index), 2, entries), dtype=np.int32)
+            exits = np.empty((len(tp_index), 2, entries), dtype=np.int8)
+
+            for s, (tp_hits, sl_hits, sign) in enumerate((
+                (up_hits[:, tp_index].T, down_hits[:, sl_index].T, 1.0),    # buy
+                (down_hits[:, tp_index].T, up_hits[:, sl_index].T, -1.0),   # sell
+            )):
+                tp_first = tp_hits < sl_hits
+                # Ties (both levels inside the same bar) count as a stop-loss
+                sl_first = (sl_hits <= tp_hits) & (sl_hits < horizon)
+
+                returns[:, s] = np.where(tp_first, take_profit, np.where(sl_first, -stop_loss, sign * final))
+                holding[:, s] = np.where(tp_first, tp_hits + 1, np.where(sl_first, sl_hits + 1, hold_to_close))
+                exits[:, s] = np.where(tp_first, EXIT_TAKE_PROFIT,
+                                       np.where(sl_first, EXIT_STOP_LOSS, EXIT_EXPIRED))
+
+            yield ratio_slice, slice(start * horizon, start * horizon + entries), returns, holding, exits
+
+def _as_price_paths(prices):
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.ndim == 1:
+        prices = prices[None, :]
+    return prices
+
+def simulate_outcomes(prices, profit_ratios, chunk_days=None):
+    """
+    Simulate a bracket trade on every ratio, side and entry bar of the price paths.
+
+    A position entered at a bar exits at the first later bar that reaches its
+    take-profit or stop-loss level, or at the last bar of the day (expiry).
+
+    Args:
+        prices (array-like): Price path of one day (bars,) or several days (days, bars).
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        chunk_days (int): Days simulated per chunk to bound memory use.
+
+    Returns:
+        dict: 'ratios' (n_ratios, 2), and 'returns', 'holding' (bars held) and
+            'exits' (EXIT_* codes), each of shape (n_ratios, 2, entries) with the
+            side axis ordered as SIDES.
+    """
+    prices = _as_price_paths(prices)
+    ratios = as_ratio_array(profit_ratios)
+    entries = len(prices) * max(prices.shape[1] - 1, 0)
+    returns = np.empty((len(ratios), 2, entries))
+    holding = np.empty((len(ratios), 2, entries), dtype=np.int32)
+    exits = np.empty((len(ratios), 2, entries), dtype=np.int8)
+
+    for ratio_slice, entry_slice, block_returns, block_holding, block_exits in _iter_outcomes(prices, ratios, chunk_days):
+        returns[ratio_slice, :, entry_slice] = block_returns
+        holding[ratio_slice, :, entry_slice] = block_holding
+        exits[ratio_slice, :, entry_slice] = block_exits
+    return {"ratios": ratios, "returns": returns, "holding": holding, "exits": exits}
+
+def accumulate(prices, profit_ratios, totals=None, chunk_days=None):
+    """
+    Add the simulated outcomes of some price paths to running per-ratio totals.
+
+    Only sums are kept, so any number of paths can be streamed through in
+    constant memory and totals from separate runs can be added together.
+
+    Args:
+        prices (array-like): Price path of one day (bars,) or several days (days, bars).
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        totals (dict): Totals to add to. A new set is started when None.
+        chunk_days (int): Days simulated per chunk to bound memory use.
+
+    Returns:
+        dict: Totals with keys 'count', 'sum', 'sum_sq', 'take_profit',
+            'stop_loss', 'expired' and 'holding', each of shape (n_ratios, 2).
+    """
+    prices = _as_price_paths(prices)
+    ratios = as_ratio_array(profit_ratios)
+    if totals is None:
+        totals = new_totals(len(ratios))
+
+    for ratio_slice, _, returns, holding, exits in _iter_outcomes(prices, ratios, chunk_days):
+        totals["count"][ratio_slice] += returns.shape[-1]
+        totals["sum"][ratio_slice] += returns.sum(axis=-1)
+        totals["sum_sq"][ratio_slice] += np.square(returns).sum(axis=-1)
+        totals["take_profit"][ratio_slice] += (exits == EXIT_TAKE_PROFIT).sum(axis=-1)
+        totals["stop_loss"][ratio_slice] += (exits == EXIT_STOP_LOSS).sum(axis=-1)
+        totals["expired"][ratio_slice] += (exits == EXIT_EXPIRED).sum(axis=-1)
+        totals["holding"][ratio_slice] += holding.sum(axis=-1)
+    return totals
+
+def daily_sums(prices, profit_ratios, chunk_days=None):
+    """
+    Sum the simulated returns of every ratio and side per day.
+
+    Entries within a day overlap, so days (not entries) are the independent
+    units to resample when judging how noisy an EV is.
+
+    Args:
+        prices (array-like): Price path of one day (bars,) or several days (days, bars).
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        chunk_days (int): Days simulated per chunk to bound memory use.
+
+    Returns:
+        numpy.ndarray: Sums of shape (n_ratios, 2, days). Every day has bars - 1 entries.
+    """
+    prices = _as_price_paths(prices)
+    ratios = as_ratio_array(profit_ratios)
+    horizon = prices.shape[1] - 1
+    sums = np.zeros((len(ratios), 2, len(prices)))
+
+    for ratio_slice, entry_slice, returns, _, _ in _iter_outcomes(prices, ratios, chunk_days):
+        first_day = entry_slice.start // horizon
+        days = returns.shape[-1] // horizon
+        sums[ratio_slice, :, first_day:first_day + days] = returns.reshape(len(returns), 2, days, horizon).sum(axis=-1)
+    return sums
+
+def new_totals(n_ratios):
+    """
+    Create empty per-ratio totals for accumulate().
+
+    Args:
+        n_ratios (int): Number of profit ratios.
+
+    Returns:
+        dict: Zeroed totals, each of shape (n_ratios, 2).
+    """
+    keys = ("count", "sum", "sum_sq", "take_profit", "stop_loss", "expired", "holding")
+    return {key: np.zeros((n_ratios, 2)) for key in keys}
+
+def summarize(totals):
+    """
+    Turn per-ratio totals into EV, hit rates and mean holding time.
+
+    Args:
+        totals (dict): Totals from accumulate().
+
+    Returns:
+        dict: 'ev', 'std', 'take_profit_rate', 'stop_loss_rate', 'expired_rate',
+            'mean_holding' and 'count', each of shape (n_ratios, 2).
+    """
+    count = totals["count"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ev = totals["sum"] / count
+        variance = np.maximum(totals["sum_sq"] / count - np.square(ev), 0.0)
+        return {
+            "ev": ev,
+            "std": np.sqrt(variance),
+            "take_profit_rate": totals["take_profit"] / count,
+            "stop_loss_rate": totals["stop_loss"] / count,
+            "expired_rate": totals["expired"] / count,
+            "mean_holding": totals["holding"] / count,
+            "count": count,
+        }
+
+def simulate_ev(prices, profit_ratios, chunk_days=None):
+    """
+    Compute EV, hit rates and holding times for every ratio and side.
+
+    Args:
+        prices (array-like): Price path of one day (bars,) or several days (days, bars).
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        chunk_days (int): Days simulated per chunk to bound memory use.
+
+    Returns:
+        dict: summarize() output plus 'ratios' (n_ratios, 2).
+    """
+    ratios = as_ratio_array(profit_ratios)
+    summary = summarize(accumulate(prices, ratios, chunk_days=chunk_days))
+    summary["ratios"] = ratios
+    return summary
+
+def print_summary(summary):
+    """
+    Print the EV table produced by simulate_ev().
+
+    Args:
+        summary (dict): Output of simulate_ev().
+    """
+    print(f"{'TP':>6} {'SL':>6} {'Side':>5} {'EV':>10} {'TP%':>7} {'SL%':>7} {'Exp%':>7} {'Hold':>7}")
+    for r, (take_profit, stop_loss) in enumerate(summary["ratios"]):
+        for s, side in enumerate(SIDES):
+            print(f"{take_profit:>6.4f} {stop_loss:>6.4f} {side:>5} "
+                  f"{summary['ev'][r, s]:>10.6f} "
+                  f"{summary['take_profit_rate'][r, s]:>7.2%} "
+                  f"{summary['stop_loss_rate'][r, s]:>7.2%} "
+                  f"{summary['expired_rate'][r, s]:>7.2%} "
+                  f"{summary['mean_holding'][r, s]:>7.1f}")
@@ -0,0 +1,479 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Database file, overridable from .env
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.getenv("state_db", os.path.join(script_dir, "JSON", "state.db"))
+
+# Seconds a writer waits for another writer's lock before failing
+BUSY_TIMEOUT = 30.0
+
+# Rows written per executemany() call when bulk loading
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    email TEXT,
+    take_profit REAL,
+    stop_loss REAL,
+    status TEXT,
+    created_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_email ON accounts (email);
+CREATE INDEX IF NOT EXISTS accounts_ratio ON accounts (take_profit, stop_loss);
+
+CREATE TABLE IF NOT EXISTS ach_relationships (
+    ach_id TEXT PRIMARY KEY,
+    account_id TEXT NOT NULL,
+    status TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ach_relationships_account ON ach_relationships (account_id);
+
+CREATE TABLE IF NOT EXISTS balances (
+    account_id TEXT PRIMARY KEY,
+    balance REAL NOT NULL,
+    checked_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS transfers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transfer_id TEXT UNIQUE,
+    account_id TEXT NOT NULL,
+    ach_id TEXT,
+    amount TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transfers_account ON transfers (account_id);
+CREATE INDEX IF NOT EXISTS transfers_status ON transfers (status);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    account_id TEXT,
+    symbol TEXT,
+    side TEXT,
+    type TEXT,
+    take_profit REAL,
+    stop_loss REAL,
+    entry_price REAL,
+    fill_price REAL,
+    exit_price REAL,
+    outcome TEXT,
+    status TEXT,
+    created_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_account ON orders (account_id);
+CREATE INDEX IF NOT EXISTS orders_ratio ON orders (take_profit, stop_loss);
+CREATE INDEX IF NOT EXISTS orders_parent ON orders (parent_id);
+"""
+
+# Transfer statuses
+TRANSFER_REQUESTED = "requested"
+TRANSFER_SUBMITTED = "submitted"
+TRANSFER_FAILED = "failed"
+
+# Columns of the orders table a record may set, besides order_id
+ORDER_COLUMNS = ("parent_id", "account_id", "symbol", "side", "type", "take_profit", "stop_loss",
+                 "entry_price", "fill_price", "exit_price", "outcome", "status", "created_at")
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def parse_ratio(email_prefix):
+    """
+    Recover the [take_profit, stop_loss] ratio from an account email prefix.
+
+    Args:
+        email_prefix (str): Prefix such as '0.02/0.01' (see bootstrap.ratio_email).
+
+    Returns:
+        tuple: (take_profit, stop_loss), or (None, None) if the prefix is not a ratio.
+    """
+    try:
+        take_profit, stop_loss = email_prefix.split("/")
+        return float(take_profit), float(stop_loss)
+    except (AttributeError, ValueError):
+        return None, None
+
+class StateStore:
+    """
+    SQLite store of broker accounts, ACH relationships, balances, transfers and orders.
+
+    Every thread gets its own connection; the database runs in WAL mode so
+    readers never block the (serialized) writers. Writes are upserts, so each
+    step only touches the rows it changes.
+
+    Args:
+        path (str): Database file. Created, with its schema, if missing.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def connection(self):
+        """
+        Get this thread's connection, opening it on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # ------------------------------------------------------------------
+    # Accounts
+    # ------------------------------------------------------------------
+
+    def upsert_account(self, account_id, email=None, status=None, created_at=None):
+        """
+        Insert an account or update the fields given.
+
+        Args:
+            account_id (str): Broker account id.
+            email (str): Email prefix, e.g. '0.02/0.01'. The ratio is parsed from it.
+            status (str): Broker account status.
+            created_at (str): Creation time reported by the Broker API.
+        """
+        self.upsert_accounts([{"account_id": account_id, "email": email, "status": status,
+                               "created_at": created_at}])
+
+    def upsert_accounts(self, accounts):
+        """
+        Upsert many accounts in one transaction.
+
+        Args:
+            accounts (iterable): Dicts with 'account_id' and optionally 'email',
+                'status' and 'created_at'. Missing or None fields keep their stored value.
+
+        Returns:
+            int: Number of accounts written.
+        """
+        now = _now()
+        rows = []
+        for account in accounts:
+            take_profit, stop_loss = parse_ratio(account.get("email"))
+            rows.append((account["account_id"], account.get("email"), take_profit, stop_loss,
+                         account.get("status"), account.get("created_at"), now))
+
+        with self.connection() as connection:
+            connection.executemany(
+                """
+                INSERT INTO accounts (account_id, email, take_profit, stop_loss, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (account_id) DO UPDATE SET
+                    email = COALESCE(excluded.email, email),
+                    take_profit = COALESCE(excluded.take_profit, take_profit),
+                    stop_loss = COALESCE(excluded.stop_loss, stop_loss),
+                    status = COALESCE(excluded.status, status),
+                    created_at = COALESCE(excluded.created_at, created_at),
+                    updated_at = excluded.updated_at
+                """, rows)
+        return len(rows)
+
+    def account_ids(self, missing_email=False):
+        """
+        List stored account ids.
+
+        Args:
+            missing_email (bool): Only accounts whose email has not been looked up yet.
+
+        Returns:
+            list: Account ids.
+        """
+        query = "SELECT account_id FROM accounts"
+        if missing_email:
+            query += " WHERE email IS NULL"
+        return [row[0] for row in self.connection().execute(query)]
+
+    def accounts_by_email(self):
+        """
+        Load every account with an email, keyed by email prefix.
+
+        Returns:
+            dict: {email_prefix: {"account_id", "email", "ach_id"}}, the layout of
+                the former account_email_updated.json.
+        """
+        rows = self.connection().execute(
+            """
+            SELECT accounts.account_id, accounts.email, MIN(ach_relationships.ach_id) AS ach_id
+            FROM accounts LEFT JOIN ach_relationships USING (account_id)
+            WHERE accounts.email IS NOT NULL
+            GROUP BY accounts.account_id
+            """)
+        return {row["email"]: {"account_id": row["account_id"], "email": row["email"], "ach_id": row["ach_id"]}
+                for row in rows}
+
+    def account_for_ratio(self, take_profit, stop_loss):
+        """
+        Look up the account provisioned for a ratio.
+
+        Returns:
+            str: The account id, or None.
+        """
+        row = self.connection().execute(
+            "SELECT account_id FROM accounts WHERE take_profit = ? AND stop_loss = ? LIMIT 1",
+            (take_profit, stop_loss)).fetchone()
+        return row[0] if row else None
+
+    # ------------------------------------------------------------------
+    # ACH relationships and balances
+    # ------------------------------------------------------------------
+
+    def upsert_ach(self, account_id, ach_id, status=None):
+        with self.connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO ach_relationships (ach_id, account_id, status, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (ach_id) DO UPDATE SET
+                    status = COALESCE(excluded.status, status),
+                    updated_at = excluded.updated_at
+                """, (ach_id, account_id, status, _now()))
+
+    def account_ids_without_ach(self):
+        return [row[0] for row in self.connection().execute(
+            """
+            SELECT account_id FROM accounts
+            WHERE NOT EXISTS (SELECT 1 FROM ach_relationships WHERE ach_relationships.account_id = accounts.account_id)
+            """)]
+
+    def set_balance(self, account_id, balance):
+        with self.connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO balances (account_id, balance, checked_at) VALUES (?, ?, ?)
+                ON CONFLICT (account_id) DO UPDATE SET balance = excluded.balance, checked_at = excluded.checked_at
+                """, (account_id, float(balance), _now()))
+
+    def balances(self):
+        """
+        Returns:
+            dict: {account_id: (balance, checked_at)} of every checked account.
+        """
+        return {row[0]: (row[1], row[2]) for row in
+                self.connection().execute("SELECT account_id, balance, checked_at FROM balances")}
+
+    # ------------------------------------------------------------------
+    # Transfers
+    # ------------------------------------------------------------------
+
+    def request_transfer(self, account_id, ach_id, amount):
+        """
+        Record a transfer still to be sent, replacing any unsent one for the account.
+
+        Args:
+            account_id (str): Account to fund.
+            ach_id (str): ACH relationship to pull from.
+            amount (str): Amount, formatted with two decimals.
+        """
+        now = _now()
+        with self.connection() as connection:
+            connection.execute("DELETE FROM transfers WHERE account_id = ? AND status = ?",
+                               (account_id, TRANSFER_REQUESTED))
+            connection.execute(
+                """
+                INSERT INTO transfers (account_id, ach_id, amount, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, (account_id, ach_id, amount, TRANSFER_REQUESTED, now, now))
+
+    def pending_transfers(self):
+        """
+        Returns:
+            list: sqlite3.Row of every transfer not sent yet, joined with the account email.
+        """
+        return self.connection().execute(
+            """
+            SELECT transfers.id, transfers.account_id, transfers.ach_id, transfers.amount, accounts.email
+            FROM transfers LEFT JOIN accounts USING (account_id)
+            WHERE transfers.status = ?
+            ORDER BY transfers.id
+            """, (TRANSFER_REQUESTED,)).fetchall()
+
+    def record_transfer(self, account_id, amount, ach_id=None, transfer_id=None, status=TRANSFER_SUBMITTED,
+                        error=None, request_id=None):
+        """
+        Record the result of sending a transfer.
+
+        Args:
+            account_id (str): Funded account.
+            amount (str): Transfer amount.
+            ach_id (str): ACH relationship used.
+            transfer_id (str): Id returned by the Broker API.
+            status (str): TRANSFER_SUBMITTED or TRANSFER_FAILED.
+            error (str): Failure detail.
+            request_id (int): Row of the pending request being completed, if any.
+        """
+        now = _now()
+        with self.connection() as connection:
+            if request_id is not None:
+                connection.execute(
+                    "UPDATE transfers SET transfer_id = ?, status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (transfer_id, status, error, now, request_id))
+            else:
+                connection.execute(
+                    """
+                    INSERT INTO transfers (transfer_id, account_id, ach_id, amount, status, error, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (transfer_id, account_id, ach_id, amount, status, error, now, now))
+
+    # ------------------------------------------------------------------
+    # Orders
+    # ------------------------------------------------------------------
+
+    def upsert_orders(self, orders):
+        """
+        Upsert order records in batched transactions.
+
+        Args:
+            orders (iterable): Dicts with 'order_id' and any of ORDER_COLUMNS.
+                Missing or None fields keep their stored value.
+
+        Returns:
+            int: Number of orders written.
+        """
+        assignments = ", ".join(f"{column} = COALESCE(excluded.{column}, {column})" for column in ORDER_COLUMNS)
+        statement = f"""
+            INSERT INTO orders (order_id, {", ".join(ORDER_COLUMNS)}, updated_at)
+            VALUES ({", ".join("?" * (len(ORDER_COLUMNS) + 2))})
+            ON CONFLICT (order_id) DO UPDATE SET {assignments}, updated_at = excluded.updated_at
+        """
+        now = _now()
+        count = 0
+        batch = []
+        connection = self.connection()
+        for order in orders:
+            batch.append((order["order_id"],) + tuple(order.get(column) for column in ORDER_COLUMNS) + (now,))
+            if len(batch) >= BATCH_SIZE:
+                with connection:
+                    connection.executemany(statement, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with connection:
+                connection.executemany(statement, batch)
+            count += len(batch)
+        return count
+
+    def orders_by_id(self, order_ids):
+        """
+        Look up many orders at once.
+
+        Args:
+            order_ids (list): Order ids.
+
+        Returns:
+            dict: {order_id: sqlite3.Row} for the ids that are stored.
+        """
+        order_ids = list(order_ids)
+        found = {}
+        # Stay under SQLite's limit on bound parameters per statement
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            rows = self.connection().execute(
+                f"SELECT * FROM orders WHERE order_id IN ({', '.join('?' * len(chunk))})", chunk)
+            found.update((row["order_id"], row) for row in rows)
+        return found
+
+    def orders_for_ratio(self, take_profit, stop_loss):
+        return self.connection().execute(
+            "SELECT * FROM orders WHERE take_profit = ? AND stop_loss = ? AND parent_id IS NULL",
+            (take_profit, stop_loss)).fetchall()
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+
+    def import_json(self, json_dir=os.path.join(script_dir, "JSON")):
+        """
+        Load the JSON files the broker scripts used to exchange state.
+
+        Reads account_raw_ids.json, account_email.json, account_email_updated.json
+        and account_transfer_request.json when present. Safe to run repeatedly.
+
+        Args:
+            json_dir (str): Directory holding the JSON files.
+
+        Returns:
+            dict: Number of records imported per file.
+        """
+        def load(name):
+            try:
+                with open(os.path.join(json_dir, name), "r") as file:
+                    return json.load(file)
+            except FileNotFoundError:
+                return None
+
+        imported = {}
+        account_ids = load("account_raw_ids.json")
+        if account_ids is not None:
+            imported["account_raw_ids.json"] = self.upsert_accounts({"account_id": account_id}
+                                                                    for account_id in account_ids)
+
+        for name in ("account_email.json", "account_email_updated.json"):
+            accounts = load(name)
+            if accounts is None:
+                continue
+            self.upsert_accounts({"account_id": account["account_id"], "email": email}
+                                 for email, account in accounts.items())
+            for account in accounts.values():
+                if account.get("ach_id"):
+                    self.upsert_ach(account["account_id"], account["ach_id"])
+            imported[name] = len(accounts)
+
+        transfers = load("account_transfer_request.json")
+        if transfers is not None:
+            for transfer in transfers.values():
+                self.request_transfer(transfer["account_id"], transfer.get("ach_id"), transfer["amount"])
+            imported["account_transfer_request.json"] = len(transfers)
+        return imported
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path=DB_PATH):
+    """
+    Get the process-wide store for a database file, opening it on first use.
+
+    Args:
+        path (str): Database file.
+
+    Returns:
+        StateStore: The shared store.
+    """
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = StateStore(path)
+        return store
+
+def main():
+    print(f"Imported into {DB_PATH}: {get_store().import_json()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import math
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from multiprocessing import shared_memory
+from utils import bar_store, simulate
+from utils.generate_ratios import generate_profit_ratios
+
+# Days of one symbol simulated per task
+DAYS_PER_TASK = 20
+
+# Tasks queued per worker, so uneven tasks still keep every core busy
+TASKS_PER_WORKER = 4
+
+# Worker processes, one per core by default
+MAX_WORKERS = os.cpu_count() or 1
+
+# Set in each worker by _attach(): the shared price matrix and the ratio array
+_shared = None
+_prices = None
+_ratios = None
+
+def _attach(name, shape, ratios):
+    """
+    Map the shared price matrix into a worker process (once, at worker start).
+    """
+    global _shared, _prices, _ratios
+    _shared = shared_memory.SharedMemory(name=name)
+    _prices = np.ndarray(shape, dtype=np.float64, buffer=_shared.buf)
+    _ratios = ratios
+
+def _run_task(task):
+    """
+    Accumulate one block of days and ratios of the shared matrix.
+
+    Args:
+        task (tuple): (symbol_index, first_row, last_row, first_ratio, last_ratio).
+
+    Returns:
+        tuple: (task, totals) with totals for the task's ratios only.
+    """
+    _, first_row, last_row, first_ratio, last_ratio = task
+    totals = simulate.accumulate(_prices[first_row:last_row], _ratios[first_ratio:last_ratio])
+    return task, totals
+
+def plan_tasks(row_ranges, n_ratios, max_workers=MAX_WORKERS, days_per_task=DAYS_PER_TASK):
+    """
+    Partition the symbol x day x ratio space into tasks.
+
+    Days are split first, since every task recomputes the level crossings of
+    its days once for all of its ratios. Ratios are only split when there are
+    too few day blocks to give every worker TASKS_PER_WORKER tasks.
+
+    Args:
+        row_ranges (list): (first_row, last_row) of each symbol in the shared matrix.
+        n_ratios (int): Number of profit ratios.
+        max_workers (int): Worker processes.
+        days_per_task (int): Days per task.
+
+    Returns:
+        list: (symbol_index, first_row, last_row, first_ratio, last_ratio) tuples.
+    """
+    day_blocks = [(index, row, min(row + days_per_task, last_row))
+                  for index, (first_row, last_row) in enumerate(row_ranges)
+                  for row in range(first_row, last_row, days_per_task)]
+    if not day_blocks:
+        return []
+    ratio_blocks = min(n_ratios, max(1, math.ceil(max_workers * TASKS_PER_WORKER / len(day_blocks))))
+    ratio_step = math.ceil(n_ratios / ratio_blocks)
+    return [(index, first_row, last_row, first_ratio, min(first_ratio + ratio_step, n_ratios))
+            for index, first_row, last_row in day_blocks
+            for first_ratio in range(0, n_ratios, ratio_step)]
+
+def run_sweep(matrices, profit_ratios, max_workers=MAX_WORKERS, days_per_task=DAYS_PER_TASK):
+    """
+    Simulate every symbol, day and ratio across a process pool.
+
+    The price matrices are copied once into a shared memory block that every
+    worker maps, so no prices are pickled per task; workers return only
+    per-ratio totals, which are summed per symbol and overall.
+
+    Args:
+        matrices (dict): {symbol: (days, bars) price matrix}, all with the same number of bars.
+        profit_ratios: Profit ratios as returned by generate_profit_ratios.
+        max_workers (int): Worker processes.
+        days_per_task (int): Days per task.
+
+    Returns:
+        dict: 'ratios' (n_ratios, 2), 'totals' (simulate.accumulate() totals over
+            everything), 'by_symbol' ({symbol: totals}), 'tasks' and 'seconds'.
+    """
+    ratios = simulate.as_ratio_array(profit_ratios)
+    symbols = [symbol for symbol, matrix in matrices.items() if len(matrix)]
+    widths = {np.shape(matrices[symbol])[1] for symbol in symbols}
+    if len(widths) > 1:
+        raise ValueError(f"price matrices differ in bars per day: {sorted(widths)}")
+
+    by_symbol = {symbol: simulate.new_totals(len(ratios)) for symbol in symbols}
+    totals = simulate.new_totals(len(ratios))
+    if not symbols:
+        return {"ratios": ratios, "totals": totals, "by_symbol": by_symbol, "tasks": 0, "seconds": 0.0}
+
+    row_ranges = []
+    rows = 0
+    for symbol in symbols:
+        row_ranges.append((rows, rows + len(matrices[symbol])))
+        rows += len(matrices[symbol])
+    shape = (rows, widths.pop())
+
+    start = time.perf_counter()
+    shared = shared_memory.SharedMemory(create=True, size=max(1, rows * shape[1] * 8))
+    try:
+        prices = np.ndarray(shape, dtype=np.float64, buffer=shared.buf)
+        for symbol, (first_row, last_row) in zip(symbols, row_ranges):
+            prices[first_row:last_row] = matrices[symbol]
+        del prices
+
+        tasks = plan_tasks(row_ranges, len(ratios), max_workers, days_per_task)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach,
+                                 initargs=(shared.name, shape, ratios)) as executor:
+            for future in as_completed([executor.submit(_run_task, task) for task in tasks]):
+                (index, _, _, first_ratio, last_ratio), task_totals = future.result()
+                for key, values in task_totals.items():
+                    by_symbol[symbols[index]][key][first_ratio:last_ratio] += values
+                    totals[key][first_ratio:last_ratio] += values
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return {"ratios": ratios, "totals": totals, "by_symbol": by_symbol, "tasks": len(tasks),
+            "seconds": time.perf_counter() - start}
+
+def sweep(symbols, start, end, max_ratio=20, max_workers=MAX_WORKERS, column="c", root=bar_store.STORE_DIR):
+    """
+    Load the session matrices of many symbols from the bar store and sweep them.
+
+    Args:
+        symbols (list): Stock symbols.
+        start (datetime.date): First day.
+        end (datetime.date): Last day.
+        max_ratio (int): Passed to generate_profit_ratios.
+        max_workers (int): Worker processes.
+        column (str): Bar column simulated, close prices by default.
+        root (str): Bar store root.
+
+    Returns:
+        dict: run_sweep() output.
+    """
+    matrices = {}
+    for symbol in symbols:
+        _, matrices[symbol] = bar_store.load_session_matrix(symbol, start, end, column, root=root)
+    return run_sweep(matrices, generate_profit_ratios(max_ratio), max_workers)
+
+def main(symbols, start, end, max_ratio=20, max_workers=MAX_WORKERS):
+    """
+    Sweep a symbol universe over a date range and print the EV table.
+
+    Args:
+        symbols (list): Stock symbols.
+        start (str): First day, YYYY-MM-DD.
+        end (str): Last day, YYYY-MM-DD.
+        max_ratio (int): Passed to generate_profit_ratios.
+        max_workers (int): Worker processes.
+    """
+    result = sweep(symbols, date.fromisoformat(start), date.fromisoformat(end), max_ratio, max_workers)
+    entries = int(result["totals"]["count"][0, 0]) if len(result["ratios"]) else 0
+    print(f"-------------------------\nSimulated {entries} entries x {len(result['ratios'])} ratios x 2 sides "
+          f"of {len(result['by_symbol'])} symbols in {result['tasks']} tasks, {result['seconds']:.2f}s"
+          f"\n-------------------------")
+    summary = simulate.summarize(result["totals"])
+    summary["ratios"] = result["ratios"]
+    simulate.print_summary(summary)
+    return result
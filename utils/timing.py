@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import threading
+import time
+
+class _Span:
+    """
+    Context manager timing one span of an enabled recorder.
+    """
+    __slots__ = ("recorder", "name", "host", "attrs", "start")
+
+    def __init__(self, recorder, name, host, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.host = host
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.attrs
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, self.start, time.perf_counter() - self.start, self.host, **self.attrs)
+
+class _NullSpan:
+    """
+    Context manager returned while recording is disabled: no clock reads, no locking.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Recorder:
+    """
+    Thread-safe in-memory store of timed spans.
+
+    Each span is a (name, host, start, duration, thread_id, attrs) tuple, with
+    start and duration in seconds on the perf_counter clock. Recording is off
+    until enable() is called; while off, span() and record() do nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.lock = threading.Lock()
+        self.spans = []
+        self.epoch = time.perf_counter()
+        self.enabled = enabled
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.epoch = time.perf_counter()
+
+    def record(self, name, start, duration, host=None, **attrs):
+        """
+        Add a finished span.
+
+        Args:
+            name (str): Phase name, e.g. 'submit'.
+            start (float): perf_counter() value when the phase started.
+            duration (float): Length of the phase in seconds.
+            host (str): API the phase talked to, if any.
+            **attrs: Extra details kept for the trace export.
+        """
+        if not self.enabled:
+            return
+        span = (name, host, start, duration, threading.get_ident(), attrs)
+        with self.lock:
+            self.spans.append(span)
+
+    def span(self, name, host=None, **attrs):
+        """
+        Time the body of a with-block as one span.
+
+        The with-block gets the span's attrs dict, to add details found inside it.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, host, attrs)
+
+    def summary(self, key=lambda span: span[0]):
+        """
+        Compute latency percentiles of the recorded spans.
+
+        Args:
+            key (callable): Groups spans, by name unless given.
+
+        Returns:
+            dict: {group: {"count", "mean", "p50", "p95", "p99", "max"}} in seconds.
+        """
+        with self.lock:
+            spans = list(self.spans)
+
+        groups = {}
+        for span in spans:
+            group = key(span)
+            if group is not None:
+                groups.setdefault(group, []).append(span[3])
+
+        return {group: _stats(durations) for group, durations in groups.items()}
+
+    def host_summary(self):
+        """
+        Compute latency percentiles per (host, phase) for spans that talked to an API.
+        """
+        return self.summary(key=lambda span: f"{span[1]} {span[0]}" if span[1] else None)
+
+    def endpoint_summary(self, template=None):
+        """
+        Compute latency percentiles per HTTP endpoint, e.g. 'POST paper /v2/orders'.
+
+        Args:
+            template (callable): Maps a request path to its endpoint template
+                (e.g. http_client.endpoint), so requests for different accounts
+                or symbols share one row. Paths are used as-is when None.
+        """
+        template = template or (lambda path: path)
+
+        def key(span):
+            if span[0] != "http":
+                return None
+            return f"{span[5].get('method')} {span[1]} {template(span[5].get('path', ''))}"
+        return self.summary(key=key)
+
+    def print_summary(self, title="Timing summary", endpoint_template=None):
+        """
+        Print p50/p95/p99 per phase and per host in milliseconds, and per
+        endpoint when an endpoint template is given.
+        """
+        print(f"-------------------------\n{title}\n-------------------------")
+        sections = [self.summary(), self.host_summary()]
+        if endpoint_template:
+            sections.append(self.endpoint_summary(endpoint_template))
+        width = max([24] + [len(group) for section in sections for group in section])
+        print(f"{'phase':<{width}} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for section in sections:
+            for group, stats in sorted(section.items()):
+                print(f"{group:<{width}} {stats['count']:>6} "
+                      + " ".join(f"{stats[k] * 1000:>9.1f}" for k in ("mean", "p50", "p95", "p99", "max")))
+
+    def save_summary(self, file_path, endpoint_template=None):
+        """
+        Write the per-phase, per-host and per-endpoint summaries as JSON.
+        """
+        with open(file_path, "w") as file:
+            json.dump({"phases": self.summary(), "hosts": self.host_summary(),
+                       "endpoints": self.endpoint_summary(endpoint_template)}, file, indent=4)
+
+    def export_chrome_trace(self, file_path):
+        """
+        Write the spans in Chrome trace event format (chrome://tracing, Perfetto).
+
+        Args:
+            file_path (str): Output JSON file.
+        """
+        with self.lock:
+            spans = list(self.spans)
+            epoch = self.epoch
+
+        events = []
+        for name, host, start, duration, thread_id, attrs in spans:
+            args = {key: value for key, value in attrs.items() if isinstance(value, (str, int, float, bool))}
+            if host:
+                args["host"] = host
+            events.append({
+                "name": name,
+                "cat": host or "compute",
+                "ph": "X",
+                "ts": (start - epoch) * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": thread_id,
+                "args": args,
+            })
+
+        with open(file_path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+def _stats(durations):
+    durations = sorted(durations)
+    count = len(durations)
+
+    def percentile(p):
+        # Nearest-rank percentile
+        return durations[max(0, math.ceil(p / 100 * count) - 1)]
+
+    return {
+        "count": count,
+        "mean": sum(durations) / count,
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": durations[-1],
+    }
+
+# Process-wide recorder used by http_client and the order fan-out
+RECORDER = Recorder()
+span = RECORDER.span
+record = RECORDER.record
+enable = RECORDER.enable
+disable = RECORDER.disable
@@ -0,0 +1,416 @@
+import os
+import json
+import queue
+import threading
+import time
+from websockets.sync.client import connect
+from websockets.exceptions import WebSocketException
+from utils import http_client
+
+# Alpaca trade_updates stream, overridable from .env (e.g. to point at utils/fake_alpaca.py)
+STREAM_URL = os.getenv("alpaca_stream_url", "wss://paper-api.alpaca.markets/stream")
+
+# Seconds between reconnect attempts, doubled up to the cap while the stream is down
+RECONNECT_DELAY = 1.0
+RECONNECT_CAP = 30.0
+
+# Events for order ids not (yet) registered that are kept for replay
+MAX_UNMATCHED = 10000
+
+# Seconds a filled bracket whose legs were canceled waits for the fill that
+# liquidated its position, whose price becomes its exit price
+LIQUIDATION_WAIT = 10.0
+
+# Leg events that end a leg without a fill
+LEG_ENDED = ("canceled", "expired", "rejected")
+
+_STOP = object()
+
+# Bracket outcomes are appended here as they happen
+script_dir = os.path.dirname(os.path.abspath(__file__))
+outcomes_file = os.path.join(script_dir, "JSON", "bracket_outcomes.jsonl")
+
+class OrderBook:
+    """
+    In-memory book of submitted bracket orders, keyed by order id.
+
+    Parents are registered from the order POST response (which lists the
+    take-profit and stop-loss legs); trade_updates events then move each
+    bracket from open to filled to closed by take-profit, stop-loss or cancel.
+    A bracket whose legs are both canceled or expire (end of day, kill switch)
+    closes as 'canceled' or 'expired', with the price of the fill that
+    liquidated its position as exit price when one arrives.
+
+    Only the in-memory book is updated under the lock. Outcome lines and
+    state store upserts are queued to one background writer, so events and
+    order submissions never wait on the disk.
+
+    Args:
+        outcomes_path (str): File closed brackets are appended to as JSON lines.
+            None keeps outcomes in memory only.
+        store (state_store.StateStore): If given, every registered order and leg,
+            and every outcome, is also upserted into its orders table.
+    """
+
+    def __init__(self, outcomes_path=outcomes_file, store=None):
+        self.lock = threading.Lock()
+        self.orders = {}        # {parent_id: bracket record}
+        self.leg_parents = {}   # {leg_id: (parent_id, 'take_profit' | 'stop_loss')}
+        self.unmatched = {}     # {order_id: [update]} received before register()
+        self.orphans = {}       # {symbol: [(record, deadline)]} filled brackets waiting for their liquidation
+        self.liquidations = {}  # {symbol: (price, side, received)} last fill of an order not in the book
+        self.outcomes = []
+        self.outcomes_path = outcomes_path
+        self.store = store
+        self._outcomes_file = None
+        if outcomes_path:
+            os.makedirs(os.path.dirname(outcomes_path), exist_ok=True)
+            self._outcomes_file = open(outcomes_path, "a")
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="order-book-writer", daemon=True)
+        self._writer.start()
+
+    def register(self, order, profit_ratios=None, entry_price=None, account_id=None):
+        """
+        Track a submitted bracket order.
+
+        Args:
+            order (dict): Order object returned by the order POST.
+            profit_ratios (list): [take_profit, stop_loss] ratio of the order.
+            entry_price (float): Entry price the bracket was computed from.
+            account_id (str): Broker sub-account the order was placed in, if any.
+        """
+        record = {
+            "order_id": order["id"],
+            "symbol": order.get("symbol"),
+            "side": order.get("side"),
+            "ratio": list(profit_ratios) if profit_ratios is not None else None,
+            "entry_price": entry_price,
+            "status": order.get("status"),
+            "fill_price": None,
+            "exit_price": None,
+            "outcome": None,
+            "leg_ids": [leg["id"] for leg in order.get("legs") or []],
+        }
+        if self.store is not None:
+            self._queue.put(("rows", _order_rows(order, record, account_id)))
+        with self.lock:
+            self.orders[order["id"]] = record
+            for leg in order.get("legs") or []:
+                kind = "take_profit" if leg.get("type") == "limit" else "stop_loss"
+                self.leg_parents[leg["id"]] = (order["id"], kind)
+            # The stream can deliver an order's events before its POST returns
+            early = []
+            for order_id in [order["id"]] + record["leg_ids"]:
+                early.extend(self.unmatched.pop(order_id, []))
+
+        for update in early:
+            self.apply(update)
+
+    def apply(self, update):
+        """
+        Apply one trade_updates event.
+
+        One event can close several brackets, e.g. the fill that liquidates a
+        position closes every canceled bracket waiting for it.
+
+        Args:
+            update (dict): The 'data' object of a trade_updates message.
+
+        Returns:
+            list: The bracket records this event closed, oldest first (empty if none).
+        """
+        with self.lock:
+            first = len(self.outcomes)
+            self._expire_orphans()
+            self._apply(update)
+            return self.outcomes[first:]
+
+    def _apply(self, update):
+        event = update.get("event")
+        order = update.get("order", {})
+        order_id = order.get("id")
+        price = update.get("price") or order.get("filled_avg_price")
+
+        if order_id in self.orders:
+            record = self.orders[order_id]
+            record["status"] = order.get("status", record["status"])
+            if event == "fill" and price is not None:
+                record["fill_price"] = float(price)
+            elif event in LEG_ENDED and record["fill_price"] is None:
+                record["outcome"] = event
+                self._close(record, update)
+            return
+
+        if order_id not in self.leg_parents:
+            if event == "fill" and price is not None and order.get("symbol"):
+                self._liquidated(order["symbol"], order.get("side"), float(price), update)
+            if order_id:
+                self.unmatched.setdefault(order_id, []).append(update)
+                if len(self.unmatched) > MAX_UNMATCHED:
+                    del self.unmatched[next(iter(self.unmatched))]
+            return
+        parent_id, kind = self.leg_parents[order_id]
+        record = self.orders.get(parent_id)
+        if record is None:
+            return
+        if event in LEG_ENDED:
+            self._leg_ended(record, order_id, event, update)
+        elif event == "fill":
+            record["exit_price"] = float(price) if price is not None else None
+            record["outcome"] = kind
+            self._close(record, update)
+
+    def _leg_ended(self, record, leg_id, event, update):
+        """
+        Handle a leg canceled or expired without a fill; close the bracket once both legs are.
+        """
+        self.leg_parents.pop(leg_id, None)
+        if record.get("outcome") != "expired":
+            record["outcome"] = "expired" if event == "expired" else "canceled"
+        if any(leg in self.leg_parents for leg in record["leg_ids"]):
+            return
+        if record["fill_price"] is None:
+            self._close(record, update)
+            return
+
+        # The position is closed by a separate order (the kill switch, or the
+        # broker at expiry), which may arrive before or after the cancels
+        liquidation = self.liquidations.get(record["symbol"])
+        if liquidation and liquidation[1] != record["side"] and time.monotonic() - liquidation[2] < LIQUIDATION_WAIT:
+            record["exit_price"] = liquidation[0]
+            self._close(record, update)
+            return
+        del self.orders[record["order_id"]]
+        self.orphans.setdefault(record["symbol"], []).append((record, time.monotonic() + LIQUIDATION_WAIT))
+
+    def _liquidated(self, symbol, side, price, update):
+        """
+        Record a fill of an order not in the book, closing the filled brackets it liquidated.
+        """
+        self.liquidations[symbol] = (price, side, time.monotonic())
+        waiting = self.orphans.pop(symbol, [])
+        remaining = [(record, deadline) for record, deadline in waiting if record["side"] == side]
+        if remaining:
+            self.orphans[symbol] = remaining
+        for record, _ in waiting:
+            if record["side"] != side:
+                record["exit_price"] = price
+                self._close(record, update)
+
+    def _expire_orphans(self, force=False):
+        """
+        Close the brackets that waited LIQUIDATION_WAIT seconds for a liquidation, without an exit price.
+        """
+        now = time.monotonic()
+        for symbol in list(self.orphans):
+            waiting = []
+            for record, deadline in self.orphans[symbol]:
+                if force or now >= deadline:
+                    self._close(record, {})
+                else:
+                    waiting.append((record, deadline))
+            if waiting:
+                self.orphans[symbol] = waiting
+            else:
+                del self.orphans[symbol]
+
+    def _close(self, record, update):
+        record["closed_at"] = update.get("timestamp")
+        self.outcomes.append(record)
+        self.orders.pop(record["order_id"], None)
+        # The sibling leg is canceled by the broker; stop tracking both
+        for leg_id in record.pop("leg_ids"):
+            self.leg_parents.pop(leg_id, None)
+        self._queue.put(("outcome", record))
+        return record
+
+    def _run_writer(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                kind, payload = item
+                if kind == "rows":
+                    self.store.upsert_orders(payload)
+                else:
+                    self._write_outcome(payload)
+            except Exception as e:
+                print(f"Error persisting order book {kind}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_outcome(self, record):
+        if self._outcomes_file:
+            self._outcomes_file.write(json.dumps(record) + "\n")
+            self._outcomes_file.flush()
+        if self.store is not None:
+            self.store.upsert_orders([{key: record[key] for key in
+                                       ("order_id", "fill_price", "exit_price", "outcome", "status")}])
+
+    def open_orders(self):
+        """
+        Number of brackets still open. Filled brackets waiting for their liquidation fill are not counted.
+        """
+        with self.lock:
+            self._expire_orphans()
+            return len(self.orders)
+
+    def flush(self):
+        """
+        Wait until every queued outcome and upsert has been written.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Close the brackets still waiting for a liquidation, write everything queued and stop the writer.
+        """
+        with self.lock:
+            self._expire_orphans(force=True)
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        if self._outcomes_file:
+            self._outcomes_file.close()
+            self._outcomes_file = None
+
+def _order_rows(order, record, account_id):
+    """
+    Orders table rows for a submitted bracket: the parent, then its legs.
+    """
+    take_profit, stop_loss = record["ratio"] or (None, None)
+    rows = []
+    for submitted in [order] + list(order.get("legs") or []):
+        rows.append({
+            "order_id": submitted["id"],
+            "parent_id": None if submitted is order else order["id"],
+            "account_id": account_id,
+            "symbol": submitted.get("symbol"),
+            "side": submitted.get("side"),
+            "type": submitted.get("type"),
+            "take_profit": take_profit,
+            "stop_loss": stop_loss,
+            "entry_price": record["entry_price"] if submitted is order else None,
+            "status": submitted.get("status"),
+            "created_at": submitted.get("created_at"),
+        })
+    return rows
+
+class TradeUpdatesListener:
+    """
+    Background subscriber to Alpaca's trade_updates stream.
+
+    Every event is applied to the order book; the connection is re-established
+    with exponential backoff whenever it drops.
+
+    Args:
+        order_book (OrderBook): Book the events are applied to.
+        url (str): Stream URL.
+        on_close (callable): Called with each closed bracket record.
+    """
+
+    def __init__(self, order_book, url=STREAM_URL, on_close=None):
+        self.order_book = order_book
+        self.url = url
+        self.on_close = on_close
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+
+    def start(self, wait=5.0):
+        """
+        Start listening on a daemon thread.
+
+        Args:
+            wait (float): Seconds to wait for the subscription to be confirmed.
+
+        Returns:
+            bool: True if the stream is subscribed.
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.connected.wait(wait)
+
+    def stop(self):
+        self._stop.set()
+        if self._socket is not None:
+            self._socket.close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                with connect(self.url) as socket:
+                    self._socket = socket
+                    self._subscribe(socket)
+                    delay = RECONNECT_DELAY
+                    for message in socket:
+                        self._handle(message)
+            except (OSError, WebSocketException, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"trade_updates stream error: {e}. Reconnecting in {delay:.0f}s.")
+            finally:
+                self._socket = None
+                self.connected.clear()
+            if self._stop.wait(delay):
+                break
+            delay = min(RECONNECT_CAP, delay * 2)
+
+    def _subscribe(self, socket):
+        socket.send(json.dumps({"action": "auth", "key": http_client.API_KEY, "secret": http_client.SECRET_KEY}))
+        reply = _decode(socket.recv())
+        if reply.get("data", {}).get("status") != "authorized":
+            raise ValueError(f"authentication failed: {reply}")
+        socket.send(json.dumps({"action": "listen", "data": {"streams": ["trade_updates"]}}))
+        reply = _decode(socket.recv())
+        if "trade_updates" not in reply.get("data", {}).get("streams", []):
+            raise ValueError(f"subscription failed: {reply}")
+        self.connected.set()
+
+    def _handle(self, message):
+        """
+        Apply one stream message. A malformed message, or an error applying it,
+        is reported and skipped, so it never ends the connection.
+        """
+        try:
+            message = _decode(message)
+            if message.get("stream") != "trade_updates":
+                return
+            closed = self.order_book.apply(message["data"])
+        except Exception as e:
+            print(f"Skipping trade_updates message {str(message)[:200]!r}: {e!r}")
+            return
+        for record in closed:
+            if self.on_close:
+                try:
+                    self.on_close(record)
+                except Exception as e:
+                    print(f"Error in on_close for order {record.get('order_id')}: {e!r}")
+
+def _decode(message):
+    # The paper stream sends binary frames, the live stream text frames
+    if isinstance(message, bytes):
+        message = message.decode()
+    return json.loads(message)
+
+def wait_until_closed(order_book, timeout, poll=0.5):
+    """
+    Wait until every registered bracket has closed or the timeout passes.
+
+    Args:
+        order_book (OrderBook): Book to watch.
+        timeout (float): Maximum seconds to wait.
+        poll (float): Seconds between checks.
+
+    Returns:
+        int: Number of brackets still open.
+    """
+    deadline = time.monotonic() + timeout
+    while order_book.open_orders() and time.monotonic() < deadline:
+        time.sleep(poll)
+    return order_book.open_orders()